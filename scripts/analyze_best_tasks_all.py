@@ -9,6 +9,7 @@ from collections import defaultdict
 from utils.db import get_engine, get_lottery_name, get_table_name
 from utils.config_loader import load_base_config
 from utils.expert_hit_analysis import run_hit_analysis_batch, analyze_expert_hits, get_position_name_map
+from utils.issue_index import get_issue_index
 import re
 
 def analyze_best_tasks_for_issues(issues, lottery_name, best_tasks_table, filter_position, config):
@@ -19,6 +20,7 @@ def analyze_best_tasks_for_issues(issues, lottery_name, best_tasks_table, filter
     ENABLE_TRACK_OPEN_RANK = config.get("ENABLE_TRACK_OPEN_RANK", True)
     CHECK_MODE = config.get("CHECK_MODE", "dingwei")
     ALL_MODE_LIMIT = config.get("ALL_MODE_LIMIT")
+    ISSUE_WORKERS = int(config.get("ISSUE_WORKERS") or 1)
 
     with engine.begin() as conn:
         sql = f"SELECT * FROM {best_tasks_table} WHERE hit_rate >= 0.9"
@@ -71,6 +73,7 @@ def analyze_best_tasks_for_issues(issues, lottery_name, best_tasks_table, filter
                     lottery_name=lottery_name,
                     query_issues=issues,
                     all_mode_limit=ALL_MODE_LIMIT,
+                    workers=ISSUE_WORKERS,
                     enable_hit_check=ENABLE_HIT_CHECK,
                     enable_track_open_rank=ENABLE_TRACK_OPEN_RANK,
                     dingwei_sha_pos=position,
@@ -141,19 +144,15 @@ if __name__ == "__main__":
         raw_config = yaml.safe_load(f)
         config = raw_config.get("DEFAULTS", raw_config)
 
-    expert_table = get_table_name(lottery_name, "expert_predictions")
     best_tasks_table = get_table_name(lottery_name, "best_tasks")
 
     engine = get_engine()
-    with engine.connect() as conn:
-        if str(config.get("QUERY_ISSUES", "")).lower() == "all":
-            issues = [r[0] for r in conn.execute(text(
-                f"SELECT DISTINCT issue_name FROM {expert_table} ORDER BY issue_name"
-            )).fetchall()]
-        else:
-            issues = config.get("QUERY_ISSUES")
-            if isinstance(issues, str):
-                issues = [issues]
+    if str(config.get("QUERY_ISSUES", "")).lower() == "all":
+        issues = list(get_issue_index(engine, lottery_name).issue_names)
+    else:
+        issues = config.get("QUERY_ISSUES")
+        if isinstance(issues, str):
+            issues = [issues]
 
     start_time = time.time()
 
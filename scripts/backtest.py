@@ -8,11 +8,38 @@ import subprocess
 from sqlalchemy import text
 from utils.db import get_engine, get_lottery_name, get_table_name
 from utils.logger import log, save_log_file_if_needed
-from utils.expert_hit_analysis import run_hit_analysis_batch
+from utils.task_runner import task_variant, group_tasks, TaskGroupPool
+from utils.worker_pool import available_cpus
+from utils.task_lease import (
+    make_owner_id, ensure_lease_table, claim_tasks, lease_held_clause, drop_lease, LeaseHeartbeat, LEASE_SECONDS, CLAIM_BATCH_SIZE,
+)
+from utils.task_results import (
+    summarize_result, save_best_records, is_rank_reliable, ensure_task_statuses, find_status_checks, BEST_TASK_HIT_RATE,
+)
+from utils.task_shard import parse_shard_args, shard_argv, select_shard_tasks
 
 engine = get_engine()
 playtype_en = sys.argv[1] if len(sys.argv) > 1 else "gewei_sha3"
 lottery_type = sys.argv[2] if len(sys.argv) > 2 else "p5"
+# ✅ 可选 --prune：剩余期号全部命中也既达不到 best_tasks 命中率、又满足不了 best_ranks 写入条件的任务提前终止，
+#    记为 pruned（不剪枝时同样不会写入 best_tasks / best_ranks）
+# ⚠️ 剪枝效果有限：best_ranks 只要求跳过 ≤ 命中，须等跳过期数超过「命中 + 剩余期数」才可剪枝，
+#    实际只有跳过很多的任务（如 skip_if_few 下排名靠后的杀号）在回测后段被剪掉，多数任务仍完整回测；
+#    该界限可以取到（剩余期号可能全部命中），不评估剩余期号就无法再收紧。节省的期次见各任务组日志
+prune_mode = "--prune" in sys.argv[3:]
+# ✅ 可选 --workers N：任务组在 N 个子进程中并行计算（省略 N 时取可用 CPU 数），主进程按原顺序统一落库，结果与串行一致
+workers = 1
+if "--workers" in sys.argv[3:]:
+    workers_idx = sys.argv.index("--workers")
+    workers_arg = sys.argv[workers_idx + 1] if workers_idx + 1 < len(sys.argv) else ""
+    workers = int(workers_arg) if workers_arg.isdigit() and int(workers_arg) > 0 else available_cpus()
+# ✅ 可选 --lease：按批认领任务（running + 租约 + 心跳），多个回测进程 / 主机可安全地共同消费同一张任务表
+lease_mode = "--lease" in sys.argv[3:]
+lease_owner = make_owner_id() if lease_mode else None
+# ✅ 可选 --shard-index I --shard-count N：多个独立作业各自还原同一份任务表，按任务组配置哈希只回测第 I 份，
+#    上传到独立的分片 Release，合并时按自然键去重
+shard_index, shard_count = parse_shard_args(sys.argv[3:])
+upload_cmd = [sys.executable, "scripts/upload_release.py", playtype_en, lottery_type] + shard_argv(shard_index, shard_count)
 
 # 动态加载表名
 lottery_name = get_lottery_name(lottery_type)
@@ -20,160 +47,215 @@ tasks_table = get_table_name(lottery_name, "tasks")
 best_tasks_table = get_table_name(lottery_name, "best_tasks")
 best_ranks_table = get_table_name(lottery_name, "best_ranks")
 
-with engine.begin() as conn:
-    tasks = list(conn.execute(text(f"SELECT * FROM {tasks_table} WHERE status = 'pending'")).mappings())
-
-if not tasks:
-    log("✅ 没有待执行任务，已退出")
-    print("待执行任务: 0")
-    sys.exit(0)
+completed_count = 0
 
-log(f"🌟 待执行任务: {len(tasks)}")
 
-completed_count = 0
-for task in tasks:
+def fetch_shard_tasks(statuses: tuple) -> list:
+    """取指定状态的任务（按 id 排序），分片模式下只保留本分片的任务"""
+    status_list = ", ".join(f"'{status}'" for status in statuses)
     with engine.begin() as conn:
-        position = int(task["position"])
-        lookback_n = task["lookback_n"]
-        lookback_offset = task["lookback_offset"]
-        query_playtype_name = task["query_playtype_name"]
-        analyze_playtype_name = task["analyze_playtype_name"]
-        hit_rank_list = json.loads(task["hit_rank_list"])
-        enable = json.loads(task["enable"])
-        skip_if_few = json.loads(task["skip_if_few"])
-        resolve_tie_mode = json.loads(task["resolve_tie_mode"])
-        reverse_on_tie = json.loads(task["reverse_on_tie"])
-
-        enable_dingwei_sha = enable.get("dingwei_sha")
-        skip_if_few_dingwei_sha = skip_if_few.get("dingwei_sha")
-        resolve_tie_mode_dingwei_sha = resolve_tie_mode.get("dingwei_sha")
-        reverse_on_tie_dingwei_sha = reverse_on_tie.get("dingwei_sha")
-
-        if enable_dingwei_sha and not isinstance(enable_dingwei_sha, list):
-            enable_dingwei_sha = [enable_dingwei_sha]
-
-        log(f"🚩 ID={task['id']} ➞ {query_playtype_name} | lookback_n={lookback_n} | HR={hit_rank_list} | enable={enable_dingwei_sha}")
-
-        result = run_hit_analysis_batch(
-            engine=engine,
-            lottery_name=lottery_name,
-            query_issues=["All"],
-            enable_hit_check=True,
-            enable_track_open_rank=True,
-            dingwei_sha_pos=position,
-            check_mode="dingwei",
-            analysis_kwargs=dict(
-                query_playtype_name=query_playtype_name,
-                analyze_playtype_name=analyze_playtype_name,
-                mode="rank",
-                hit_rank_list=hit_rank_list,
-                lookback_n=lookback_n,
-                lookback_start_offset=lookback_offset,
-                enable_dingwei_sha=enable_dingwei_sha,
-                skip_if_few_dingwei_sha=skip_if_few_dingwei_sha,
-                resolve_tie_mode_dingwei_sha=resolve_tie_mode_dingwei_sha,
-                reverse_on_tie_dingwei_sha=reverse_on_tie_dingwei_sha,
-            )
-        )
-
-        hit_count = result["hit_count"]
-        miss_count = result["miss_count"]
-        skip_count = result["skip_count"]
-        total_issues = hit_count + miss_count
-        hit_rate = round(hit_count / total_issues, 4) if total_issues > 0 else 0
-
-        log(f"📈 ID={task['id']} ➞ 命中 {hit_count}/{total_issues} ➞ 命中率={hit_rate}")
-        if skip_count > hit_count:
-            log(f"⚠️ 当前任务跳过期数占比过高（{skip_count}/{skip_count + hit_count + miss_count}），数据可靠性较低。")
-
-        conn.execute(text(f"""
-            UPDATE {tasks_table}
-            SET status='done', total_issues=:total_issues, hit_count=:hit_count,
-                skip_count=:skip_count, hit_rate=:hit_rate, updated_at=:updated_at
-            WHERE id=:id
-        """), dict(
-            id=task["id"],
-            total_issues=total_issues,
-            hit_count=hit_count,
-            skip_count=skip_count,
-            hit_rate=hit_rate,
-            updated_at=datetime.now()
-        ))
-
-        if hit_rate >= 0.9:
-            conn.execute(text(f"""
-                INSERT IGNORE INTO {best_tasks_table}
-                (position, playtype, lookback_n, hit_rank_list, enable, skip_if_few,
-                 resolve_tie_mode, reverse_on_tie, hit_rate, created_at)
-                VALUES (:position, :playtype, :lookback_n, :hit_rank_list, :enable,
-                        :skip_if_few, :resolve_tie_mode, :reverse_on_tie, :hit_rate, :created_at)
+        tasks = [dict(t) for t in conn.execute(text(
+            f"SELECT * FROM {tasks_table} WHERE status IN ({status_list}) ORDER BY id"
+        )).mappings()]
+    return select_shard_tasks(tasks, shard_index, shard_count)
+
+
+def log_run_options():
+    if shard_count > 1:
+        log(f"🧮 分片模式已开启：第 {shard_index} 片 / 共 {shard_count} 片")
+    if prune_mode:
+        log(f"✂️ 剪枝模式已开启：命中率阈值={BEST_TASK_HIT_RATE}（仅跳过期数超过命中 + 剩余期数的任务会被剪枝，多数任务仍完整回测）")
+    if workers > 1:
+        log(f"⚙️ 并行模式已开启：{workers} 个子进程")
+
+
+def ensure_status_schema():
+    """租约 / 剪枝模式会写入 running / pruned：备份还原的 status 列若为 ENUM 先扩展取值，CHECK 约束只提示不改动"""
+    added = ensure_task_statuses(engine, tasks_table)
+    if added:
+        log(f"🛠️ {tasks_table}.status 为 ENUM，已扩展取值：{added}")
+    for clause in find_status_checks(engine, tasks_table):
+        log(f"⚠️ {tasks_table} 存在约束 status 的 CHECK：{clause}，请确认允许 running / pruned")
+
+
+def make_task_pool(candidate_tasks: list) -> TaskGroupPool:
+    """整个回测共用一个任务组执行器（进程池 + 共享缓存），candidate_tasks 为本次可能执行的任务，用于确定共享哪些玩法"""
+    return TaskGroupPool(
+        engine, lottery_name, candidate_tasks,
+        workers=min(workers, max(len(group_tasks(candidate_tasks)), 1)),
+        prune_hit_rate=BEST_TASK_HIT_RATE if prune_mode else None,
+    )
+
+
+def run_tasks(tasks, task_pool: TaskGroupPool):
+    """回测一批任务：按组计算，逐条落库；lease_owner 不为空时只写回仍由本进程持有租约的任务"""
+    global completed_count
+    # ✅ 按 (玩法, lookback_n, offset, hit_rank_list) 分组，同组任务连续执行
+    task_groups = group_tasks(tasks)
+    log(f"🧩 共 {len(task_groups)} 个任务组（同组共用逐期排名）")
+    group_results = {}
+    # ⚠️ 租约模式下只写回仍由本进程持有的任务，租约已被其他进程接手的任务结果丢弃
+    owner_clause = lease_held_clause(tasks_table) if lease_owner else ""
+    group_result_iter = task_pool.iter_results(task_groups)
+
+    for task in [t for group in task_groups for t in group]:
+        with engine.begin() as conn:
+            position = int(task["position"])
+            lookback_n = task["lookback_n"]
+            query_playtype_name = task["query_playtype_name"]
+            hit_rank_list = json.loads(task["hit_rank_list"])
+            enable = json.loads(task["enable"])
+            skip_if_few = json.loads(task["skip_if_few"])
+            resolve_tie_mode = json.loads(task["resolve_tie_mode"])
+            reverse_on_tie = json.loads(task["reverse_on_tie"])
+
+            log(f"🚩 ID={task['id']} ➞ {query_playtype_name} | lookback_n={lookback_n} | HR={hit_rank_list} | enable={task_variant(task)['enable_dingwei_sha']}")
+
+            if task["id"] not in group_results:
+                # ✅ 任务按组连续排列，首次遇到某组时取下一组结果即为本组
+                group_results.update(next(group_result_iter))
+            result = group_results.pop(task["id"])
+
+            summary = summarize_result(result)
+            hit_count = summary["hit_count"]
+            skip_count = summary["skip_count"]
+            total_issues = summary["total_issues"]
+            hit_rate = summary["hit_rate"]
+
+            if result.get("pruned"):
+                # ✂️ 已不可能写入 best_tasks / best_ranks：只记录终止前的部分统计
+                log(f"✂️ ID={task['id']} ➞ 已剪枝 ➞ 部分统计 命中 {hit_count}/{total_issues}（跳过 {skip_count}）")
+                updated = conn.execute(text(f"""
+                    UPDATE {tasks_table}
+                    SET status='pruned', total_issues=:total_issues, hit_count=:hit_count,
+                        skip_count=:skip_count, hit_rate=:hit_rate, updated_at=:updated_at
+                    WHERE id=:id{owner_clause}
+                """), dict(
+                    id=task["id"],
+                    owner=lease_owner,
+                    total_issues=total_issues,
+                    hit_count=hit_count,
+                    skip_count=skip_count,
+                    hit_rate=hit_rate,
+                    updated_at=datetime.now()
+                ))
+                if lease_owner and not updated.rowcount:
+                    log(f"⚠️ ID={task['id']} ➞ 租约已失效（任务已被其他进程接手），本条结果不落库")
+                    continue
+                if lease_owner:
+                    drop_lease(conn, tasks_table, task["id"], lease_owner)
+                continue
+
+            log(f"📈 ID={task['id']} ➞ 命中 {hit_count}/{total_issues} ➞ 命中率={hit_rate}")
+            if skip_count > hit_count:
+                log(f"⚠️ 当前任务跳过期数占比过高（{skip_count}/{skip_count + hit_count + summary['miss_count']}），数据可靠性较低。")
+
+            updated = conn.execute(text(f"""
+                UPDATE {tasks_table}
+                SET status='done', total_issues=:total_issues, hit_count=:hit_count,
+                    skip_count=:skip_count, hit_rate=:hit_rate, updated_at=:updated_at
+                WHERE id=:id{owner_clause}
             """), dict(
-                position=position,
-                playtype=query_playtype_name,
-                lookback_n=lookback_n,
-                hit_rank_list=json.dumps(hit_rank_list, ensure_ascii=False),
-                enable=json.dumps(enable, ensure_ascii=False),
-                skip_if_few=json.dumps(skip_if_few, ensure_ascii=False),
-                resolve_tie_mode=json.dumps(resolve_tie_mode, ensure_ascii=False),
-                reverse_on_tie=json.dumps(reverse_on_tie, ensure_ascii=False),
+                id=task["id"],
+                owner=lease_owner,
+                total_issues=total_issues,
+                hit_count=hit_count,
+                skip_count=skip_count,
                 hit_rate=hit_rate,
-                created_at=datetime.now()
+                updated_at=datetime.now()
             ))
+            if lease_owner and not updated.rowcount:
+                log(f"⚠️ ID={task['id']} ➞ 租约已失效（任务已被其他进程接手），本条结果不落库")
+                continue
+            if lease_owner:
+                drop_lease(conn, tasks_table, task["id"], lease_owner)
+
+            task_config = dict(
+                position=position,
+                query_playtype_name=query_playtype_name,
+                lookback_n=lookback_n,
+                hit_rank_list=hit_rank_list,
+                enable=enable,
+                skip_if_few=skip_if_few,
+                resolve_tie_mode=resolve_tie_mode,
+                reverse_on_tie=reverse_on_tie,
+            )
+            save_best_records(conn, lottery_name, [(task_config, summary)])
+
+            zero_ranks = summary["unhit_ranks"]
+            log(f"✅ 调试: open_rank_counter={summary['open_rank_counter']} max_rank={summary['max_rank_length']}")
+
+            # ✅ 跳过期数大于命中期数则不写入 best_ranks
+            if not is_rank_reliable(summary):
+                log(f"⚠️ 跳过期数过多（跳过={skip_count} > 命中={hit_count}），本条不写入 best_ranks")
+                continue
+
+            log(f"📌 已写 best_ranks：未命中位={zero_ranks}")
+            best_ranks_count = conn.execute(text(f"SELECT COUNT(*) FROM {best_ranks_table}")).scalar()
+            log(f"📊 当前 {best_ranks_table} 总记录数: {best_ranks_count}")
+            completed_count += 1  # ✅ 统计已完成任务数
+
+        # ✅ 每完成50个额外执行一次上传
+        if completed_count % 50 == 0:
+            log(f"📦 累计完成 {completed_count} 条任务 ➞ 执行额外上传")
+            subprocess.run(upload_cmd)
+            time.sleep(1)
+
+        # 离开 with 以后执行子进程 upload
+        log("📤 单条任务完成 ➞ 启动增量上传")
+        subprocess.run(upload_cmd)
+        time.sleep(1)  # 给输出、操作程序给一点恢复时间
+
+
+if lease_mode or prune_mode:
+    ensure_status_schema()
+
+if lease_mode:
+    ensure_lease_table(engine, tasks_table)
+    log(f"🔐 租约模式已开启：持有者={lease_owner} | 每批 {CLAIM_BATCH_SIZE} 条 | 租约 {LEASE_SECONDS} 秒")
+    log_run_options()
+    claimed_total = 0
+    # ⚠️ 分片模式下先算出本分片的候选 id，按批限定认领范围；不分片时不限定
+    candidate_tasks = fetch_shard_tasks(("pending", "running"))
+    id_batches = [None]
+    if shard_count > 1:
+        shard_ids = [t["id"] for t in candidate_tasks]
+        id_batches = [shard_ids[i:i + CLAIM_BATCH_SIZE] for i in range(0, len(shard_ids), CLAIM_BATCH_SIZE)]
+    # ✅ 进程池与共享缓存在认领循环外创建一次，每批任务都复用，全部结束后才释放共享内存；
+    # ⚠️ 须先进入进程池（子进程在此全部 fork 完成），再启动持有数据库连接的心跳线程，避免带着活动线程 fork
+    with make_task_pool(candidate_tasks) as task_pool, LeaseHeartbeat(engine, tasks_table, lease_owner, LEASE_SECONDS):
+        for id_batch in id_batches:
+            while True:
+                tasks = claim_tasks(engine, tasks_table, lease_owner, CLAIM_BATCH_SIZE, LEASE_SECONDS, task_ids=id_batch)
+                if not tasks:
+                    break
+                claimed_total += len(tasks)
+                log(f"🌟 已认领任务: {len(tasks)}（累计 {claimed_total}）")
+                run_tasks(tasks, task_pool)
+    if not claimed_total:
+        log("✅ 没有待执行任务，已退出")
+        print("待执行任务: 0")
+        sys.exit(0)
+else:
+    tasks = fetch_shard_tasks(("pending",))
+
+    if not tasks:
+        log("✅ 没有待执行任务，已退出")
+        print("待执行任务: 0")
+        sys.exit(0)
 
-        open_rank_counter = result.get("open_rank_counter", {})
-        max_rank = result.get("max_rank_length", 0)
-        log(f"✅ 调试: open_rank_counter={open_rank_counter} max_rank={max_rank}")
-        all_possible = list(range(1, max_rank + 1))
-        zero_ranks = [r for r in all_possible if r not in open_rank_counter]
-
-        # ✅ 跳过期数大于命中期数则不写入 best_ranks
-        if skip_count > hit_count:
-            log(f"⚠️ 跳过期数过多（跳过={skip_count} > 命中={hit_count}），本条不写入 best_ranks")
-            continue
-
-        conn.execute(text(f"""
-            INSERT INTO {best_ranks_table}
-            (playtype, position, lookback_n, hit_rank_list, enable,
-             total_issues, open_rank_counter, unhit_ranks, created_at)
-            VALUES (:playtype, :position, :lookback_n, :hit_rank_list, :enable,
-                    :total_issues, :open_rank_counter, :unhit_ranks, :created_at)
-        """), dict(
-            playtype=query_playtype_name,
-            position=position,
-            lookback_n=lookback_n,
-            hit_rank_list=json.dumps(hit_rank_list, ensure_ascii=False),
-            enable=json.dumps(enable, ensure_ascii=False),
-            total_issues=total_issues,
-            open_rank_counter=json.dumps(open_rank_counter, ensure_ascii=False),
-            unhit_ranks=json.dumps(zero_ranks, ensure_ascii=False),
-            created_at=datetime.now()
-        ))
-
-
-        log(f"📌 已写 best_ranks：未命中位={zero_ranks}")
-        best_ranks_count = conn.execute(text(f"SELECT COUNT(*) FROM {best_ranks_table}")).scalar()
-        log(f"📊 当前 {best_ranks_table} 总记录数: {best_ranks_count}")
-        completed_count += 1  # ✅ 统计已完成任务数
-
-    # ✅ 每完成50个额外执行一次上传
-    if completed_count % 50 == 0:
-        log(f"📦 累计完成 {completed_count} 条任务 ➞ 执行额外上传")
-        subprocess.run([sys.executable, "scripts/upload_release.py", playtype_en, lottery_type])
-        time.sleep(1)
-
-    # 离开 with 以后执行子进程 upload
-    log("📤 单条任务完成 ➞ 启动增量上传")
-    subprocess.run([sys.executable, "scripts/upload_release.py", playtype_en, lottery_type])
-    time.sleep(1)  # 给输出、操作程序给一点恢复时间
+    log(f"🌟 待执行任务: {len(tasks)}")
+    log_run_options()
+    with make_task_pool(tasks) as task_pool:
+        run_tasks(tasks, task_pool)
 
 if completed_count % 50 != 0:
     log(f"📦 最后 {completed_count % 50} 条任务未满50 ➞ 执行最终上传")
-    subprocess.run([sys.executable, "scripts/upload_release.py", playtype_en, lottery_type])
+    subprocess.run(upload_cmd)
     time.sleep(1)
 
-# 执行后统计打印
-with engine.begin() as conn:
-    remaining = conn.execute(text(f"SELECT COUNT(*) FROM {tasks_table} WHERE status = 'pending'")).scalar()
-    print(f"待执行任务: {remaining}")
+# 执行后统计打印（分片模式下只统计本分片，其余分片的 pending 任务由对应作业负责）
+remaining = len(fetch_shard_tasks(("pending",)))
+print(f"待执行任务: {remaining}")
 
 save_log_file_if_needed(log_save_mode=True)
\ No newline at end of file
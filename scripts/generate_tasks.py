@@ -11,6 +11,9 @@
 
 📥 入参：
 - 命令行参数 1：玩法英文名（如 qianwei_ding1），默认值为 "qianwei_ding1"
+- 命令行参数 2：彩种（如 p5 / 3d），默认值为 "p5"
+- 命令行参数 3（可选）：grid ➜ 基础组合不再逐条写入 pending，而是整张网格一次遍历回测后直接写入 done 结果（含 hit+N 交集组合）；
+  STEP2 直接使用网格回测得到的逐任务 unhit_ranks（与写入 best_ranks 的行同口径，跳过期数多于命中期数的任务不采用），不依赖先行回测
 
 📤 输出：
 - 向 tasks 表插入符合条件的待分析任务（状态为 pending）
@@ -21,6 +24,7 @@
 
 ✨ 用法示例：
 python scripts/generate_tasks.py wanwei_ding1
+python scripts/generate_tasks.py wanwei_ding1 p5 grid
 
 ✅ 本脚本作为 LottoAI3 分析流水线的第一环节，自动准备可回测任务，是构建“高命中率组合搜索器”的关键组件。
 """
@@ -32,6 +36,10 @@ import json
 from datetime import datetime
 from sqlalchemy import text
 from utils.expert_hit_analysis import get_position_name_map
+from utils.issue_index import get_issue_index
+from utils.grid_evaluator import evaluate_lookback_grid, is_grid_hit_rank_list
+from utils.ranking_memo import RankingMemo
+from utils.task_results import summarize_result, insert_evaluated_tasks, is_rank_reliable
 from utils.db import (
     get_engine,
     get_table_name,
@@ -44,6 +52,7 @@ engine = get_engine()
 # 支持命令行传入 lottery_type（默认 p5）
 playtype_en = sys.argv[1] if len(sys.argv) > 1 else "qianwei_ding1"
 lottery_type = sys.argv[2] if len(sys.argv) > 2 else "p5"  # 默认排列5
+grid_mode = len(sys.argv) > 3 and sys.argv[3] == "grid"  # ✅ 网格一次性回测模式
 
 # 动态获取表名
 lottery_name = get_lottery_name(lottery_type)
@@ -52,6 +61,9 @@ tasks_table = get_table_name(lottery_name, "tasks")
 best_ranks_table = get_table_name(lottery_name, "best_ranks")
 
 base_config = load_base_config(lottery_type)
+# ✅ 基础组合（STEP1）一律从最新一期回溯；best_ranks 不记录 offset，由其追加的任务（STEP2）沿用同一 offset，
+# 与父任务的 task_group_key 相同，分片 / 分组时落在同一分片、同一任务组
+BASE_LOOKBACK_OFFSET = 0
 
 with engine.begin() as conn:
     has_new_task = False  # ✅ 新增标志位
@@ -84,14 +96,7 @@ with engine.begin() as conn:
 
     log(f"🎯 当前玩法: {playtype_name} ➜ 分位索引: {position}")
 
-    rows = conn.execute(text(f"""
-        SELECT DISTINCT issue_name
-        FROM {prediction_table}
-        WHERE playtype_name = :playtype_name
-        ORDER BY issue_name DESC
-    """), {"playtype_name": playtype_name}).fetchall()
-
-    issues = [row[0] for row in rows]
+    issues = get_issue_index(engine, lottery_name, playtype_name).latest()
 
     if not issues:
         log(f"❌ {prediction_table} 中无可用预测记录 ➜ {playtype_name}")
@@ -107,6 +112,58 @@ with engine.begin() as conn:
     log(f"✅ 当前加载配置路径: config/{lottery_type}_base.yaml")
     log(f"✅ HIT_RANK_COMBINATIONS: {hit_rank_combinations}")
 
+    if grid_mode:
+        # ✅ 已存在组合一次性读出，去重口径与逐条 SELECT 1 一致：["ALL"] 只比对 lookback_n + enable_first
+        existing = conn.execute(text(f"""
+            SELECT lookback_n, enable_first, hit_rank_list_first FROM {tasks_table}
+            WHERE analyze_playtype_name=:analyze_playtype_name
+        """), dict(analyze_playtype_name=analyze_playtype_name)).fetchall()
+        existing_any = {(int(r[0]), int(r[1])) for r in existing}
+        existing_first = {(int(r[0]), int(r[1]), str(r[2])) for r in existing if r[2] is not None}
+
+        def grid_task_exists(lookback_n, rank, hit_rank_list):
+            if hit_rank_list == ["ALL"]:
+                return (lookback_n, rank) in existing_any
+            return (lookback_n, rank, str(hit_rank_list[0])) in existing_first
+
+        grid_combinations = [hrl for hrl in hit_rank_combinations if is_grid_hit_rank_list(hrl)]
+        hit_rank_combinations = [hrl for hrl in hit_rank_combinations if not is_grid_hit_rank_list(hrl)]
+        grid_ranks = list(range(1, 11))
+
+        log(f"🧮 网格模式：一次遍历回测 {len(lookback_ns) * len(grid_ranks) * len(grid_combinations)} 个基础组合")
+        ranking_memo = RankingMemo()
+        grid_results = evaluate_lookback_grid(
+            engine, lottery_name, query_playtype_name, analyze_playtype_name, position,
+            lookback_ns, grid_combinations, grid_ranks, lookback_offsets=[BASE_LOOKBACK_OFFSET],
+            skip_if_few=True, resolve_tie_mode="False", reverse_on_tie=True,
+            ranking_memo=ranking_memo,
+        )
+        log(f"♻️ 入选集合复用：{ranking_memo.hits} / {ranking_memo.lookups} = {ranking_memo.hit_rate():.2%}")
+
+        grid_summaries = [(item, summarize_result(item)) for item in grid_results]
+        records = []
+        for item, summary in grid_summaries:
+            if grid_task_exists(item["lookback_n"], item["rank"], item["hit_rank_list"]):
+                continue
+            task = dict(
+                position=position,
+                query_playtype_name=query_playtype_name,
+                analyze_playtype_name=analyze_playtype_name,
+                lookback_n=item["lookback_n"],
+                lookback_offset=item["lookback_offset"],
+                hit_rank_list=item["hit_rank_list"],
+                enable={"dingwei_sha": [item["rank"]]},
+                skip_if_few={"dingwei_sha": True},
+                resolve_tie_mode={"dingwei_sha": "False"},
+                reverse_on_tie={"dingwei_sha": True},
+            )
+            records.append((task, summary))
+
+        insert_evaluated_tasks(conn, lottery_name, records)
+        log(f"✅ 网格模式已写入 {len(records)} 条已回测组合（跳过已存在 {len(grid_results) - len(records)} 条）")
+        if records:
+            has_new_task = True
+
     for lookback_n in lookback_ns:
         for rank in range(1, 11):  # 1 ~ 10
             for hit_rank_list in hit_rank_combinations:
@@ -143,15 +200,16 @@ with engine.begin() as conn:
 
                 conn.execute(text(f"""
                     INSERT INTO {tasks_table}
-                    (position, query_playtype_name, analyze_playtype_name, lookback_n, hit_rank_list, enable,
+                    (position, query_playtype_name, analyze_playtype_name, lookback_n, lookback_offset, hit_rank_list, enable,
                      skip_if_few, resolve_tie_mode, reverse_on_tie, status, created_at)
-                    VALUES (:position, :query_playtype_name, :analyze_playtype_name, :lookback_n, :hit_rank_list, :enable,
+                    VALUES (:position, :query_playtype_name, :analyze_playtype_name, :lookback_n, :lookback_offset, :hit_rank_list, :enable,
                             :skip_if_few, :resolve_tie_mode, :reverse_on_tie, :status, :created_at)
                 """), dict(
                     position=position,
                     query_playtype_name=query_playtype_name,
                     analyze_playtype_name=analyze_playtype_name,
                     lookback_n=lookback_n,
+                    lookback_offset=BASE_LOOKBACK_OFFSET,
                     hit_rank_list=json.dumps(hit_rank_list, ensure_ascii=False, sort_keys=True),
                     enable=json.dumps(enable, ensure_ascii=False, sort_keys=True),
                     skip_if_few=json.dumps(skip_if_few, ensure_ascii=False, sort_keys=True),
@@ -168,6 +226,30 @@ with engine.begin() as conn:
     log("📌 [STEP2] 从 best_ranks 追加优质组合")
 
     rows = conn.execute(text(f"SELECT * FROM {best_ranks_table}")).mappings().all()
+    if grid_mode:
+        # ✅ 网格模式：STEP1 已得到每个基础任务的完整回测结果，按 save_best_records 的口径（跳过 ≤ 命中）
+        # 还原出对应的 best_ranks 行，已在本次之前回测过、因而未重新写入的基础任务也能参与追加；
+        # 表中已有的同一任务行原样保留，不以推导结果覆盖
+        derived_rows = [dict(
+            playtype=playtype_name,
+            position=position,
+            lookback_n=item["lookback_n"],
+            lookback_offset=item["lookback_offset"],
+            hit_rank_list=json.dumps(item["hit_rank_list"], ensure_ascii=False),
+            enable=json.dumps({"dingwei_sha": [item["rank"]]}, ensure_ascii=False),
+            unhit_ranks=json.dumps(summary["unhit_ranks"], ensure_ascii=False),
+        ) for item, summary in grid_summaries if is_rank_reliable(summary)]
+
+        def rank_row_key(row):
+            return (row["playtype"], int(row["position"]), int(row["lookback_n"]),
+                    json.dumps(json.loads(row["hit_rank_list"]), ensure_ascii=False, sort_keys=True),
+                    json.dumps(json.loads(row["enable"]), ensure_ascii=False, sort_keys=True))
+
+        existing_keys = {rank_row_key(r) for r in rows}
+        derived_rows = [r for r in derived_rows if rank_row_key(r) not in existing_keys]
+        rows = list(rows) + derived_rows
+        log(f"🧮 网格模式：由网格回测结果补充 {len(derived_rows)} 条 best_ranks 口径的 unhit_ranks（已过滤跳过期数过多的任务）")
+
     if not rows:
         log("✅ best_ranks 暂无数据，跳过")
     else:
@@ -181,6 +263,8 @@ with engine.begin() as conn:
             position = row["position"]
             playtype = row["playtype"]
             lookback_n = row["lookback_n"]
+            # ✅ 与父任务同 offset（网格推导行带 offset，表中读出的行没有 offset 列，父任务即基础组合）
+            lookback_offset = row.get("lookback_offset", BASE_LOOKBACK_OFFSET)
             hit_rank_list = json.loads(row["hit_rank_list"])
 
             query_playtype_name = playtype
@@ -215,15 +299,16 @@ with engine.begin() as conn:
 
                 conn.execute(text(f"""
                     INSERT INTO {tasks_table}
-                    (position, query_playtype_name, analyze_playtype_name, lookback_n, hit_rank_list, enable,
+                    (position, query_playtype_name, analyze_playtype_name, lookback_n, lookback_offset, hit_rank_list, enable,
                      skip_if_few, resolve_tie_mode, reverse_on_tie, status, created_at)
-                    VALUES (:position, :query_playtype_name, :analyze_playtype_name, :lookback_n, :hit_rank_list, :enable,
+                    VALUES (:position, :query_playtype_name, :analyze_playtype_name, :lookback_n, :lookback_offset, :hit_rank_list, :enable,
                             :skip_if_few, :resolve_tie_mode, :reverse_on_tie, :status, :created_at)
                 """), dict(
                     position=position,
                     query_playtype_name=query_playtype_name,
                     analyze_playtype_name=analyze_playtype_name,
                     lookback_n=lookback_n,
+                    lookback_offset=lookback_offset,
                     hit_rank_list=json.dumps(hit_rank_list, ensure_ascii=False, sort_keys=True),
                     enable=json.dumps(enable, ensure_ascii=False, sort_keys=True),
                     skip_if_few=json.dumps(skip_if_few, ensure_ascii=False, sort_keys=True),
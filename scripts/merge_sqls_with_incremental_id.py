@@ -1,6 +1,7 @@
 import os
 import re
 import sys
+from collections import Counter
 
 lottery_type = sys.argv[1] if len(sys.argv) > 1 else "p5"
 
@@ -25,10 +26,41 @@ TABLES = {
     ]
 }
 
+# ✅ tasks 表的自然键：同一任务配置在多个备份（如分片作业各自还原的同一份任务表）中只保留进度最靠后的一条
+TASK_NATURAL_KEY = [
+    "position", "lookback_n", "lookback_offset",
+    "query_playtype_name", "analyze_playtype_name",
+    "hit_rank_list", "enable", "skip_if_few",
+    "resolve_tie_mode", "reverse_on_tie",
+]
+TASK_STATUS_PRIORITY = {"pending": 0, "running": 1, "pruned": 2, "done": 3}
+
 DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
 OUTPUT_SQL = os.path.join(DATA_DIR, f"merged_tasks_{lottery_type}.sql")
 
 
+def split_sql_values(group: str):
+    """按逗号拆分一行 VALUES，忽略引号内的逗号（JSON 字段含逗号），转义字符原样保留"""
+    values, current, quote, escaped = [], [], None, False
+    for ch in group:
+        if escaped:
+            escaped = False
+        elif ch == "\\":
+            escaped = True
+        elif quote:
+            if ch == quote:
+                quote = None
+        elif ch in ("'", '"'):
+            quote = ch
+        elif ch == ",":
+            values.append("".join(current).strip())
+            current = []
+            continue
+        current.append(ch)
+    values.append("".join(current).strip())
+    return values
+
+
 def extract_rows(sql_text: str, table_name: str):
     rows = []
     insert_pattern = re.compile(
@@ -37,16 +69,51 @@ def extract_rows(sql_text: str, table_name: str):
     )
     for match in insert_pattern.finditer(sql_text):
         _, values_block = match.groups()
-        value_groups = re.findall(r"\(([^;]*?)\)(?:,|\s*;)\s*", values_block, re.DOTALL)
+        # ⚠️ 外层正则已吃掉结尾分号，最后一组以字符串结尾收尾
+        value_groups = re.findall(r"\(([^;]*?)\)(?:,|\s*;|\s*$)\s*", values_block, re.DOTALL)
         for group in value_groups:
-            values = [v.strip() for v in group.split(",")]
+            values = split_sql_values(group)
             if len(values) >= 2:
                 rows.append(values[1:])  # 去除 id
     return rows
 
 
+def merge_task_rows(rows: list, columns: list):
+    """tasks 表按自然键去重：保留状态最靠后（done > pruned > running > pending）的一条，先出现者优先"""
+    value_columns = columns[1:]  # 已去除 id
+    key_idx = [value_columns.index(col) for col in TASK_NATURAL_KEY]
+    status_idx = value_columns.index("status")
+
+    def status_rank(row):
+        return TASK_STATUS_PRIORITY.get(row[status_idx].strip("'\""), -1)
+
+    merged = {}
+    for row in rows:
+        if len(row) != len(value_columns):
+            # ⚠️ 列数与预期不符（表结构变动）时无法定位自然键，原样保留
+            merged[("__raw__", len(merged))] = row
+            continue
+        key = tuple(row[i] for i in key_idx)
+        kept = merged.get(key)
+        if kept is None or status_rank(row) > status_rank(kept):
+            merged[key] = row
+    return list(merged.values())
+
+
+def union_rows(rows_per_file: list):
+    """
+    best_tasks / best_ranks 按整行取多重集并集：各备份共有的行只保留一份，
+    同一备份内的重复行保留原有份数
+    """
+    counts = Counter()
+    for rows in rows_per_file:
+        for row, n in Counter(tuple(row) for row in rows).items():
+            counts[row] = max(counts[row], n)
+    return [list(row) for row, n in counts.items() for _ in range(n)]
+
+
 def merge_sql_files_with_auto_id(filepaths: list, start_ids: dict):
-    all_data = {table: [] for table in TABLES}
+    rows_per_file = {table: [] for table in TABLES}
 
     for path in filepaths:
         print(f"\n📂 正在读取: {path}")
@@ -55,9 +122,19 @@ def merge_sql_files_with_auto_id(filepaths: list, start_ids: dict):
             sql_text = f.read()
         for table in TABLES:
             rows = extract_rows(sql_text, table)
-            all_data[table].extend(rows)
+            rows_per_file[table].append(rows)
             print(f"✅ 表 {table} 提取 {len(rows)} 条记录")
 
+    all_data = {}
+    for table, columns in TABLES.items():
+        if table.startswith("tasks_"):
+            all_data[table] = merge_task_rows([row for rows in rows_per_file[table] for row in rows], columns)
+        else:
+            all_data[table] = union_rows(rows_per_file[table])
+        extracted = sum(len(rows) for rows in rows_per_file[table])
+        if extracted != len(all_data[table]):
+            print(f"♻️ 表 {table} 按自然键去重：{extracted} ➜ {len(all_data[table])} 条")
+
     with open(OUTPUT_SQL, "w", encoding="utf-8") as f:
         for table, columns in TABLES.items():
             all_rows = all_data[table]
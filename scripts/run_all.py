@@ -6,6 +6,7 @@ from time import sleep
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.stdout.reconfigure(encoding="utf-8")
+from utils.task_shard import parse_shard_args, shard_argv
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 os.chdir(PROJECT_ROOT)  # 切换到项目根目录
@@ -44,6 +45,11 @@ def run_command(cmd, capture=False):
 if __name__ == "__main__":
     playtype = sys.argv[1] if len(sys.argv) > 1 else "gewei_sha3"
     lottery_type = sys.argv[2] if len(sys.argv) > 2 else "p5"
+    # ✅ 可选 --shard-index I --shard-count N：原样转发给 backtest / upload_release，本作业只回测并上传第 I 份任务
+    shard_index, shard_count = parse_shard_args(sys.argv[3:])
+    shard_args = shard_argv(shard_index, shard_count)
+    if shard_args:
+        print(f"🧮 分片模式：第 {shard_index} 片 / 共 {shard_count} 片")
 
     while True:
         print("\n📌 === STEP 1: 生成任务 ===")
@@ -57,7 +63,7 @@ if __name__ == "__main__":
 
         backtest_output_lines = []
         process = subprocess.Popen(
-            [sys.executable, "-u", "scripts/backtest.py", playtype, lottery_type],
+            [sys.executable, "-u", "scripts/backtest.py", playtype, lottery_type] + shard_args,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             text=True,
@@ -79,7 +85,7 @@ if __name__ == "__main__":
 
         if no_new_task and no_pending_task:
             print("\n✅ 没有新任务且没有可执行任务 ➜ 主流程收工退出")
-            run_command([sys.executable, "scripts/upload_release.py", playtype, lottery_type])
+            run_command([sys.executable, "scripts/upload_release.py", playtype, lottery_type] + shard_args)
             break
 
         print("\n⏳ 还有任务或有新组合 ➜ 等待下一轮...")
@@ -13,6 +13,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.logger import log, save_log_file_if_needed, init_log_capture
 from utils.db import get_engine, get_table_name, get_lottery_name
 from utils.expert_hit_analysis import run_hit_analysis_batch
+from utils.issue_index import get_issue_index
 
 # ✅ 初始化日志
 if "__print_original__" not in builtins.__dict__:
@@ -32,12 +33,7 @@ check_mode = os.getenv("CHECK_MODE", "dingwei")
 engine = get_engine()
 
 # ✅ 获取最新期号列表
-with engine.begin() as trans:
-    result = trans.execute(text(f"""
-        SELECT DISTINCT issue_name FROM {get_table_name(lottery_name, 'expert_predictions')}
-        ORDER BY issue_name DESC LIMIT {lookback_n}
-    """))
-    query_issues = [row[0] for row in result.fetchall()][::-1]
+query_issues = get_issue_index(engine, lottery_name).latest(lookback_n)[::-1]
 print(f"✅ QUERY_ISSUES: {query_issues}")
 
 # ✅ 获取已分析 origin_id（passed + failed）
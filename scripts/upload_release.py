@@ -12,13 +12,16 @@ os.environ["GH_TOKEN"] = os.getenv("GH_TOKEN", "")
 
 import subprocess
 from utils.upload_tools import do_final_dump_and_upload
+from utils.task_shard import parse_shard_args, shard_suffix
 
 if __name__ == "__main__":
     playtype = sys.argv[1] if len(sys.argv) > 1 else "unknown"
     lottery_type = sys.argv[2] if len(sys.argv) > 2 else "3d"
+    # ✅ 分片作业上传到各自的 Release（tag 带 _shardIofN 后缀），互不覆盖
+    shard_index, shard_count = parse_shard_args(sys.argv[3:])
 
-    print(f"\n🕒 启动上传任务 ➜ {lottery_type} ➜ {playtype}")
-    do_final_dump_and_upload(playtype, lottery_type)
+    print(f"\n🕒 启动上传任务 ➜ {lottery_type} ➜ {playtype}{shard_suffix(shard_index, shard_count)}")
+    do_final_dump_and_upload(playtype, lottery_type, shard_suffix(shard_index, shard_count))
 
     # print("\n📢 正在发送企业微信通知...")
     # result = subprocess.run(
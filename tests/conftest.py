@@ -0,0 +1,127 @@
+# tests/conftest.py
+# 测试公共夹具：用 sqlite 临时库代替 MySQL，按真实表结构随机生成专家推荐与开奖数据
+import os, sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import random
+import sqlite3
+from collections import Counter
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from utils.hit_rule import match_hit
+from utils.open_code_cache import clear_open_code_cache, get_open_code_cache
+from utils.issue_index import clear_issue_index_cache
+from utils.ranking_memo import clear_ranking_memo
+from utils.exact_hit_matrix import clear_exact_hit_cache
+from utils.prediction_cube import clear_prediction_cube_cache
+from utils.hit_timeline import clear_hit_timeline_cache
+from utils.hit_matrix import clear_hit_matrix_cache
+
+P5_PLAYTYPES = {"万位定5": 5, "万位杀1": 1, "千位定3": 3, "个位杀3": 3, "百位定1": 1}
+D3_PLAYTYPES = {
+    "独胆": 1, "双胆": 2, "三胆": 3, "五码组选": 5, "六码组选": 6, "杀一": 1, "杀二": 2,
+    "百位定3": 3, "十位定1": 1, "定位3*3*3-百位": 3, "定位4*4*4-个位": 4,
+}
+
+
+def build_fixture_db(path: str, lottery_type: str = "p5", n_issues: int = 70, n_users: int = 30, seed: int = 1):
+    """生成 expert_predictions_XXX / lottery_results_XXX：期号有间断、约 5% 期号未开奖、3D 含组三 / 豹子号"""
+    rnd = random.Random(seed)
+    playtypes = P5_PLAYTYPES if lottery_type == "p5" else D3_PLAYTYPES
+    n_digits = 5 if lottery_type == "p5" else 3
+    con = sqlite3.connect(path)
+    con.execute(f"CREATE TABLE expert_predictions_{lottery_type} (id INTEGER PRIMARY KEY, issue_name TEXT, playtype_name TEXT, user_id INTEGER, numbers TEXT)")
+    con.execute(f"CREATE TABLE lottery_results_{lottery_type} (issue_name TEXT, open_code TEXT)")
+    issues, issue = [], 2024001
+    while len(issues) < n_issues:
+        issues.append(issue)
+        issue += rnd.choice([1, 1, 1, 2])
+    for issue in issues:
+        for playtype, size in playtypes.items():
+            users = list(range(1000, 1000 + n_users))
+            rnd.shuffle(users)
+            for user_id in users:
+                if rnd.random() < 0.2:
+                    continue
+                digits = rnd.sample(range(10), size)
+                if rnd.random() < 0.1:
+                    digits = sorted(digits)
+                con.execute(
+                    f"INSERT INTO expert_predictions_{lottery_type}(issue_name, playtype_name, user_id, numbers) VALUES (?,?,?,?)",
+                    (str(issue), playtype, user_id, ",".join(map(str, digits))),
+                )
+    for issue in issues:
+        if rnd.random() < 0.05:
+            continue
+        if lottery_type == "3d" and rnd.random() < 0.15:
+            d, e = rnd.randrange(10), rnd.randrange(10)
+            code = [d, d, e] if rnd.random() < 0.7 else [d, d, d]
+        else:
+            code = [rnd.randrange(10) for _ in range(n_digits)]
+        con.execute(f"INSERT INTO lottery_results_{lottery_type} VALUES (?,?)", (str(issue), ",".join(map(str, code))))
+    con.commit()
+    con.close()
+
+
+def recount_window_hits(engine, lottery_name, playtype, issue_list):
+    """逐期查询、逐行 match_hit 重新统计窗口内 {user_id: 命中次数}"""
+    open_cache = get_open_code_cache(engine, lottery_name)
+    table = "expert_predictions_p5" if lottery_name == "排列5" else "expert_predictions_3d"
+    hits, participants = Counter(), set()
+    for issue in issue_list:
+        df = pd.read_sql(f"SELECT user_id, numbers FROM {table} WHERE issue_name = %s AND playtype_name = %s", engine, params=(issue, playtype))
+        participants.update(df["user_id"].tolist())
+        open_code = open_cache.get_open_code(issue)
+        if open_code is None:
+            continue
+        for uid, numbers in zip(df["user_id"], df["numbers"]):
+            if match_hit(playtype, numbers, open_code, None):
+                hits[uid] += 1
+    return {uid: hits.get(uid, 0) for uid in participants}
+
+
+def clear_process_caches():
+    for clear in (clear_open_code_cache, clear_issue_index_cache, clear_ranking_memo, clear_exact_hit_cache,
+                  clear_prediction_cube_cache, clear_hit_timeline_cache, clear_hit_matrix_cache):
+        clear()
+
+
+@pytest.fixture(scope="session", autouse=True)
+def sqlite_read_sql():
+    """业务代码按 MySQL 驱动写 %s 占位符，sqlite 下改为 ? 并走原始连接执行"""
+    original = pd.read_sql
+
+    def read_sql(sql, con, params=None, **kwargs):
+        if isinstance(sql, str):
+            raw = con.raw_connection()
+            try:
+                return original(sql.replace("%s", "?"), raw.driver_connection, params=params, **kwargs)
+            finally:
+                raw.close()
+        return original(sql, con, params=params, **kwargs)
+
+    pd.read_sql = read_sql
+    yield
+    pd.read_sql = original
+
+
+@pytest.fixture(scope="session")
+def p5_engine(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("db") / "p5.db")
+    build_fixture_db(path, "p5")
+    return create_engine(f"sqlite:///{path}")
+
+
+@pytest.fixture(scope="session")
+def d3_engine(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("db") / "3d.db")
+    build_fixture_db(path, "3d")
+    return create_engine(f"sqlite:///{path}")
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    """进程级缓存按彩种 / 玩法而非 engine 区分，每个用例前后清空，避免用例之间互相影响"""
+    clear_process_caches()
+    yield
+    clear_process_caches()
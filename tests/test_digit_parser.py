@@ -0,0 +1,77 @@
+# tests/test_digit_parser.py
+# 批量数字解析与逐行 re.findall(r"\d+") 逐项一致
+import random
+import re
+from collections import Counter
+import numpy as np
+import pytest
+from utils.digit_parser import parse_digit_column, mask_of, digits_of, MASK_BITS, INT64_MAX
+
+TOKENS = ["0", "1", "5", "9", "05", "10", "15", "16", "123", "007"]
+SEPARATORS = [",", " ", "|", "-", "，", "a", "", "  "]
+
+
+def random_column(rnd, n_rows, unicode_digits=False):
+    column = []
+    for _ in range(n_rows):
+        if rnd.random() < 0.05:
+            column.append(None)
+            continue
+        parts = []
+        for _ in range(rnd.randrange(0, 8)):
+            parts.append(rnd.choice(TOKENS) if rnd.random() < 0.3 else str(rnd.randrange(10)))
+            parts.append(rnd.choice(SEPARATORS) if rnd.random() < 0.3 else ",")
+        if unicode_digits and rnd.random() < 0.2:
+            parts.append("５")  # 全角数字：re \d 匹配，int 后为 5
+        column.append("".join(parts))
+    return column
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("unicode_digits", [False, True])
+def test_parse_matches_findall(seed, unicode_digits):
+    rnd = random.Random(seed)
+    column = random_column(rnd, 300, unicode_digits)
+    parsed = parse_digit_column(column)
+    assert parsed.n_rows == len(column)
+    for row, s in enumerate(column):
+        tokens = re.findall(r"\d+", s or "")
+        values = [int(t) for t in tokens]
+        assert parsed.row_values(row) == values
+        assert parsed.lengths[row] == len(values)
+        assert parsed.digits[row, :len(values)].tolist() == values
+        assert (parsed.digits[row, len(values):] == -1).all()
+        assert int(parsed.masks[row]) == mask_of(values)
+        assert bool(parsed.canonical[row]) == all(len(t) == 1 and t.isascii() for t in tokens)
+        counts = Counter(v for v in values if v < MASK_BITS)
+        assert parsed.counts[row].tolist() == [counts.get(d, 0) for d in range(MASK_BITS)]
+
+    for targets in ([3], [0, 5, 9], [10, 16], list(range(10))):
+        expected = [len(set(map(int, re.findall(r"\d+", s or ""))) & set(targets)) for s in column]
+        assert parsed.intersect_count(targets).tolist() == expected
+
+
+@pytest.mark.parametrize("unicode_digits", [False, True])
+def test_long_tokens_and_repeats_do_not_wrap(unicode_digits):
+    # 18 位以内精确求值；更长的数字串不回绕，超出 int64 的饱和为上限（全角数字走逐行正则）；同一数字重复 300 次计数不回绕
+    long_tokens = ["9" * 18, "1" + "0" * 18, "9223372036854775807", "9223372036854775808", "0" * 25 + "7", "12345678901234567890123"]
+    column = [",".join(long_tokens), ",".join(["3"] * 300), "１" if unicode_digits else ""]
+    parsed = parse_digit_column(column)
+    assert parsed.row_values(0) == [min(int(t), INT64_MAX) for t in long_tokens]
+    assert parsed.masks[0] == mask_of([7])
+    assert parsed.counts[1, 3] == 300 and parsed.lengths[1] == 300
+
+
+def test_mask_round_trip():
+    rnd = random.Random(0)
+    for _ in range(200):
+        digits = sorted(set(rnd.sample(range(MASK_BITS), rnd.randrange(MASK_BITS))))
+        assert digits_of(mask_of(digits)) == digits
+
+
+def test_empty_column():
+    parsed = parse_digit_column(["", None, "abc"])
+    assert parsed.lengths.tolist() == [0, 0, 0]
+    assert parsed.masks.tolist() == [0, 0, 0]
+    assert parsed.canonical.tolist() == [True, True, True]
+    assert np.asarray(parsed.values).size == 0
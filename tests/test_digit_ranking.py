@@ -0,0 +1,59 @@
+# tests/test_digit_ranking.py
+# 推荐数字排名（DigitRanking）与 Counter.most_common() 一致
+import random
+from collections import Counter
+import pytest
+from utils.digit_ranking import DigitRanking
+from utils.expert_hit_analysis import track_open_rank
+
+
+def random_values(rnd, high=10):
+    """少量取值、大量并列；high 超过稠密上限时走 np.unique 分支"""
+    return [rnd.randrange(high) for _ in range(rnd.randrange(0, 60))]
+
+
+@pytest.mark.parametrize("high", [3, 10, 5000])
+def test_digit_ranking_matches_counter(high):
+    rnd = random.Random(high)
+    for _ in range(300):
+        values = random_values(rnd, high)
+        counter = Counter(values)
+        ranking = DigitRanking(values)
+        expected = counter.most_common()
+        sorted_items = [num for num, _ in expected]
+
+        assert ranking.most_common() == expected
+        assert len(ranking) == len(counter)
+        assert list(ranking.to_counter().items()) == list(counter.items())
+        for digit in set(values) | {-1, high, high + 7}:
+            assert ranking.rank_of(digit) == (sorted_items.index(digit) + 1 if digit in counter else None)
+        for idx in list(range(len(expected))) + [-1] * bool(expected):
+            assert ranking.tie_size(idx) == sum(1 for _, c in expected if c == expected[idx][1])
+
+
+def test_first_seen_with_long_repeated_runs():
+    # 长序列、每个数字重复上千次且全部同次数并列：名次完全由首次出现位置决定
+    rnd = random.Random(0)
+    digits = list(range(10))
+    rnd.shuffle(digits)
+    tail = [d for _ in range(1999) for d in digits]
+    rnd.shuffle(tail)
+    values = digits + tail
+    ranking = DigitRanking(values)
+    assert ranking.most_common() == Counter(values).most_common()
+    assert ranking.first_seen.tolist() == [values.index(d) for d in ranking.digits.tolist()]
+
+
+
+@pytest.mark.parametrize("check_mode, position", [("dingwei", 0), ("dingwei", 2), ("dingwei", -1), ("all", None)])
+def test_track_open_rank_with_ranking_matches_counter(check_mode, position):
+    # ✅ 带 DigitRanking 的结果直接查名次，与只带 num_counter 的旧结果（sorted_items.index）计数相同
+    rnd = random.Random(f"{check_mode}{position}")
+    by_ranking, by_counter = Counter(), Counter()
+    for _ in range(300):
+        values = random_values(rnd)
+        open_digits = [rnd.randrange(10) for _ in range(rnd.choice([3, 5]))]
+        result = {"num_counter": Counter(values), "open_code": ",".join(map(str, open_digits)), "open_digits": open_digits}
+        track_open_rank(dict(result, ranking=DigitRanking(values)), position, by_ranking, check_mode=check_mode)
+        track_open_rank(result, position, by_counter, check_mode=check_mode)
+    assert list(by_ranking.items()) == list(by_counter.items())
@@ -0,0 +1,46 @@
+# tests/test_exact_hit_matrix.py
+# hit+N 精确命中位图与逐期“恰好命中 N 个”用户集合取交集（原 analyze_expert_hits 逐期循环）一致
+import random
+import re
+import pytest
+from utils.exact_hit_matrix import get_exact_hit_matrix
+from utils.open_code_cache import get_open_code_cache
+from utils.prediction_cube import get_prediction_cube
+
+
+def scalar_window_users(cube, open_cache, n, start, stop):
+    per_issue = []
+    for issue in cube.issue_names[start:stop]:
+        open_code = open_cache.get_open_code(issue)
+        if open_code is None:
+            continue
+        open_nums = set(map(int, re.findall(r"\d+", open_code)))
+        df = cube.predictions_at(issue)
+        per_issue.append({uid for uid, numbers in zip(df["user_id"], df["numbers"])
+                          if len(set(map(int, re.findall(r"\d+", numbers))) & open_nums) == n})
+    return set.intersection(*per_issue) if per_issue else set()
+
+
+@pytest.mark.parametrize("lottery_name, engine_fixture, playtype", [
+    ("排列5", "p5_engine", "万位定5"),
+    ("排列5", "p5_engine", "千位定3"),
+    ("福彩3D", "d3_engine", "五码组选"),
+    ("福彩3D", "d3_engine", "双胆"),
+])
+def test_window_users_match_scalar(request, lottery_name, engine_fixture, playtype):
+    engine = request.getfixturevalue(engine_fixture)
+    cube = get_prediction_cube(engine, lottery_name, playtype)
+    open_cache = get_open_code_cache(engine, lottery_name)
+    matrix = get_exact_hit_matrix(engine, lottery_name, playtype)
+    rnd = random.Random(5)
+    n_issues = len(cube.issue_names)
+    nonempty = 0
+    for _ in range(40):
+        stop = rnd.randrange(0, n_issues + 1)
+        start = max(stop - rnd.choice([1, 2, 3, 5]), 0)
+        n = rnd.randrange(0, 4)
+        expected = scalar_window_users(cube, open_cache, n, start, stop)
+        got = set(cube.user_ids[matrix.window_users(n, start, stop)].tolist())
+        assert got == expected, (n, start, stop)
+        nonempty += bool(expected)
+    assert nonempty  # 确保覆盖到非空交集
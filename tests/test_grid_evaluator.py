@@ -0,0 +1,66 @@
+# tests/test_grid_evaluator.py
+# 网格评估与逐任务 run_hit_analysis_batch（All 模式、dingwei 判断）逐项一致；逐集合向量化提取与 extract_strategy 一致
+import random
+from collections import Counter
+import numpy as np
+import pytest
+from utils.expert_hit_analysis import run_hit_analysis_batch, extract_strategy
+from utils.grid_evaluator import evaluate_lookback_grid, rank_sets, pick_ranked_numbers
+from utils.logger import collect_logs
+
+
+def single_task_result(engine, lottery_name, playtype, position, item, skip_if_few, resolve_tie_mode, reverse_on_tie):
+    result = run_hit_analysis_batch(
+        engine=engine, lottery_name=lottery_name, query_issues=["All"],
+        enable_hit_check=True, enable_track_open_rank=True, dingwei_sha_pos=position, check_mode="dingwei",
+        analysis_kwargs=dict(
+            query_playtype_name=playtype, analyze_playtype_name=playtype, mode="rank",
+            hit_rank_list=item["hit_rank_list"], lookback_n=item["lookback_n"], lookback_start_offset=item["lookback_offset"],
+            enable_dingwei_sha=[item["rank"]], skip_if_few_dingwei_sha=skip_if_few,
+            resolve_tie_mode_dingwei_sha=resolve_tie_mode, reverse_on_tie_dingwei_sha=reverse_on_tie, use_cube=True,
+        ),
+    )
+    return result["hit_count"], result["miss_count"], result["skip_count"], list(result["open_rank_counter"].items()), result["max_rank_length"]
+
+
+@pytest.mark.parametrize("lottery_name, engine_fixture, playtype, position", [
+    ("排列5", "p5_engine", "万位定5", 0),
+    ("福彩3D", "d3_engine", "五码组选", 0),
+])
+@pytest.mark.parametrize("resolve_tie_mode, reverse_on_tie, skip_if_few", [("False", True, True), ("Next", False, False)])
+def test_grid_matches_single_task(request, lottery_name, engine_fixture, playtype, position, resolve_tie_mode, reverse_on_tie, skip_if_few):
+    engine = request.getfixturevalue(engine_fixture)
+    # ✅ lookback_n 为 0 / None 时回溯全部历史
+    grid = evaluate_lookback_grid(
+        engine, lottery_name, playtype, playtype, position,
+        [0, None, 1, 3, 20, 100], [[1], [-1], [1, 2, 3], ["ALL"], ["hit+1"]], [1, 2, 5, -1],
+        lookback_offsets=[0, 2], skip_if_few=skip_if_few, resolve_tie_mode=resolve_tie_mode, reverse_on_tie=reverse_on_tie,
+    )
+    rnd = random.Random(9)
+    for item in [i for i in grid if not i["lookback_n"]] + rnd.sample(grid, 12):
+        expected = single_task_result(engine, lottery_name, playtype, position, item, skip_if_few, resolve_tie_mode, reverse_on_tie)
+        got = (item["hit_count"], item["miss_count"], item["skip_count"], list(item["open_rank_counter"].items()), item["max_rank_length"])
+        assert got == expected, item
+
+
+@pytest.mark.parametrize("resolve_tie_mode, reverse_on_tie, skip_if_few", [
+    ("False", True, True), ("False", False, False), ("Next", False, False), ("Next", True, True), ("Skip", True, False),
+])
+def test_pick_ranked_numbers_match_extract_strategy(resolve_tie_mode, reverse_on_tie, skip_if_few):
+    rnd = random.Random(f"{resolve_tie_mode}-{reverse_on_tie}-{skip_if_few}")
+    sequences = [[rnd.randrange(10) for _ in range(rnd.randrange(0, 25))] for _ in range(400)]
+    set_counts = np.zeros((len(sequences), 10), dtype=np.int64)
+    set_first = np.full((len(sequences), 10), 1000, dtype=np.int64)
+    for i, values in enumerate(sequences):
+        for pos, value in enumerate(values):
+            set_counts[i, value] += 1
+            set_first[i, value] = min(set_first[i, value], pos)
+    ranked = rank_sets(set_counts, set_first)
+    for rank in (1, 2, 3, 5, 9, -1, -2, -5, 0):
+        picks = pick_ranked_numbers(ranked, rank, skip_if_few, resolve_tie_mode, reverse_on_tie)
+        for values, picked in zip(sequences, picks.tolist()):
+            counter = Counter(values)
+            expected, _ = collect_logs(
+                extract_strategy, "dingwei_sha", [rank], skip_if_few, counter.most_common(), counter, resolve_tie_mode, None, 0, reverse_on_tie,
+            )
+            assert picked == (expected[0] if expected else -1), (values, rank)
@@ -0,0 +1,81 @@
+# tests/test_grouped_analysis.py
+# 任务组共用回溯筛选与推荐排名（run_grouped_hit_analysis_batch / run_multi_strategy_batch）与逐任务 run_hit_analysis_batch 结果一致
+import random
+import pytest
+from utils.expert_hit_analysis import GROUPED_STRATEGIES, run_grouped_hit_analysis_batch, run_hit_analysis_batch, run_multi_strategy_batch
+from utils.issue_index import get_issue_index
+
+RESULT_KEYS = ["total_issues", "hit_count", "miss_count", "skip_count", "max_rank_length"]
+
+
+def random_variants(rnd, positions, n):
+    return [dict(
+        dingwei_sha_pos=rnd.choice(positions),
+        enable_dingwei_sha=rnd.choice([[1], [2], [5], [-1], [1, 3], ["1,2"], ["All"]]),
+        skip_if_few_dingwei_sha=rnd.choice([True, False]),
+        resolve_tie_mode_dingwei_sha=rnd.choice(["False", "Next", "Skip"]),
+        reverse_on_tie_dingwei_sha=rnd.choice([True, False]),
+    ) for _ in range(n)]
+
+
+def random_strategy(rnd, positions):
+    """随机启用 1~3 个杀号 / 胆码 / 定位策略"""
+    strategy = dict(dingwei_sha_pos=rnd.choice(positions))
+    for _, suffix in rnd.sample(GROUPED_STRATEGIES, rnd.randrange(1, 4)):
+        strategy[f"enable_{suffix}"] = rnd.choice([[1], [2], [-1], [1, 3], ["2,4"], ["All"]])
+        strategy[f"skip_if_few_{suffix}"] = rnd.choice([True, False])
+        strategy[f"resolve_tie_mode_{suffix}"] = rnd.choice(["False", "Next", "Skip"])
+        if suffix.startswith("dingwei"):
+            strategy[f"reverse_on_tie_{suffix}"] = rnd.choice([True, False])
+    return strategy
+
+
+def run_single(engine, lottery_name, issues, analysis_kwargs, variant):
+    return run_hit_analysis_batch(
+        engine, lottery_name, issues, True, True, variant["dingwei_sha_pos"], "dingwei",
+        dict(analysis_kwargs, **{k: v for k, v in variant.items() if k != "dingwei_sha_pos"}),
+    )
+
+
+@pytest.mark.parametrize("lottery_name, engine_fixture, playtype, positions", [
+    ("排列5", "p5_engine", "万位定5", [0, 1, 4]),
+    ("福彩3D", "d3_engine", "五码组选", [0, 2]),
+])
+@pytest.mark.parametrize("use_cube", [False, True])
+def test_grouped_matches_single_task(request, lottery_name, engine_fixture, playtype, positions, use_cube):
+    engine = request.getfixturevalue(engine_fixture)
+    rnd = random.Random(f"{playtype}-{use_cube}")
+    issues = get_issue_index(engine, lottery_name).latest(None)[:25]
+    analysis_kwargs = dict(
+        query_playtype_name=playtype, analyze_playtype_name=playtype, mode="rank",
+        hit_rank_list=[1, 2], lookback_n=3, lookback_start_offset=0, use_cube=use_cube,
+    )
+    variants = random_variants(rnd, positions, 10)
+
+    grouped = run_grouped_hit_analysis_batch(engine, lottery_name, issues, analysis_kwargs, variants)
+    for variant, result in zip(variants, grouped):
+        single = run_single(engine, lottery_name, issues, analysis_kwargs, variant)
+        assert [result[k] for k in RESULT_KEYS] == [single[k] for k in RESULT_KEYS], variant
+        assert list(result["open_rank_counter"].items()) == list(single["open_rank_counter"].items()), variant
+
+
+@pytest.mark.parametrize("lottery_name, engine_fixture, playtype, positions", [
+    ("排列5", "p5_engine", "万位定5", [0, 1, 4]),
+    ("福彩3D", "d3_engine", "五码组选", [0, 2]),
+])
+def test_multi_strategy_matches_single_runs(request, lottery_name, engine_fixture, playtype, positions):
+    engine = request.getfixturevalue(engine_fixture)
+    rnd = random.Random(f"multi-{playtype}")
+    issues = get_issue_index(engine, lottery_name).latest(None)[:25]
+    analysis_kwargs = dict(
+        query_playtype_name=playtype, analyze_playtype_name=playtype, mode="rank",
+        hit_rank_list=[1, 2], lookback_n=3, lookback_start_offset=0, use_cube=True,
+    )
+    strategies = {f"策略{i}": random_strategy(rnd, positions) for i in range(12)}
+
+    results = run_multi_strategy_batch(engine, lottery_name, issues, analysis_kwargs, strategies)
+    assert list(results) == list(strategies)
+    for name, strategy in strategies.items():
+        single = run_single(engine, lottery_name, issues, analysis_kwargs, strategy)
+        assert [results[name][k] for k in RESULT_KEYS] == [single[k] for k in RESULT_KEYS], strategy
+        assert list(results[name]["open_rank_counter"].items()) == list(single["open_rank_counter"].items()), strategy
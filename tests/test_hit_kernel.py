@@ -0,0 +1,102 @@
+# tests/test_hit_kernel.py
+# 命中判断内核（check_hits_batch）与逐任务逐期 check_hit_on_result 一致
+import random
+import numpy as np
+import pytest
+from utils.expert_hit_analysis import check_hit_on_result
+from utils.hit_kernel import check_hits_batch
+from utils.open_code_cache import get_open_code_cache
+
+
+def to_mask(digits):
+    mask = 0
+    for d in digits or []:
+        mask |= 1 << d
+    return mask
+
+
+def random_digits(rnd, enabled=0.6):
+    """None（策略未启用）/ 空列表 / 1~4 个不重复数字"""
+    if rnd.random() > enabled:
+        return None
+    return rnd.sample(range(10), rnd.randrange(0, 5))
+
+
+def random_task(rnd, n_issues):
+    return {
+        "position": rnd.choice([None, 0, 1, 2, 3, 4]),
+        "picks": [
+            {key: random_digits(rnd, 0.3 if key in ("sha1", "sha2", "dan1", "dan2") else 0.6)
+             for key in ("sha1", "sha2", "dan1", "dan2", "dingwei_sha", "dingwei_sha2", "dingwei_sha3", "dingwei_dan")}
+            for _ in range(n_issues)
+        ],
+        "extracted": [rnd.random() > 0.1 for _ in range(n_issues)],
+    }
+
+
+def scalar_outcome(engine, lottery_name, issue, task, picked, extracted, check_mode):
+    """与 _score_grouped_variants 逐期回退路径相同：无提取结果或未开奖计为跳过"""
+    if not extracted:
+        return "skip"
+    try:
+        hit = check_hit_on_result(
+            engine, lottery_name, issue,
+            sha_list=[picked["sha1"], picked["sha2"]],
+            dan_list=[picked["dan1"], picked["dan2"]],
+            dingwei_sha=picked["dingwei_sha"],
+            dingwei_sha2=picked["dingwei_sha2"],
+            dingwei_sha3=picked["dingwei_sha3"],
+            dingwei_sha_pos=task["position"],
+            check_mode=check_mode,
+            dingwei_dan=picked["dingwei_dan"],
+        )
+    except ValueError as e:
+        assert str(e) == "open_code_missing"
+        return "skip"
+    return "hit" if hit else "miss"
+
+
+@pytest.mark.parametrize("lottery_name, engine_fixture", [("排列5", "p5_engine"), ("福彩3D", "d3_engine")])
+@pytest.mark.parametrize("check_mode", ["dingwei", "all"])
+def test_check_hits_batch_matches_scalar(request, lottery_name, engine_fixture, check_mode):
+    engine = request.getfixturevalue(engine_fixture)
+    open_cache = get_open_code_cache(engine, lottery_name)
+    rnd = random.Random(f"{lottery_name}-{check_mode}")
+    # 已开奖期号 + 若干不存在的期号（未开奖）
+    issues = [int(i) for i in open_cache.issues[:40]] + [int(open_cache.issues[-1]) + k for k in (1, 2, 5)]
+    rnd.shuffle(issues)
+    tasks = [random_task(rnd, len(issues)) for _ in range(60)]
+
+    def mask_matrix(*keys):
+        return np.array([[to_mask([d for key in keys for d in picked[key] or []]) for picked in task["picks"]] for task in tasks])
+
+    open_digits, open_found = open_cache.lookup(issues)
+    hit, miss, skip = check_hits_batch(
+        open_digits, open_found, [task["position"] for task in tasks],
+        dingwei_sha=mask_matrix("dingwei_sha", "dingwei_sha2", "dingwei_sha3"),
+        dingwei_dan=mask_matrix("dingwei_dan"),
+        sha=mask_matrix("sha1", "sha2"),
+        dan_list=[mask_matrix("dan1"), mask_matrix("dan2")],
+        extracted=np.array([task["extracted"] for task in tasks]),
+        check_mode=check_mode,
+    )
+    assert ((hit.astype(int) + miss + skip) == 1).all()
+
+    for ti, task in enumerate(tasks):
+        for ii, issue in enumerate(issues):
+            expected = scalar_outcome(engine, lottery_name, str(issue), task, task["picks"][ii], task["extracted"][ii], check_mode)
+            actual = "hit" if hit[ti, ii] else "miss" if miss[ti, ii] else "skip"
+            assert actual == expected, (ti, issue, task["position"], task["picks"][ii])
+
+
+def test_check_hits_batch_broadcasts_single_task():
+    # 单任务 (I,) 位掩码与 (1, I) 结果一致；未启用定位的 dingwei 模式不读开奖号码
+    open_digits = np.array([[1, 2, 3], [4, 5, 6], [-1, -1, -1]])
+    open_found = np.array([True, True, False])
+    hit, miss, skip = check_hits_batch(open_digits, open_found, [1], dingwei_sha=np.array([1 << 2, 1 << 2, 1 << 2]))
+    assert hit.tolist() == [[False, True, False]]
+    assert miss.tolist() == [[True, False, False]]
+    assert skip.tolist() == [[False, False, True]]
+
+    hit, miss, skip = check_hits_batch(open_digits, open_found, [None], dingwei_sha=np.array([1 << 2] * 3))
+    assert hit.tolist() == [[True, True, True]]
@@ -0,0 +1,37 @@
+# tests/test_hit_matrix.py
+# 命中矩阵（逐行命中累计 + 前缀和窗口统计）与逐条 match_hit 一致
+import random
+import numpy as np
+import pytest
+from utils.hit_rule import match_hit
+from utils.hit_matrix import get_hit_matrix
+from utils.open_code_cache import get_open_code_cache
+from utils.prediction_cube import get_prediction_cube
+
+
+@pytest.mark.parametrize("lottery_name, engine_fixture, playtype", [
+    ("排列5", "p5_engine", "万位定5"),
+    ("排列5", "p5_engine", "个位杀3"),
+    ("福彩3D", "d3_engine", "五码组选"),
+    ("福彩3D", "d3_engine", "定位3*3*3-百位"),
+])
+def test_hit_matrix_matches_scalar(request, lottery_name, engine_fixture, playtype):
+    engine = request.getfixturevalue(engine_fixture)
+    cube = get_prediction_cube(engine, lottery_name, playtype)
+    open_cache = get_open_code_cache(engine, lottery_name)
+    matrix = get_hit_matrix(engine, lottery_name, playtype)
+
+    expected = np.zeros(cube.masks.shape, dtype=np.int64)
+    for r in range(len(cube.row_issue)):
+        open_code = open_cache.get_open_code(cube.issue_names[cube.row_issue[r]])
+        if open_code is not None and match_hit(playtype, cube.row_numbers[r], open_code, None):
+            expected[cube.row_issue[r], cube.row_user[r]] += 1
+    assert (matrix.hits == expected).all()
+
+    rnd = random.Random(2)
+    for _ in range(20):
+        stop = rnd.randrange(0, len(cube.issue_names) + 1)
+        start = rnd.randrange(0, stop + 1)
+        hit_counts, participants = matrix.window_counts(start, stop)
+        assert (hit_counts == expected[start:stop].sum(axis=0)).all()
+        assert (participants == cube.present[start:stop].any(axis=0)).all()
@@ -0,0 +1,161 @@
+# tests/test_hit_rule.py
+# 预编译命中规则与原逐次解析的 match_hit 一致；批量命中判断（match_hit_batch / match_hit_rows）与逐条 match_hit 一致
+import random
+import re
+import pytest
+from utils.digit_parser import parse_digit_column
+from utils.hit_rule import get_hit_rule, match_hit, match_hit_batch, match_hit_rows
+
+DIGIT_PLAYTYPES = [
+    "万位杀1", "千位定3", "百位定1", "十位杀3", "个位定5",
+    "杀一", "杀二", "独胆", "双胆", "三胆", "五码组选", "六码组选", "七码组选",
+    "百位定3", "十位定1", "个位定3", "定位3*3*3-百位", "定位4*4*4-十位", "定位5*5*5-个位", "和值",
+]
+LOTTO_PLAYTYPES = [
+    "红球独胆", "红球双胆", "红球三胆", "红球12码", "红球杀六", "龙头两码", "蓝球定三", "蓝球杀五",
+    "1码", "3码", "10码", "杀5码", "杀10码",
+    "红球10码", "红球杀号", "蓝球双胆", "蓝球3码", "杀蓝",
+]
+
+
+def random_open_code(rnd):
+    length = rnd.choice([3, 5])
+    if length == 3 and rnd.random() < 0.3:
+        d, e = rnd.randrange(10), rnd.randrange(10)
+        digits = [d, d, e] if rnd.random() < 0.7 else [d, d, d]
+        rnd.shuffle(digits)
+    else:
+        digits = [rnd.randrange(10) for _ in range(length)]
+    return ",".join(map(str, digits))
+
+
+def random_numbers(rnd):
+    digits = rnd.sample(range(10), rnd.randrange(0, 8))
+    if rnd.random() < 0.1:
+        digits.append(digits[0] if digits else 3)  # 行内重复数字
+    return rnd.choice([",", " ", "|"]).join(map(str, digits))
+
+
+def legacy_match_hit(playtype, numbers, open_code, blue_code=""):
+    """编译注册表之前逐次解析玩法字符串的 match_hit（原样保留作对照）"""
+    nums = re.findall(r"\d+", numbers)
+    open_nums = re.findall(r"\d+", open_code)
+    nums_set = set(nums)
+    open_set = set(open_nums)
+    blue_set = set(re.findall(r"\d+", blue_code) if blue_code else [])
+
+    if playtype in ["红球独胆", "红球双胆", "红球三胆", "红球12码", "红球20码", "红球25码", "红球杀三", "红球杀六",
+                    "龙头两码", "凤尾两码", "蓝球定三", "蓝球定五", "蓝球杀五"]:
+        if playtype == "红球独胆":
+            return len(nums_set & open_set) >= 1
+        elif playtype == "红球双胆":
+            return len(nums_set & open_set) >= 2
+        elif playtype == "红球三胆":
+            return len(nums_set & open_set) >= 3
+        elif playtype in ["红球12码", "红球20码", "红球25码"]:
+            return open_set.issubset(nums_set)
+        elif playtype in ["红球杀三", "红球杀六"]:
+            return len(nums_set & open_set) == 0
+        elif playtype in ["龙头两码", "凤尾两码"]:
+            return len(nums_set & open_set) >= 2
+        elif playtype in ["蓝球定三", "蓝球定五"]:
+            return len(nums_set & blue_set) >= 1
+        elif playtype == "蓝球杀五":
+            return len(nums_set & blue_set) == 0
+
+    if playtype in ["1码", "2码", "3码", "4码", "5码", "6码", "7码", "8码", "9码", "10码", "12码", "15码"]:
+        return len(nums_set & open_set) >= int(re.findall(r"\d+", playtype)[0])
+    elif playtype in ["杀5码", "杀8码", "杀10码"]:
+        return len(nums_set & open_set) == 0
+
+    if "红球" in playtype or "蓝球" in playtype or "杀蓝" in playtype:
+        if "蓝" in playtype:
+            if "杀" in playtype:
+                return len(nums_set & blue_set) == 0
+            elif "双" in playtype:
+                return len(nums_set & blue_set) >= 2
+            return len(nums_set & blue_set) >= 1
+        if "杀" in playtype:
+            return len(nums_set & open_set) == 0
+        return len(nums_set & open_set) >= 1
+
+    if len(open_nums) not in [3, 5]:
+        return False
+    hit_count = len(nums_set & open_set)
+    unique_count = len(open_set)
+    if len(open_nums) == 5:
+        for pos_name, idx in {"万位": 0, "千位": 1, "百位": 2, "十位": 3, "个位": 4}.items():
+            if playtype.startswith(f"{pos_name}杀"):
+                return str(open_nums[idx]) not in nums
+            if playtype.startswith(f"{pos_name}定"):
+                return str(open_nums[idx]) in nums
+
+    if playtype in ("杀一", "杀二"):
+        return hit_count == 0
+    elif "独胆" in playtype:
+        return hit_count >= 1
+    elif "双胆" in playtype:
+        return hit_count >= 2
+    elif "三胆" in playtype or any(x in playtype for x in ["五码", "六码", "七码"]):
+        if unique_count == 1:
+            return open_nums[0] in nums
+        elif unique_count == 2:
+            return hit_count >= 2
+        return hit_count == 3
+    elif "定位" in playtype and "-百位" in playtype:
+        return open_nums[0] in nums_set
+    elif "定位" in playtype and "-十位" in playtype:
+        return open_nums[1] in nums_set
+    elif "定位" in playtype and "-个位" in playtype:
+        return open_nums[2] in nums_set
+    elif playtype.startswith("百位定"):
+        return open_nums[0] in nums_set
+    elif playtype.startswith("十位定"):
+        return open_nums[1] in nums_set
+    elif playtype.startswith("个位定"):
+        return open_nums[2] in nums_set
+    return False
+
+
+def random_tokens(rnd, high, n):
+    """随机数字串：含前导零（"05"）、多位数与重复，分隔符不固定"""
+    tokens = [str(rnd.randrange(high)).zfill(rnd.choice([1, 1, 2])) for _ in range(n)]
+    return rnd.choice([",", " ", "|", "，"]).join(tokens)
+
+
+@pytest.mark.parametrize("playtype", DIGIT_PLAYTYPES + LOTTO_PLAYTYPES + ["未知玩法", ""])
+def test_compiled_rule_matches_legacy(playtype):
+    rnd = random.Random(f"legacy-{playtype}")
+    for _ in range(400):
+        high = rnd.choice([10, 10, 36, 81])
+        numbers = random_tokens(rnd, high, rnd.randrange(0, 12))
+        open_code = random_tokens(rnd, high, rnd.choice([0, 1, 3, 3, 5, 5, 6, 7, 20]))
+        blue_code = rnd.choice(["", random_tokens(rnd, 16, rnd.randrange(1, 3))])
+        assert match_hit(playtype, numbers, open_code, blue_code) == legacy_match_hit(playtype, numbers, open_code, blue_code), \
+            (numbers, open_code, blue_code)
+    assert get_hit_rule(playtype) is get_hit_rule(playtype)  # 每个玩法只编译一次
+
+
+@pytest.mark.parametrize("playtype", DIGIT_PLAYTYPES)
+def test_match_hit_batch_matches_scalar(playtype):
+    # ⚠️ match_hit_batch 只适用于单字符数字记录（parsed.canonical），多字符记录由 match_hit_rows 回退逐条判断
+    rnd = random.Random(playtype)
+    numbers = [random_numbers(rnd) for _ in range(400)]
+    open_codes = [random_open_code(rnd) for _ in range(400)]
+    expected = [match_hit(playtype, n, o) for n, o in zip(numbers, open_codes)]
+
+    masks = parse_digit_column(numbers).masks
+    open_digits = parse_digit_column(open_codes).digits
+    assert match_hit_batch(playtype, masks, open_digits).tolist() == expected
+    # 单期开奖号码（一维）与逐条开奖矩阵口径相同
+    assert match_hit_batch(playtype, masks, open_digits[0][open_digits[0] >= 0]).tolist() == \
+        [match_hit(playtype, n, open_codes[0]) for n in numbers]
+
+
+@pytest.mark.parametrize("playtype", ["千位定3", "杀二", "五码组选", "定位3*3*3-百位", "红球双胆", "3码"])
+def test_match_hit_rows_falls_back_for_multi_char_tokens(playtype):
+    rnd = random.Random(1)
+    numbers = [random_numbers(rnd) if rnd.random() < 0.8 else rnd.choice(["05,1,2", "10 3", "1,2,3,007", "123", None]) for _ in range(300)]
+    open_codes = [None if rnd.random() < 0.1 else random_open_code(rnd) for _ in range(300)]
+    expected = [False if o is None else match_hit(playtype, n or "", o, None) for n, o in zip(numbers, open_codes)]
+    assert match_hit_rows(playtype, numbers, open_codes).tolist() == expected
@@ -0,0 +1,84 @@
+# tests/test_hit_timeline.py
+# 指定用户命中间隔统计（批量时间线 + 数组二分）与原逐用户 JOIN 查询、逐行 match_hit 的统计一致
+import random
+import pandas as pd
+import pytest
+from utils.expert_hit_analysis import analyze_expert_hits
+from utils.hit_rule import match_hit
+from utils.hit_timeline import get_user_hit_timelines
+from utils.issue_index import get_issue_index
+
+TABLES = {"排列5": ("expert_predictions_p5", "lottery_results_p5"), "福彩3D": ("expert_predictions_3d", "lottery_results_3d")}
+
+
+def legacy_gap_stats(engine, lottery_name, playtype, uid, query_issue):
+    """原 analyze_expert_hits 指定用户分支：(命中次数, 上次命中, 平均间隔, 当前间隔)，从未命中返回 None"""
+    prediction_table, result_table = TABLES[lottery_name]
+    df_rec = pd.read_sql(f"""
+        SELECT p.issue_name, p.numbers, r.open_code
+        FROM {prediction_table} p
+        JOIN {result_table} r ON p.issue_name = r.issue_name
+        WHERE p.user_id = %s AND p.playtype_name = %s AND p.issue_name < %s
+        ORDER BY p.issue_name
+    """, engine, params=(uid, playtype, query_issue))
+    hit_issues = [int(row["issue_name"]) for _, row in df_rec.iterrows() if match_hit(playtype, row["numbers"], row["open_code"], None)]
+    if not hit_issues:
+        return None
+    last_hit = max(hit_issues)
+    gaps = [j - i for i, j in zip(hit_issues[:-1], hit_issues[1:])]
+    avg_gap = sum(gaps) / len(gaps) if gaps else None
+    return len(hit_issues), last_hit, avg_gap, int(query_issue) - last_hit
+
+
+@pytest.mark.parametrize("lottery_name, engine_fixture, playtype", [
+    ("排列5", "p5_engine", "千位定3"),
+    ("福彩3D", "d3_engine", "杀一"),
+])
+def test_gap_stats_match_legacy(request, lottery_name, engine_fixture, playtype):
+    engine = request.getfixturevalue(engine_fixture)
+    issues = get_issue_index(engine, lottery_name).latest(None)
+    rnd = random.Random(playtype)
+    timelines = get_user_hit_timelines(engine, lottery_name, playtype)
+    for _ in range(12):
+        # 用户分批出现，后续调用复用已缓存的时间线；含从未推荐过的用户
+        user_ids = rnd.sample(range(1000, 1030), rnd.randrange(1, 12)) + [9999]
+        query_issue = rnd.choice(issues)
+        stats = timelines.gap_stats(user_ids, query_issue)
+        for k, uid in enumerate(user_ids):
+            expected = legacy_gap_stats(engine, lottery_name, playtype, uid, query_issue)
+            if expected is None:
+                assert stats["hit_count"][k] == 0 and stats["gap_now"][k] == -1
+                continue
+            hit_count, last_hit, avg_gap, gap_now = expected
+            assert (stats["hit_count"][k], stats["last_hit"][k], stats["gap_now"][k]) == (hit_count, last_hit, gap_now)
+            if avg_gap is None:
+                assert pd.isna(stats["avg_gap"][k])
+            else:
+                assert stats["avg_gap"][k] == pytest.approx(avg_gap)
+
+
+@pytest.mark.parametrize("min_gap_condition", [None, ("<", 3), (">=", 5), ("==", 1)])
+def test_specified_users_min_gap_matches_legacy(p5_engine, min_gap_condition):
+    playtype = "千位定3"
+    issues = get_issue_index(p5_engine, "排列5").latest(None)
+    rnd = random.Random(str(min_gap_condition))
+    for _ in range(8):
+        query_issue = rnd.choice(issues[:50])
+        user_ids = rnd.sample(range(1000, 1030), 10)
+        expected = set()
+        for uid in user_ids:
+            legacy = legacy_gap_stats(p5_engine, "排列5", playtype, uid, query_issue)
+            if legacy and min_gap_condition and eval(f"{legacy[3]} {min_gap_condition[0]} {min_gap_condition[1]}"):
+                continue
+            expected.add(uid)
+        query_users = set(pd.read_sql(
+            "SELECT user_id FROM expert_predictions_p5 WHERE issue_name = %s AND playtype_name = %s",
+            p5_engine, params=(query_issue, playtype))["user_id"])
+
+        result = analyze_expert_hits(
+            p5_engine, "排列5", query_issue, analyze_playtype_name=playtype, query_playtype_name=playtype,
+            specified_user_ids=user_ids, min_gap_condition=min_gap_condition, enable_dingwei_sha=[1],
+        )
+        rec_df = result.get("rec_df")
+        actual = set() if rec_df is None or rec_df.empty else set(rec_df["user_id"])
+        assert actual == expected & query_users
@@ -0,0 +1,46 @@
+# tests/test_hit_window.py
+# 滑动回溯窗口的增量命中计数与逐期重新统计一致，批量分析开 / 关增量窗口结果相同
+import random
+import pytest
+from conftest import recount_window_hits
+from utils.expert_hit_analysis import run_hit_analysis_batch
+from utils.hit_window import SlidingHitWindow
+from utils.issue_index import get_issue_index
+
+RESULT_KEYS = ["total_issues", "hit_count", "miss_count", "skip_count", "max_rank_length"]
+
+
+@pytest.mark.parametrize("lottery_name, engine_fixture, playtype", [
+    ("排列5", "p5_engine", "千位定3"),
+    ("福彩3D", "d3_engine", "双胆"),
+])
+def test_sliding_window_matches_recount(request, lottery_name, engine_fixture, playtype):
+    engine = request.getfixturevalue(engine_fixture)
+    issues = get_issue_index(engine, lottery_name).latest(None)
+    window = SlidingHitWindow(engine, lottery_name, playtype)
+    rnd = random.Random(playtype)
+    start = 0
+    for _ in range(40):
+        # 大多数相邻滑动一期，偶尔整窗跳动 / 窗口长度变化
+        start = start + 1 if rnd.random() < 0.7 else rnd.randrange(len(issues))
+        size = rnd.choice([1, 3, 3, 3, 8])
+        issue_list = issues[start % len(issues): start % len(issues) + size]
+        assert window.advance(issue_list) == recount_window_hits(engine, lottery_name, playtype, issue_list)
+
+
+@pytest.mark.parametrize("analysis_kwargs", [
+    dict(mode="rank", query_playtype_name="万位定5", analyze_playtype_name="千位定3", hit_rank_list=[1, 2], lookback_n=3),
+    dict(mode="rank", query_playtype_name="个位杀3", analyze_playtype_name="个位杀3", hit_rank_list=[1], lookback_n=5, lookback_start_offset=2),
+    dict(mode="hitcount", query_playtype_name="万位定5", analyze_playtype_name="万位定5",
+         hit_count_conditions={"千位定3": (">=", 1), "百位定1": ("<=", 1)}, lookback_n=4),
+])
+def test_batch_incremental_window_matches_per_issue(p5_engine, analysis_kwargs):
+    kwargs = dict(analysis_kwargs, enable_dingwei_sha=[1], reverse_on_tie_dingwei_sha=True)
+    issues = get_issue_index(p5_engine, "排列5").latest(None)[:30]
+    results = [
+        run_hit_analysis_batch(p5_engine, "排列5", issues, True, True, 0, "dingwei", kwargs, incremental_window=incremental)
+        for incremental in (False, True)
+    ]
+    assert [results[0][k] for k in RESULT_KEYS] == [results[1][k] for k in RESULT_KEYS]
+    assert list(results[0]["open_rank_counter"].items()) == list(results[1]["open_rank_counter"].items())
+    assert results[0]["total_issues"] > 0
@@ -0,0 +1,57 @@
+# tests/test_hitcount_mode.py
+# 命中次数模式：整窗批量取数与逐期重新统计一致，运算符表与原 eval 拼接表达式一致，三种取数路径的回测结果相同
+import random
+import numpy as np
+import pytest
+from conftest import recount_window_hits
+from utils.expert_hit_analysis import COMPARE_OPS, compare_values, fetch_window_user_hits, run_hit_analysis_batch
+from utils.issue_index import get_issue_index
+
+RESULT_KEYS = ["total_issues", "hit_count", "miss_count", "skip_count", "max_rank_length"]
+
+
+def test_compare_values_matches_eval():
+    hits = np.arange(-2, 8)
+    for op in COMPARE_OPS:
+        for threshold in (-1, 0, 1, 3, 10):
+            assert compare_values(hits, op, threshold).tolist() == [eval(f"{h} {op} {threshold}") for h in hits]
+    with pytest.raises(ValueError):
+        compare_values(hits, "=>", 1)
+
+
+@pytest.mark.parametrize("lottery_name, engine_fixture, playtype", [
+    ("排列5", "p5_engine", "百位定1"),
+    ("福彩3D", "d3_engine", "三胆"),
+])
+def test_fetch_window_user_hits_matches_recount(request, lottery_name, engine_fixture, playtype):
+    engine = request.getfixturevalue(engine_fixture)
+    table = "expert_predictions_p5" if lottery_name == "排列5" else "expert_predictions_3d"
+    issues = get_issue_index(engine, lottery_name).latest(None)
+    rnd = random.Random(playtype)
+    for _ in range(15):
+        start = rnd.randrange(len(issues))
+        issue_list = issues[start: start + rnd.choice([1, 3, 6])]
+        user_ids, hits = fetch_window_user_hits(engine, lottery_name, table, playtype, issue_list)
+        assert dict(zip(user_ids.tolist(), hits.tolist())) == recount_window_hits(engine, lottery_name, playtype, issue_list)
+
+
+@pytest.mark.parametrize("hit_count_conditions", [
+    {"千位定3": (">=", 1)},
+    {"千位定3": ("==", 0), "百位定1": ("<=", 1)},
+    {"万位杀1": (">", 1), "个位杀3": ("!=", 2)},
+    {"百位定1": 1},
+])
+def test_hitcount_paths_match(p5_engine, hit_count_conditions):
+    # ✅ 命中矩阵前缀和（use_cube）/ 滑动窗口 / 整窗一次取回 三种取数路径结果相同
+    issues = get_issue_index(p5_engine, "排列5").latest(None)[:25]
+    base = dict(
+        mode="hitcount", query_playtype_name="万位定5", analyze_playtype_name="万位定5",
+        hit_count_conditions=hit_count_conditions, lookback_n=4, enable_dingwei_sha=[1], reverse_on_tie_dingwei_sha=True,
+    )
+    results = [
+        run_hit_analysis_batch(p5_engine, "排列5", issues, True, True, 0, "dingwei", dict(base, use_cube=use_cube), incremental_window=incremental)
+        for use_cube, incremental in ((False, False), (False, True), (True, False))
+    ]
+    for result in results[1:]:
+        assert [result[k] for k in RESULT_KEYS] == [results[0][k] for k in RESULT_KEYS]
+        assert list(result["open_rank_counter"].items()) == list(results[0]["open_rank_counter"].items())
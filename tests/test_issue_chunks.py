@@ -0,0 +1,49 @@
+# tests/test_issue_chunks.py
+# 期号分段并行：各分段计数经 merge_issue_chunk_stats 合并后与串行逐期循环一致，进程池结果与重放日志与串行相同
+import pytest
+import utils.worker_pool as worker_pool
+from utils.expert_hit_analysis import _evaluate_issue_chunk, merge_issue_chunk_stats, run_hit_analysis_batch
+from utils.issue_index import get_issue_index
+from utils.logger import collect_logs
+
+STAT_KEYS = ["hit_count", "miss_count", "skip_count", "max_rank_length"]
+ANALYSIS_KWARGS = [
+    dict(mode="rank", query_playtype_name="万位定5", analyze_playtype_name="千位定3", hit_rank_list=[1, 2], lookback_n=3,
+         enable_dingwei_sha=[1], reverse_on_tie_dingwei_sha=True),
+    dict(mode="hitcount", query_playtype_name="个位杀3", analyze_playtype_name="个位杀3",
+         hit_count_conditions={"百位定1": (">=", 1)}, lookback_n=4, enable_dingwei_sha=[2, -1]),
+]
+# 执行细节日志（分段提示、备忘录复用率、共享缓存大小）随进程池与缓存冷热变化，不参与比较
+EXECUTION_LOG_PREFIXES = ("⚙️", "♻️", "🧠")
+
+
+def comparable(stats):
+    return [stats[k] for k in STAT_KEYS] + [list(stats["open_rank_counter"].items())]
+
+
+@pytest.mark.parametrize("analysis_kwargs", ANALYSIS_KWARGS)
+@pytest.mark.parametrize("check_mode", ["dingwei", "all"])
+def test_merged_chunks_match_serial(p5_engine, analysis_kwargs, check_mode):
+    issues = get_issue_index(p5_engine, "排列5").latest(None)[:30]
+    chunk_kwargs = dict(enable_hit_check=True, enable_track_open_rank=True, dingwei_sha_pos=4, check_mode=check_mode, analysis_kwargs=analysis_kwargs)
+    serial = _evaluate_issue_chunk(p5_engine, "排列5", issues, **chunk_kwargs)
+    for bounds in ([0, 30], [0, 1, 30], [0, 7, 8, 19, 30], list(range(31))):
+        chunks = [issues[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])]
+        merged = merge_issue_chunk_stats([_evaluate_issue_chunk(p5_engine, "排列5", chunk, **chunk_kwargs) for chunk in chunks])
+        assert comparable(merged) == comparable(serial)
+
+
+@pytest.mark.parametrize("analysis_kwargs", ANALYSIS_KWARGS)
+def test_workers_match_serial(p5_engine, monkeypatch, analysis_kwargs):
+    # ✅ 子进程（fork）沿用同一个 sqlite 库
+    monkeypatch.setattr(worker_pool, "get_engine", lambda: p5_engine)
+    issues = get_issue_index(p5_engine, "排列5").latest(None)[:30]
+    runs = [
+        collect_logs(run_hit_analysis_batch, p5_engine, "排列5", issues, True, True, 4, "dingwei", analysis_kwargs, workers=workers)
+        for workers in (1, 2)
+    ]
+    (serial, serial_logs), (parallel, parallel_logs) = runs
+    assert comparable(parallel) == comparable(serial) and parallel["total_issues"] == serial["total_issues"]
+    # 逐期日志按分段顺序重放，除执行细节外与串行逐行相同
+    assert [line for line in parallel_logs if not line.startswith(EXECUTION_LOG_PREFIXES)] == \
+        [line for line in serial_logs if not line.startswith(EXECUTION_LOG_PREFIXES)]
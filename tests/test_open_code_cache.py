@@ -0,0 +1,38 @@
+# tests/test_open_code_cache.py
+# 开奖缓存按间隔核对开奖表，有新开奖时自动刷新并递增版本号
+import sqlite3
+from sqlalchemy import create_engine
+import utils.open_code_cache as occ
+from utils.hit_matrix import get_hit_matrix
+from conftest import build_fixture_db
+
+
+def add_result(path, issue_name, open_code):
+    con = sqlite3.connect(path)
+    con.execute("INSERT INTO lottery_results_p5 VALUES (?, ?)", (issue_name, open_code))
+    con.commit()
+    con.close()
+
+
+def test_new_draw_refreshes_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / "p5.db")
+    build_fixture_db(path, "p5", n_issues=20)
+    engine = create_engine(f"sqlite:///{path}")
+
+    first = occ.get_open_code_cache(engine, "排列5")
+    matrix = get_hit_matrix(engine, "排列5", "万位定5")
+    new_issue = int(first.issues[-1]) + 1
+    add_result(path, str(new_issue), "1,2,3,4,5")
+
+    # 核对间隔未到：沿用旧缓存
+    assert occ.get_open_code_cache(engine, "排列5") is first
+
+    monkeypatch.setattr(occ, "OPEN_CODE_CHECK_SECONDS", 0)
+    refreshed = occ.get_open_code_cache(engine, "排列5")
+    assert refreshed is not first
+    assert refreshed.version == first.version + 1
+    assert refreshed.get_open_code(new_issue) == "1,2,3,4,5"
+    # 开奖表无变化时不重载
+    assert occ.get_open_code_cache(engine, "排列5") is refreshed
+    # 依赖开奖版本的下游缓存随之重建
+    assert get_hit_matrix(engine, "排列5", "万位定5") is not matrix
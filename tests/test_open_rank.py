@@ -0,0 +1,52 @@
+# tests/test_open_rank.py
+# 开奖数字排名矩阵（OpenRankMatrix.counter）与逐期 track_open_rank 累计一致
+import random
+from collections import Counter
+import numpy as np
+import pytest
+from utils.digit_ranking import DigitRanking
+from utils.expert_hit_analysis import track_open_rank
+from utils.open_rank import build_open_rank_matrix
+
+
+def random_values(rnd):
+    return [rnd.randrange(10) for _ in range(rnd.randrange(0, 60))]
+
+
+def random_open_digits(rnd):
+    if rnd.random() < 0.1:
+        return None  # 未开奖
+    return [rnd.randrange(10) for _ in range(rnd.choice([3, 5]))]
+
+
+@pytest.mark.parametrize("check_mode", ["dingwei", "all"])
+def test_open_rank_matrix_matches_track_open_rank(check_mode):
+    rnd = random.Random(check_mode)
+    n_issues = 200
+    values = [None if rnd.random() < 0.1 else random_values(rnd) for _ in range(n_issues)]
+    opens = [random_open_digits(rnd) for _ in range(n_issues)]
+    rankings = [None if v is None else DigitRanking(v) for v in values]
+    open_digits = np.full((n_issues, 5), -1, dtype=np.int8)
+    for i, digits in enumerate(opens):
+        if digits:
+            open_digits[i, :len(digits)] = digits
+
+    positions = list(range(5)) if check_mode == "all" else [0, 2, 4, -1]
+    matrix = build_open_rank_matrix(list(range(n_issues)), rankings, open_digits, positions)
+    assert matrix.max_rank_length() == max(len(Counter(v)) for v in values if v is not None)
+
+    for _ in range(20):
+        mask = np.array([rnd.random() < 0.7 for _ in range(n_issues)])
+        for position in ([None] if check_mode == "all" else positions):
+            expected = Counter()
+            for i in np.flatnonzero(mask):
+                if values[i] is None:
+                    continue  # 无推荐的期号计为跳过，不统计名次
+                result = {
+                    "num_counter": Counter(values[i]),
+                    "open_code": None if opens[i] is None else ",".join(map(str, opens[i])),
+                    "open_digits": opens[i],
+                }
+                track_open_rank(result, position, expected, check_mode=check_mode)
+            actual = matrix.counter(mask, position)
+            assert list(actual.items()) == list(expected.items())
@@ -0,0 +1,65 @@
+# tests/test_prune.py
+# 剪枝回测与完整回测在 best_tasks / best_ranks 入选结果上必须一致
+import pytest
+from utils.expert_hit_analysis import run_grouped_hit_analysis_batch, can_still_qualify
+from utils.task_results import summarize_result, is_best_task, is_rank_reliable
+
+STAT_KEYS = ["hit_count", "miss_count", "skip_count", "max_rank_length", "total_issues"]
+ENABLES = [[1], [2], [5], [10], [-1], ["All"]]
+
+
+def qualifying_rows(results):
+    """backtest 实际会写入的 (变体下标, 表, 汇总) 集合：被剪枝的任务不调用 save_best_records"""
+    rows = set()
+    for vi, result in enumerate(results):
+        if result.get("pruned"):
+            continue
+        summary = summarize_result(result)
+        if is_best_task(summary):
+            rows.add((vi, "best_tasks", summary["hit_rate"]))
+        if is_rank_reliable(summary):
+            rows.add((vi, "best_ranks", summary["total_issues"], tuple(summary["open_rank_counter"].items()), tuple(summary["unhit_ranks"])))
+    return rows
+
+
+@pytest.mark.parametrize("lottery_name, engine_fixture, playtype, position", [
+    ("排列5", "p5_engine", "万位定5", 0),
+    ("排列5", "p5_engine", "个位杀3", 4),
+    ("福彩3D", "d3_engine", "五码组选", 0),
+])
+@pytest.mark.parametrize("hit_rank_list", [[1], [1, 2, 3], ["ALL"]])
+def test_pruned_run_keeps_qualifying_rows(request, lottery_name, engine_fixture, playtype, position, hit_rank_list):
+    engine = request.getfixturevalue(engine_fixture)
+    analysis_kwargs = dict(
+        query_playtype_name=playtype, analyze_playtype_name=playtype, mode="rank",
+        hit_rank_list=hit_rank_list, lookback_n=3, lookback_start_offset=0, use_cube=True,
+    )
+    variants = [dict(
+        dingwei_sha_pos=position, enable_dingwei_sha=enable, skip_if_few_dingwei_sha=skip_if_few,
+        resolve_tie_mode_dingwei_sha="False", reverse_on_tie_dingwei_sha=True,
+    ) for enable in ENABLES for skip_if_few in (True, False)]
+
+    full = run_grouped_hit_analysis_batch(engine, lottery_name, ["All"], analysis_kwargs, variants)
+    for prune_chunk_size in (1, 7):
+        pruned = run_grouped_hit_analysis_batch(
+            engine, lottery_name, ["All"], analysis_kwargs, variants,
+            prune_hit_rate=0.9, prune_chunk_size=prune_chunk_size,
+        )
+        assert qualifying_rows(pruned) == qualifying_rows(full)
+        assert any(r["pruned"] for r in pruned)  # 夹具数据下 enable=[10] 等变体跳过过多，确保确实触发剪枝
+        for f, p in zip(full, pruned):
+            if p["pruned"]:
+                summary = summarize_result(f)
+                assert not is_best_task(summary) and not is_rank_reliable(summary)
+            else:
+                assert [f[k] for k in STAT_KEYS] == [p[k] for k in STAT_KEYS]
+                assert list(f["open_rank_counter"].items()) == list(p["open_rank_counter"].items())
+
+
+def test_prune_bound_is_exact():
+    # 跳过 = 命中 + 剩余期数时剩余全部命中仍可写入 best_ranks，不可剪枝；再多跳过一期且命中率无望时才剪枝
+    stat = dict(hit_count=2, miss_count=10, skip_count=5)
+    assert can_still_qualify(stat, 3, 0.9)
+    assert not can_still_qualify(dict(stat, skip_count=6), 3, 0.9)
+    # 命中率仍可达标时跳过再多也保留
+    assert can_still_qualify(dict(stat, miss_count=0, skip_count=50), 3, 0.9)
@@ -0,0 +1,67 @@
+# tests/test_ranking_memo.py
+# 入选集合备忘录：LRU 淘汰；立方体重新加载后旧条目不再复用；只存行下标，SQL 路径不经备忘录
+import numpy as np
+from utils.ranking_memo import RankingMemo, get_ranking_memo, clear_ranking_memo
+from utils.issue_index import get_issue_index
+from utils.expert_hit_analysis import run_hit_analysis_batch
+from utils.prediction_cube import get_prediction_cube, clear_prediction_cube_cache
+
+
+def test_lru_eviction_keeps_recently_used():
+    memo = RankingMemo(max_entries=2)
+    memo.get_or_compute("a", lambda: 1)
+    memo.get_or_compute("b", lambda: 2)
+    assert memo.get_or_compute("a", lambda: -1) == 1  # a 变为最近使用
+    memo.get_or_compute("c", lambda: 3)  # 淘汰 b
+    assert list(memo.entries) == ["a", "c"]
+    assert memo.get_or_compute("b", lambda: 20) == 20
+    assert memo.stats() == {"lookups": 5, "hits": 1, "entries": 2, "hit_rate": 0.2}
+
+
+def run_batch(engine):
+    return run_hit_analysis_batch(
+        engine=engine, lottery_name="排列5", query_issues=["All"],
+        enable_hit_check=True, enable_track_open_rank=True, dingwei_sha_pos=0, check_mode="dingwei",
+        analysis_kwargs=dict(
+            query_playtype_name="万位定5", analyze_playtype_name="万位定5", mode="rank", hit_rank_list=[1],
+            lookback_n=5, lookback_start_offset=0, enable_dingwei_sha=[1], skip_if_few_dingwei_sha=True,
+            resolve_tie_mode_dingwei_sha="False", reverse_on_tie_dingwei_sha=True, use_cube=True,
+        ),
+    )
+
+
+def test_reloaded_cube_does_not_reuse_entries(p5_engine):
+    memo = get_ranking_memo()
+    first = run_batch(p5_engine)
+    first_run_hits = memo.hits
+    cube_version = get_prediction_cube(p5_engine, "排列5", "万位定5").version
+    lookups_before = memo.lookups
+    assert run_batch(p5_engine) == first
+    hits_after_rerun = memo.hits
+    assert hits_after_rerun - first_run_hits == memo.lookups - lookups_before  # 同一立方体重跑全部复用
+
+    clear_prediction_cube_cache()
+    assert get_prediction_cube(p5_engine, "排列5", "万位定5").version != cube_version
+    lookups_before = memo.lookups
+    assert run_batch(p5_engine) == first
+    assert memo.lookups > lookups_before and memo.hits == hits_after_rerun  # 新立方体的条目全部重新计算
+
+
+def test_memo_holds_row_indices_and_skips_sql_path(p5_engine):
+    memo = get_ranking_memo()
+    run_batch(p5_engine)
+    assert memo.entries
+    for rec_rows, ranking in memo.entries.values():
+        assert isinstance(rec_rows, np.ndarray) and rec_rows.dtype.kind == "i"
+
+    clear_ranking_memo()
+    result = run_hit_analysis_batch(
+        engine=p5_engine, lottery_name="排列5", query_issues=get_issue_index(p5_engine, "排列5").latest(6),
+        enable_hit_check=True, enable_track_open_rank=True, dingwei_sha_pos=0, check_mode="dingwei",
+        analysis_kwargs=dict(
+            query_playtype_name="万位定5", analyze_playtype_name="万位定5", mode="rank", hit_rank_list=[1],
+            lookback_n=5, lookback_start_offset=0, enable_dingwei_sha=[1], skip_if_few_dingwei_sha=True,
+            resolve_tie_mode_dingwei_sha="False", reverse_on_tie_dingwei_sha=True,
+        ),
+    )
+    assert result["total_issues"] and get_ranking_memo().stats()["lookups"] == 0  # SQL 路径每次查库，不经备忘录
@@ -0,0 +1,106 @@
+# tests/test_shared_cache.py
+# 共享内存缓存：子进程 attach 得到的期号索引 / 开奖 / 预测立方体 / 命中矩阵与主进程加载的对象逐属性一致，且为只读视图
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pytest
+import utils.worker_pool as worker_pool
+from utils.issue_index import get_issue_index
+from utils.open_code_cache import get_open_code_cache
+from utils.prediction_cube import get_prediction_cube
+from utils.hit_matrix import get_hit_matrix
+from utils.exact_hit_matrix import get_exact_hit_matrix
+from utils.shared_cache import SharedStrings, share_process_caches
+
+PLAYTYPES = ["万位定5", "个位杀3"]
+
+
+def snapshot(obj) -> dict:
+    """对象各属性转为可比较的普通值；数组额外记录是否可写"""
+    out = {}
+    for key, value in vars(obj).items():
+        if isinstance(value, SharedStrings) or (isinstance(value, np.ndarray) and value.dtype == object):
+            out[key] = ("strings", list(value[:]))
+        elif isinstance(value, np.ndarray):
+            out[key] = ("array", value.dtype.str, value.shape, value.tolist(), value.flags.writeable)
+        elif isinstance(value, (list, dict, str, int, float, type(None))):
+            out[key] = ("value", value)
+    return out
+
+
+def attached_snapshots(_):
+    # 子进程：init_worker 已按清单 attach，进程内缓存直接返回共享内存上的对象（engine 不会被使用）
+    return (
+        snapshot(get_issue_index(None, "排列5")),
+        snapshot(get_open_code_cache(None, "排列5")),
+        [snapshot(get_prediction_cube(None, "排列5", playtype)) for playtype in PLAYTYPES],
+    )
+
+
+def writable_free(snap: dict) -> dict:
+    return {k: v[:-1] if v[0] == "array" else v for k, v in snap.items()}
+
+
+def test_attached_caches_match_originals(p5_engine, monkeypatch):
+    monkeypatch.setattr(worker_pool, "get_engine", lambda: p5_engine)
+    originals = (
+        snapshot(get_issue_index(p5_engine, "排列5")),
+        snapshot(get_open_code_cache(p5_engine, "排列5")),
+        [snapshot(get_prediction_cube(p5_engine, "排列5", playtype)) for playtype in PLAYTYPES],
+    )
+    with share_process_caches(p5_engine, "排列5", PLAYTYPES) as shared, \
+            ProcessPoolExecutor(max_workers=1, initializer=worker_pool.init_worker, initargs=(shared.manifest,)) as pool:
+        attached = pool.submit(attached_snapshots, None).result()
+        assert shared.nbytes() > 0
+
+    for original, copy in zip(originals[:2] + tuple(originals[2]), attached[:2] + tuple(attached[2])):
+        assert writable_free(copy) == writable_free(original)
+        # 数值数组均为共享内存上的只读视图
+        assert all(not v[-1] for v in copy.values() if v[0] == "array")
+
+
+def attached_matrices(_):
+    # 子进程：命中矩阵 / hit+N 位图直接取 attach 的共享对象，未新建；未预先生成的 N 仍可在子进程内按需生成
+    hit_matrix = get_hit_matrix(None, "排列5", "个位杀3")
+    exact_matrix = get_exact_hit_matrix(None, "排列5", "个位杀3")
+    return (
+        hit_matrix.cube is get_prediction_cube(None, "排列5", "个位杀3"),
+        exact_matrix.cube is hit_matrix.cube,
+        snapshot(hit_matrix),
+        {n: (cum.tolist(), cum.flags.writeable) for n, cum in exact_matrix._member_prefix.items()},
+        exact_matrix.member_prefix(0).tolist(),
+    )
+
+
+def test_attached_hit_matrices_are_shared(p5_engine, monkeypatch):
+    monkeypatch.setattr(worker_pool, "get_engine", lambda: p5_engine)
+    with share_process_caches(p5_engine, "排列5", ["万位定5"], matrix_playtypes=["个位杀3"], exact_hits=[1, 2]) as shared, \
+            ProcessPoolExecutor(max_workers=1, initializer=worker_pool.init_worker, initargs=(shared.manifest,)) as pool:
+        assert list(shared.manifest["hit_matrix"]) == list(shared.manifest["exact_hit"]) == [("排列5", "个位杀3")]
+        same_cube, exact_same_cube, hit_snapshot, prefixes, prefix0 = pool.submit(attached_matrices, None).result()
+
+    hit_matrix = get_hit_matrix(p5_engine, "排列5", "个位杀3")
+    exact_matrix = get_exact_hit_matrix(p5_engine, "排列5", "个位杀3")
+    assert same_cube and exact_same_cube
+    assert writable_free(hit_snapshot) == writable_free(snapshot(hit_matrix))
+    assert all(not v[-1] for v in hit_snapshot.values() if v[0] == "array")
+    assert sorted(prefixes) == [1, 2]
+    for n, (cum, writeable) in prefixes.items():
+        assert cum == exact_matrix.member_prefix(n).tolist() and not writeable
+    assert prefix0 == exact_matrix.member_prefix(0).tolist()
+
+
+def test_matrices_skipped_with_unshared_cube(p5_engine):
+    with share_process_caches(p5_engine, "排列5", max_bytes=0, matrix_playtypes=["个位杀3"], exact_hits=[1]) as shared:
+        assert not shared.manifest["cube"] and not shared.manifest["hit_matrix"] and not shared.manifest["exact_hit"]
+
+
+def test_shared_strings_indexing():
+    values = ["1,2,3", "", "０５", "7 8", "abc"]
+    data = np.frombuffer("".join(values).encode("utf-8"), dtype=np.uint8)
+    offsets = np.cumsum([0] + [len(v.encode("utf-8")) for v in values])
+    strings = SharedStrings(data, offsets)
+    expected = np.array(values, dtype=object)
+    assert len(strings) == len(values)
+    assert [strings[i] for i in range(-len(values), len(values))] == [expected[i] for i in range(-len(values), len(values))]
+    for key in (slice(None), slice(1, 4), slice(None, None, -2), np.array([4, 0, 0]), np.array([True, False, True, False, True])):
+        assert strings[key].tolist() == expected[key].tolist()
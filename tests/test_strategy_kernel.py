@@ -0,0 +1,84 @@
+# tests/test_strategy_kernel.py
+# 策略提取内核（extract_strategy_batch）与逐期 extract_strategy 一致：整数 / 负数 / 越界排名、逗号备选、prev±N、
+# All、并列处理（False / Next / Skip）、reverse_on_tie、少于 5 个数字跳过
+import random
+from collections import Counter
+import numpy as np
+import pytest
+from utils.digit_ranking import DigitRanking
+from utils.expert_hit_analysis import extract_strategy
+from utils.strategy_kernel import RankingMatrix, extract_strategy_batch, prev_target_digit
+
+RANK_EXPRS = ["1", "2", "3", "5", "8", "12", "0", "-1", "-2", "-6", "prev", "prev+1", "prev-2", "prev+7", "abc"]
+
+
+def to_mask(digits):
+    mask = 0
+    for d in digits or []:
+        mask |= 1 << d
+    return mask
+
+
+def random_values(rnd):
+    """推荐数字序列：去重数字个数 0~10，频次集中在少数几档，并列组较多"""
+    pool = rnd.sample(range(10), rnd.randrange(0, 11))
+    weights = [rnd.choice([1, 1, 2, 3]) for _ in pool]
+    values = [d for d, w in zip(pool, weights) for _ in range(w)]
+    rnd.shuffle(values)
+    return values
+
+
+def random_enable(rnd):
+    roll = rnd.random()
+    if roll < 0.05:
+        return "All"
+    if roll < 0.1:
+        return rnd.choice([None, []])
+    exprs = []
+    for _ in range(rnd.randrange(1, 4)):
+        picks = rnd.sample(RANK_EXPRS, rnd.choice([1, 1, 2, 3]))
+        exprs.append(", ".join(picks))
+    if rnd.random() < 0.1:
+        exprs.append("All")
+    if rnd.random() < 0.2:
+        exprs = [int(e) if e.lstrip("-").isdigit() else e for e in exprs]
+    return exprs
+
+
+def random_prev_open_code(rnd):
+    if rnd.random() < 0.1:
+        return rnd.choice([None, "", "1,x,3"])
+    return ",".join(str(rnd.randrange(10)) for _ in range(rnd.choice([3, 5])))
+
+
+@pytest.mark.parametrize("tie_mode", ["False", "Next", "Skip"])
+@pytest.mark.parametrize("reverse_on_tie", [False, True])
+@pytest.mark.parametrize("skip_flag", [False, True])
+def test_extract_strategy_batch_matches_scalar(tie_mode, reverse_on_tie, skip_flag):
+    rnd = random.Random(f"{tie_mode}-{reverse_on_tie}-{skip_flag}")
+    n_issues = 150
+    values = [random_values(rnd) for _ in range(n_issues)]
+    counters = [Counter(v) for v in values]
+    matrix = RankingMatrix([DigitRanking(v) for v in values])
+    prev_open_codes = [random_prev_open_code(rnd) for _ in range(n_issues)]
+
+    for _ in range(40):
+        enable_list = random_enable(rnd)
+        dingwei_sha_pos = rnd.choice([0, 2, 4, -1])
+        prev_targets = [prev_target_digit(code, dingwei_sha_pos) for code in prev_open_codes]
+        prev_targets = np.array([-1 if d is None else d for d in prev_targets], dtype=np.int64)
+        masks, extracted = extract_strategy_batch(matrix, enable_list, skip_flag, tie_mode, reverse_on_tie, prev_targets)
+
+        for i, counter in enumerate(counters):
+            expected = extract_strategy(
+                "dingwei_sha", enable_list, skip_flag, counter.most_common(), counter, tie_mode,
+                prev_open_codes[i], dingwei_sha_pos, reverse_on_tie,
+            )
+            context = (enable_list, counter.most_common(), prev_open_codes[i], dingwei_sha_pos)
+            assert bool(extracted[i]) == (expected is not None), context
+            assert int(masks[i]) == to_mask(expected), context
+
+
+def test_ranking_matrix_rejects_non_digit_rankings():
+    with pytest.raises(ValueError):
+        RankingMatrix([DigitRanking([1, 2, 3]), DigitRanking([3, 16])])
@@ -0,0 +1,112 @@
+# tests/test_task_lease.py
+# 租约认领：多个持有者交替认领的任务集合与单进程读取全部待回测任务一致（不重不漏），过期租约可被接手，续约 / 退回 / 写回只作用于本持有者
+import pytest
+from sqlalchemy import create_engine, text
+import utils.task_lease as task_lease
+from utils.task_lease import (
+    ensure_lease_table, claim_tasks, lease_held_clause, drop_lease, renew_leases, release_leases, LeaseHeartbeat,
+)
+
+TASKS_TABLE = "tasks_p5"
+LEASE_TABLE = "tasks_p5_leases"
+
+
+@pytest.fixture
+def lease_engine(tmp_path, monkeypatch):
+    # ⚠️ sqlite 不支持 FOR UPDATE SKIP LOCKED（单连接串行，本身不会并发认领），去掉行锁子句；时间函数换成 sqlite 写法
+    monkeypatch.setattr(task_lease, "CLAIM_LOCK_CLAUSE", "")
+    monkeypatch.setattr(task_lease, "DB_NOW_SQL", "DATETIME('now')")
+    monkeypatch.setattr(task_lease, "LEASE_EXPIRES_SQL", "DATETIME('now', '+' || :lease_seconds || ' seconds')")
+    engine = create_engine(f"sqlite:///{tmp_path / 'tasks.db'}")
+    statuses = ["pending"] * 25 + ["done"] * 5 + ["running"] * 4 + ["pruned"] * 2
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE {TASKS_TABLE} (id INTEGER PRIMARY KEY, position INTEGER, status TEXT)"))
+        for i, status in enumerate(statuses, start=1):
+            conn.execute(text(f"INSERT INTO {TASKS_TABLE} (id, position, status) VALUES (:id, :pos, :status)"), dict(id=i, pos=i % 5, status=status))
+    ensure_lease_table(engine, TASKS_TABLE)
+    return engine
+
+
+def fetch(engine, sql, **params):
+    with engine.connect() as conn:
+        return conn.execute(text(sql), params).fetchall()
+
+
+def baseline_ids(engine):
+    """不开租约时单进程读取的待回测任务，加上没有租约记录（如备份恢复）的 running 任务"""
+    return [row[0] for row in fetch(engine, f"SELECT id FROM {TASKS_TABLE} WHERE status IN ('pending', 'running') ORDER BY id")]
+
+
+def test_alternating_owners_claim_each_task_once(lease_engine):
+    expected = baseline_ids(lease_engine)
+    claimed = {"a": [], "b": []}
+    while True:
+        batch_a = claim_tasks(lease_engine, TASKS_TABLE, "a", batch_size=4)
+        batch_b = claim_tasks(lease_engine, TASKS_TABLE, "b", batch_size=3)
+        claimed["a"] += [t["id"] for t in batch_a]
+        claimed["b"] += [t["id"] for t in batch_b]
+        if not batch_a and not batch_b:
+            break
+    assert sorted(claimed["a"] + claimed["b"]) == expected
+    assert not set(claimed["a"]) & set(claimed["b"])
+    assert fetch(lease_engine, f"SELECT COUNT(*) FROM {TASKS_TABLE} WHERE status = 'pending'")[0][0] == 0
+    owners = dict(fetch(lease_engine, f"SELECT task_id, owner FROM {LEASE_TABLE}"))
+    assert owners == {**{i: "a" for i in claimed["a"]}, **{i: "b" for i in claimed["b"]}}
+
+
+def test_expired_lease_is_reclaimed(lease_engine):
+    first = [t["id"] for t in claim_tasks(lease_engine, TASKS_TABLE, "a", batch_size=5)]
+    rest = [t["id"] for t in claim_tasks(lease_engine, TASKS_TABLE, "b", batch_size=100)]
+    assert rest and not set(first) & set(rest)  # 未过期的租约不会被其他持有者认领
+
+    # a 的租约过期后，这些任务由 b 接手，a 的写回不再生效
+    with lease_engine.begin() as conn:
+        conn.execute(text(f"UPDATE {LEASE_TABLE} SET lease_expires_at = DATETIME('now', '-1 seconds') WHERE owner = 'a'"))
+    reclaimed = [t["id"] for t in claim_tasks(lease_engine, TASKS_TABLE, "b", batch_size=100)]
+    assert reclaimed == first
+    with lease_engine.begin() as conn:
+        written = conn.execute(text(f"UPDATE {TASKS_TABLE} SET status = 'done' WHERE id = :id" + lease_held_clause(TASKS_TABLE)),
+                               dict(id=first[0], owner="a")).rowcount
+        assert written == 0
+        written = conn.execute(text(f"UPDATE {TASKS_TABLE} SET status = 'done' WHERE id = :id" + lease_held_clause(TASKS_TABLE)),
+                               dict(id=first[0], owner="b")).rowcount
+        assert written == 1
+        drop_lease(conn, TASKS_TABLE, first[0], "b")
+    assert not fetch(lease_engine, f"SELECT 1 FROM {LEASE_TABLE} WHERE task_id = :id", id=first[0])
+
+
+def test_renew_and_release_only_touch_own_leases(lease_engine):
+    ids_a = [t["id"] for t in claim_tasks(lease_engine, TASKS_TABLE, "a", batch_size=3, lease_seconds=1)]
+    ids_b = [t["id"] for t in claim_tasks(lease_engine, TASKS_TABLE, "b", batch_size=2, lease_seconds=1)]
+    before_b = fetch(lease_engine, f"SELECT lease_expires_at FROM {LEASE_TABLE} WHERE owner = 'b' ORDER BY task_id")
+
+    assert renew_leases(lease_engine, TASKS_TABLE, "a", lease_seconds=3600) == len(ids_a)
+    assert fetch(lease_engine, f"SELECT lease_expires_at FROM {LEASE_TABLE} WHERE owner = 'b' ORDER BY task_id") == before_b
+    # b 的租约（1 秒）到期后可被接手，a 已续约的任务不会
+    with lease_engine.begin() as conn:
+        conn.execute(text(f"UPDATE {LEASE_TABLE} SET lease_expires_at = DATETIME('now', '-1 seconds') WHERE owner = 'b'"))
+    pending_ids = [row[0] for row in fetch(lease_engine, f"SELECT id FROM {TASKS_TABLE} WHERE status = 'pending' ORDER BY id")]
+    reclaimed = [t["id"] for t in claim_tasks(lease_engine, TASKS_TABLE, "c", batch_size=1000)]
+    assert not set(reclaimed) & set(ids_a) and set(ids_b) <= set(reclaimed) and set(pending_ids) <= set(reclaimed)
+
+    assert release_leases(lease_engine, TASKS_TABLE, "a") == len(ids_a)
+    statuses = dict(fetch(lease_engine, f"SELECT id, status FROM {TASKS_TABLE}"))
+    assert all(statuses[i] == "pending" for i in ids_a)
+    assert not fetch(lease_engine, f"SELECT 1 FROM {LEASE_TABLE} WHERE owner = 'a'")
+
+
+def test_lease_times_use_database_clock(lease_engine):
+    # 到期时间由数据库时钟算出：刚认领 / 续约的租约约在数据库当前时间之后 lease_seconds 秒
+    claim_tasks(lease_engine, TASKS_TABLE, "a", batch_size=2, lease_seconds=3600)
+    in_window = f"SELECT COUNT(*) FROM {LEASE_TABLE} WHERE lease_expires_at BETWEEN DATETIME('now', '+3590 seconds') AND DATETIME('now', '+3600 seconds')"
+    assert fetch(lease_engine, in_window)[0][0] == 2
+    assert renew_leases(lease_engine, TASKS_TABLE, "a", lease_seconds=60) == 2
+    assert fetch(lease_engine, f"SELECT COUNT(*) FROM {LEASE_TABLE} WHERE lease_expires_at > DATETIME('now', '+60 seconds')")[0][0] == 0
+
+
+def test_heartbeat_releases_on_exit(lease_engine):
+    with LeaseHeartbeat(lease_engine, TASKS_TABLE, "a", lease_seconds=3600):
+        ids = [t["id"] for t in claim_tasks(lease_engine, TASKS_TABLE, "a", batch_size=6)]
+    statuses = dict(fetch(lease_engine, f"SELECT id, status FROM {TASKS_TABLE}"))
+    assert all(statuses[i] == "pending" for i in ids)
+    assert not fetch(lease_engine, f"SELECT 1 FROM {LEASE_TABLE}")
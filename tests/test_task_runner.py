@@ -0,0 +1,74 @@
+# tests/test_task_runner.py
+# 任务组进程池并行（共享内存立方体 / 子进程各自加载立方体）与串行结果逐项一致；同一进程池分批复用时亦然
+import json
+import pytest
+import utils.shared_cache as shared_cache
+import utils.worker_pool as worker_pool
+from utils.task_runner import TaskGroupPool, iter_task_group_results, group_tasks
+from utils.task_shard import task_group_key, task_shard
+
+
+def make_tasks():
+    tasks = []
+    for playtype, position in (("万位定5", 0), ("个位杀3", 4)):
+        for lookback_n in (3, 10):
+            for hit_rank_list in ([1], ["ALL"]):
+                for rank in (1, 2, 5, -1):
+                    tasks.append(dict(
+                        id=len(tasks) + 1, position=position,
+                        query_playtype_name=playtype, analyze_playtype_name=playtype,
+                        lookback_n=lookback_n, lookback_offset=0,
+                        hit_rank_list=json.dumps(hit_rank_list), enable=json.dumps({"dingwei_sha": [rank]}),
+                        skip_if_few=json.dumps({"dingwei_sha": True}), resolve_tie_mode=json.dumps({"dingwei_sha": "False"}),
+                        reverse_on_tie=json.dumps({"dingwei_sha": True}),
+                    ))
+    return group_tasks(tasks)
+
+
+def test_group_tasks_follow_group_key_and_shard():
+    # 打乱后重新分组：组按首次出现顺序、组内保持原顺序，同组任务分片一致；hit_rank_list 的 JSON 写法不影响分组
+    tasks = [t for group in make_tasks() for t in group]
+    shuffled = tasks[1::2] + tasks[::2]
+    shuffled[0] = dict(shuffled[0], hit_rank_list=json.dumps(json.loads(shuffled[0]["hit_rank_list"]), separators=(",", ":")))
+    groups = group_tasks(shuffled)
+    assert len(groups) == len(make_tasks())
+    first_seen = list(dict.fromkeys(task_group_key(t) for t in shuffled))
+    assert [task_group_key(g[0]) for g in groups] == first_seen
+    assert [t["id"] for g in groups for t in g] == [t["id"] for key in first_seen for t in shuffled if task_group_key(t) == key]
+    for group in groups:
+        assert len({task_group_key(t) for t in group}) == 1
+        assert len({task_shard(t, 7) for t in group}) == 1
+
+
+def comparable(results):
+    return [{task_id: (r["hit_count"], r["miss_count"], r["skip_count"], list(r["open_rank_counter"].items()), r["max_rank_length"])
+             for task_id, r in group.items()} for group in results]
+
+
+@pytest.mark.parametrize("share_cubes", [True, False])
+def test_workers_match_serial(p5_engine, monkeypatch, share_cubes):
+    # ✅ 子进程（fork）沿用同一个 sqlite 库；share_cubes=False 时立方体超出共享上限，由子进程各自加载
+    monkeypatch.setattr(worker_pool, "get_engine", lambda: p5_engine)
+    if not share_cubes:
+        monkeypatch.setattr(shared_cache, "SHARED_CACHE_MAX_BYTES", 0)
+    groups = make_tasks()
+    serial = comparable(iter_task_group_results(p5_engine, "排列5", groups, workers=1))
+    parallel = comparable(iter_task_group_results(p5_engine, "排列5", groups, workers=2))
+    assert parallel == serial
+
+
+def test_pool_reused_across_batches(p5_engine, monkeypatch):
+    # ✅ 租约模式逐批认领：进程池与共享缓存只创建一次，各批结果与串行一致，子进程跨批不变
+    monkeypatch.setattr(worker_pool, "get_engine", lambda: p5_engine)
+    groups = make_tasks()
+    serial = comparable(iter_task_group_results(p5_engine, "排列5", groups, workers=1))
+    tasks = [t for group in groups for t in group]
+    batches = [groups[:3], groups[3:5], groups[5:]]
+    with TaskGroupPool(p5_engine, "排列5", tasks, workers=2) as pool:
+        pids = set(pool._pool._processes)
+        assert len(pids) == 2  # 进入时即 fork 全部子进程，之后启动的心跳线程不会被带进子进程
+        shared_blocks = list(pool._shared.blocks)
+        parallel = [r for batch in batches for r in comparable(pool.iter_results(batch))]
+        assert set(pool._pool._processes) == pids and pool._shared.blocks == shared_blocks
+    assert parallel == serial
+    assert pool._pool is None and pool._shared is None
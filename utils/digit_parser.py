@@ -0,0 +1,147 @@
+# utils/digit_parser.py
+# 批量数字解析：把整列 numbers / open_code 字符串一次性向量化解析为 16 位数字位掩码、逐位数字数组与多重集计数，替代逐行 re.findall
+import re
+import numpy as np
+
+MASK_BITS = 16
+# ✅ 不超过 18 位的数字串按位向量化求值（10 ** 18 以内不会溢出 int64）；更长的逐个用 Python int 求值，
+# 超出 int64 的按上限饱和（>= 16 的数字本就不计入掩码 / 计数，也不会等于任何开奖数字，判定结论不变）
+MAX_VECTOR_DIGITS = 18
+INT64_MAX = np.iinfo(np.int64).max
+POW10 = 10 ** np.arange(MAX_VECTOR_DIGITS + 1, dtype=np.int64)
+
+
+class ParsedDigits:
+    """
+    整列解析结果（N 行）。
+
+    - values / value_row：按行序、行内按出现顺序展开的全部数字（等价于逐行 re.findall(r"\\d+") 后 int 化再拼接，超出 int64 的按上限饱和）及其所属行
+    - lengths：每行数字个数
+    - digits：N × max_len 的逐位数字矩阵（通常为 int16，不足处补 -1），可直接按位置取定位数字
+    - masks：每行的 16 位数字位掩码（uint16），第 d 位为 1 表示该行包含数字 d（>= 16 的数字不计入）
+    - counts：每行 0~15 各数字出现次数（多重集计数，int32，按需惰性计算）
+    - canonical：该行每个数字串都是单个字符（无 "05"、"10" 之类），此时按整数比较与按字符串比较结论完全一致
+    """
+
+    def __init__(self, values: np.ndarray, value_row: np.ndarray, n_rows: int, canonical_token: np.ndarray = None):
+        self.values = values
+        self.value_row = value_row
+        self.n_rows = n_rows
+        if canonical_token is None:
+            canonical_token = np.ones(len(values), dtype=bool)
+        self.canonical = np.bincount(value_row[~canonical_token], minlength=n_rows) == 0
+        self.lengths = np.bincount(value_row, minlength=n_rows).astype(np.int32)
+        self.offsets = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(self.lengths, out=self.offsets[1:])
+
+        width = int(self.lengths.max()) if n_rows else 0
+        dtype = np.int16 if not len(values) or values.max() <= np.iinfo(np.int16).max else np.int64
+        self.digits = np.full((n_rows, width), -1, dtype=dtype)
+        col = np.arange(len(values), dtype=np.int64) - self.offsets[value_row]
+        self.digits[value_row, col] = values
+
+        in_mask = values < MASK_BITS
+        self.masks = np.zeros(n_rows, dtype=np.uint16)
+        np.bitwise_or.at(self.masks, value_row[in_mask], (1 << values[in_mask]).astype(np.uint16))
+        self._counts = None
+
+    @property
+    def counts(self) -> np.ndarray:
+        if self._counts is None:
+            in_mask = self.values < MASK_BITS
+            flat = self.value_row[in_mask].astype(np.int64) * MASK_BITS + self.values[in_mask]
+            self._counts = np.bincount(flat, minlength=self.n_rows * MASK_BITS).astype(np.int32).reshape(self.n_rows, MASK_BITS)
+        return self._counts
+
+    def intersect_count(self, targets) -> np.ndarray:
+        """每行与目标数字集合的交集大小（行内重复数字只计一次），等价于 len(set(row) & set(targets))"""
+        targets = list(targets)
+        if not len(self.values) or self.values.max() < MASK_BITS and all(0 <= t < MASK_BITS for t in targets):
+            return popcount16(self.masks & np.uint16(mask_of(targets))).astype(np.int32)
+        hit = np.isin(self.values, targets)
+        pairs = np.unique(np.stack([self.value_row[hit], self.values[hit]], axis=1), axis=0)
+        return np.bincount(pairs[:, 0], minlength=self.n_rows).astype(np.int32) if len(pairs) else np.zeros(self.n_rows, dtype=np.int32)
+
+    def contains_any(self, targets) -> np.ndarray:
+        """每行是否包含目标数字中的任意一个"""
+        return self.intersect_count(targets) > 0
+
+    def row_values(self, row: int) -> list:
+        """单行解析出的数字列表"""
+        return self.values[self.offsets[row]:self.offsets[row + 1]].tolist()
+
+
+def _parse_with_regex(strings: list):
+    values, value_row, canonical_token = [], [], []
+    for row, s in enumerate(strings):
+        for d in re.findall(r"\d+", s):
+            values.append(min(int(d), INT64_MAX))
+            value_row.append(row)
+            canonical_token.append(len(d) == 1 and d.isascii())
+    return np.array(values, dtype=np.int64), np.array(value_row, dtype=np.int64), np.array(canonical_token, dtype=bool)
+
+
+def parse_digit_column(column) -> ParsedDigits:
+    """
+    向量化解析一整列号码字符串（list / ndarray / pandas Series 均可，None 视为空串）。
+
+    做法：把整列以分隔符拼成一个字节缓冲区，在 uint8 数组上一次性找出所有连续数字串的起止位置并计算数值，
+    结果与逐行 re.findall(r"\\d+") 完全一致；含非 ASCII 字符时退回逐行正则，以保证 Unicode 数字的判定口径不变。
+    """
+    strings = ["" if s is None else str(s) for s in column]
+    n_rows = len(strings)
+    joined = ",".join(strings)
+    try:
+        buf = np.frombuffer(joined.encode("ascii"), dtype=np.uint8)
+    except UnicodeEncodeError:
+        values, value_row, canonical_token = _parse_with_regex(strings)
+        return ParsedDigits(values, value_row, n_rows, canonical_token=canonical_token)
+
+    # 每个字节所属行：按各行长度（含分隔符）展开，不依赖字符串内容
+    row_of_byte = np.repeat(np.arange(n_rows, dtype=np.int64), np.array([len(x) + 1 for x in strings], dtype=np.int64))[:len(buf)]
+    is_digit = (buf >= 48) & (buf <= 57)
+    digit_pos = np.flatnonzero(is_digit)
+    if not len(digit_pos):
+        return ParsedDigits(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), n_rows)
+
+    # 连续数字串：前一个字节不是数字即为新串的起点
+    starts = np.ones(len(digit_pos), dtype=bool)
+    starts[1:] = digit_pos[1:] != digit_pos[:-1] + 1
+    token_id = np.cumsum(starts) - 1
+    n_tokens = int(token_id[-1]) + 1
+    token_len = np.bincount(token_id, minlength=n_tokens)
+    token_start = np.flatnonzero(starts)
+    place = token_len[token_id] - 1 - (np.arange(len(digit_pos)) - token_start[token_id])
+
+    # ⚠️ 位权查表而非 10 ** place：place 超过 18 时 int64 幂运算会静默回绕
+    short = token_len[token_id] <= MAX_VECTOR_DIGITS
+    values = np.zeros(n_tokens, dtype=np.int64)
+    np.add.at(values, token_id[short], (buf[digit_pos[short]].astype(np.int64) - 48) * POW10[place[short]])
+    for t in np.flatnonzero(token_len > MAX_VECTOR_DIGITS):
+        start = digit_pos[token_start[t]]
+        values[t] = min(int(buf[start:start + token_len[t]].tobytes()), INT64_MAX)
+    value_row = row_of_byte[digit_pos[token_start]].astype(np.int64)
+    return ParsedDigits(values, value_row, n_rows, canonical_token=token_len == 1)
+
+
+def popcount16(masks) -> np.ndarray:
+    """uint16 位掩码逐元素计 1 的个数"""
+    m = np.asarray(masks, dtype=np.uint16)
+    m = m - ((m >> 1) & 0x5555)
+    m = (m & 0x3333) + ((m >> 2) & 0x3333)
+    m = (m + (m >> 4)) & 0x0F0F
+    return ((m + (m >> 8)) & 0x1F).astype(np.int8)
+
+
+def mask_of(digits) -> int:
+    """数字集合 → 位掩码"""
+    mask = 0
+    for d in digits:
+        if 0 <= d < MASK_BITS:
+            mask |= 1 << int(d)
+    return mask
+
+
+def digits_of(mask: int) -> list:
+    """位掩码 → 升序数字列表"""
+    return [d for d in range(MASK_BITS) if (int(mask) >> d) & 1]
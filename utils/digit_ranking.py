@@ -0,0 +1,88 @@
+# utils/digit_ranking.py
+# 推荐数字频次排名：np.bincount 统计出现次数，排序口径与 Counter(all_numbers).most_common() 完全一致，
+# 并提供 数字→名次、并列区间、去重数字个数 的 O(1) 查询，替代逐期 Counter + list.index + 并列重扫
+import numpy as np
+from collections import Counter
+
+# ✅ 数字取值不超过该上限时走 bincount 稠密数组，否则退回 np.unique（如大号码彩种）
+DENSE_VALUE_LIMIT = 4096
+
+
+class DigitRanking:
+    """
+    单期推荐数字排名。
+
+    排序规则：出现次数降序，次数相同时按该数字在推荐数字序列中首次出现的先后排序。
+    Counter 按首次出现顺序插入键，most_common() 是对插入顺序做按次数降序的稳定排序，二者排序键完全相同，因此名次逐位一致。
+
+    - digits / counts：排好序的数字与对应出现次数
+    - tie_start / tie_end：每个名次所在并列组的区间 [tie_start, tie_end)
+    - rank_of(d)：数字 d 的名次（从 1 开始），未出现返回 None
+    """
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype=np.int64)
+        n_values = len(values)
+        if n_values and values.min() >= 0 and values.max() < DENSE_VALUE_LIMIT:
+            size = int(values.max()) + 1
+            value_counts = np.bincount(values, minlength=size)
+            first_seen = np.full(size, n_values, dtype=np.int64)
+            # ✅ 取每个数字所在位置的最小值；花式索引重复赋值时的写入顺序 NumPy 不作保证，不能靠“最后写入”
+            np.minimum.at(first_seen, values, np.arange(n_values))
+            distinct = np.flatnonzero(value_counts)
+            distinct_counts = value_counts[distinct]
+            distinct_first = first_seen[distinct]
+        elif n_values:
+            distinct, distinct_first, distinct_counts = np.unique(values, return_index=True, return_counts=True)
+            size = None
+        else:
+            distinct = distinct_first = distinct_counts = np.zeros(0, dtype=np.int64)
+            size = 0
+
+        order = np.lexsort((distinct_first, -distinct_counts))
+        self.digits = distinct[order]
+        self.counts = distinct_counts[order]
+        self.first_seen = distinct_first[order]
+        self.size = len(self.digits)
+
+        # 并列组边界：次数变化处为新组起点
+        new_group = np.ones(self.size, dtype=bool)
+        new_group[1:] = self.counts[1:] != self.counts[:-1]
+        group_id = np.cumsum(new_group) - 1
+        group_starts = np.flatnonzero(new_group)
+        group_ends = np.append(group_starts[1:], self.size)
+        self.tie_start = group_starts[group_id]
+        self.tie_end = group_ends[group_id]
+
+        if size is not None:
+            self._rank_by_value = np.zeros(size, dtype=np.int64)
+            self._rank_by_value[self.digits] = np.arange(1, self.size + 1)
+            self._rank_map = None
+        else:
+            self._rank_by_value = None
+            self._rank_map = dict(zip(self.digits.tolist(), range(1, self.size + 1)))
+
+    def __len__(self):
+        return self.size
+
+    def rank_of(self, digit):
+        """数字的名次（从 1 开始），未出现返回 None"""
+        if self._rank_map is not None:
+            return self._rank_map.get(digit)
+        if digit is None or not 0 <= digit < len(self._rank_by_value):
+            return None
+        rank = int(self._rank_by_value[digit])
+        return rank or None
+
+    def tie_size(self, idx: int) -> int:
+        """第 idx 个名次（0 起，支持负下标）所在并列组的数字个数"""
+        return int(self.tie_end[idx] - self.tie_start[idx])
+
+    def most_common(self) -> list:
+        """与 Counter.most_common() 相同的 [(数字, 次数), ...]"""
+        return list(zip(self.digits.tolist(), self.counts.tolist()))
+
+    def to_counter(self) -> Counter:
+        """还原为按首次出现顺序插入的 Counter，与 Counter(all_numbers) 等价"""
+        by_first = np.argsort(self.first_seen, kind="stable")
+        return Counter(dict(zip(self.digits[by_first].tolist(), self.counts[by_first].tolist())))
@@ -0,0 +1,94 @@
+# utils/exact_hit_matrix.py
+# hit+N 精确命中位图：基于预测立方体预先算出每条推荐与当期开奖数字的交集个数，按 N 生成 期号 × 用户 的“恰好命中 N 个”位图并沿期号轴做前缀和，
+# 回溯窗口内“每一期都恰好命中 N 个”的用户交集 = 窗口内位图计数等于窗口内已开奖期数，任意 N / lookback 组合都只需两行相减
+import numpy as np
+from utils.digit_parser import parse_digit_column, popcount16, MASK_BITS
+from utils.prediction_cube import get_prediction_cube
+from utils.open_code_cache import get_open_code_cache
+
+_exact_hit_cache = {}
+
+
+class ExactHitMatrix:
+    """
+    单玩法 hit+N 精确命中位图。
+
+    - row_hit_counts：每条推荐与当期开奖数字的交集个数（行内重复数字只计一次，与 ParsedDigits.intersect_count 一致），未开奖为 -1
+    - has_open / cum_open：各期是否已开奖及其前缀和
+    - member_prefix(n)：期号 × 用户“该期有任一推荐恰好命中 n 个”位图沿期号轴的前缀和，按 n 惰性生成并缓存
+    """
+
+    def __init__(self, cube, open_codes: list, open_version: int = 0):
+        self.cube = cube
+        self.open_version = open_version
+        self.has_open = np.array([code is not None for code in open_codes], dtype=bool)
+        self.cum_open = np.zeros(len(self.has_open) + 1, dtype=np.int32)
+        np.cumsum(self.has_open, out=self.cum_open[1:])
+        self.row_hit_counts = self._row_hit_counts(cube, open_codes)
+        self._member_prefix = {}
+
+    def _row_hit_counts(self, cube, open_codes: list) -> np.ndarray:
+        """逐条推荐与当期开奖数字的交集个数：全部数字都小于 16 时走位掩码计 1，否则按 (行, 数字) 去重计数"""
+        open_parsed = parse_digit_column(["" if code is None else code for code in open_codes])
+        row_counts = np.full(len(cube.row_issue), -1, dtype=np.int32)
+        row_open = self.has_open[cube.row_issue]
+
+        parsed = cube.parsed
+        small_values = (not len(parsed.values) or parsed.values.max() < MASK_BITS) and \
+                       (not len(open_parsed.values) or open_parsed.values.max() < MASK_BITS)
+        if small_values:
+            counts = popcount16(cube.row_mask & open_parsed.masks[cube.row_issue]).astype(np.int32)
+        else:
+            value_issue = cube.row_issue[parsed.value_row]
+            in_open = (parsed.values[:, None] == open_parsed.digits[value_issue]).any(axis=1)
+            key_base = int(parsed.values.max()) + 1
+            pairs = np.unique(parsed.value_row[in_open].astype(np.int64) * key_base + parsed.values[in_open])
+            counts = np.bincount(pairs // key_base, minlength=len(cube.row_issue)).astype(np.int32)
+        row_counts[row_open] = counts[row_open]
+        return row_counts
+
+    def member_prefix(self, n: int) -> np.ndarray:
+        """“恰好命中 n 个”位图沿期号轴的前缀和，第 0 行为全 0"""
+        if n not in self._member_prefix:
+            n_issues, n_users = self.cube.masks.shape
+            member = np.zeros((n_issues, n_users), dtype=bool)
+            rows = self.row_hit_counts == n
+            member[self.cube.row_issue[rows], self.cube.row_user[rows]] = True
+            cum = np.zeros((n_issues + 1, n_users), dtype=np.int32)
+            np.cumsum(member, axis=0, out=cum[1:])
+            self._member_prefix[n] = cum
+        return self._member_prefix[n]
+
+    def window_users(self, n: int, start, stop):
+        """
+        期号下标区间 [start, stop) 内每个已开奖期都恰好命中 n 个的用户掩码（start 可为数组，一次得到多个窗口）。
+        窗口内没有已开奖期号时交集为空，与逐期 set.intersection 的口径一致
+        """
+        cum = self.member_prefix(n)
+        opened = self.cum_open[stop] - self.cum_open[start]
+        counts = cum[stop] - cum[start]
+        opened = np.asarray(opened)
+        if opened.ndim:
+            return (counts == opened[:, None]) & (opened[:, None] > 0)
+        return (counts == opened) & (opened > 0)
+
+
+def get_exact_hit_matrix(engine, lottery_name: str, playtype_name: str) -> ExactHitMatrix:
+    """获取 (彩种, 玩法) 的 hit+N 精确命中位图，进程内缓存；开奖缓存刷新后自动重建"""
+    key = (lottery_name, playtype_name)
+    open_cache = get_open_code_cache(engine, lottery_name)
+    cached = _exact_hit_cache.get(key)
+    if cached is None or cached.open_version != open_cache.version:
+        cube = get_prediction_cube(engine, lottery_name, playtype_name)
+        open_codes = [open_cache.get_open_code(issue) for issue in cube.issue_names]
+        _exact_hit_cache[key] = ExactHitMatrix(cube, open_codes, open_version=open_cache.version)
+    return _exact_hit_cache[key]
+
+
+def set_exact_hit_matrix(exact_matrix: ExactHitMatrix):
+    """直接装入已构建的 hit+N 位图（如子进程 attach 的共享内存位图），已生成的 member_prefix 一并沿用"""
+    _exact_hit_cache[(exact_matrix.cube.lottery_name, exact_matrix.cube.playtype_name)] = exact_matrix
+
+
+def clear_exact_hit_cache():
+    _exact_hit_cache.clear()
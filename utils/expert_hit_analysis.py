@@ -12,12 +12,30 @@ except ImportError:
         session_state = {}
     st = DummyStreamlit()
 import os
+import operator
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
-from utils.logger import log, save_log_file_if_needed
+from utils.logger import log, save_log_file_if_needed, collect_logs, replay_logs
 import re
 from collections import Counter, defaultdict
-from utils.db import get_prediction_table, get_result_table
-from utils.hit_rule import match_hit
+from utils.db import get_prediction_table
+from utils.hit_rule import match_hit, match_hit_rows
+from utils.prediction_cube import is_cube_supported, get_prediction_cube
+from utils.issue_index import get_issue_index
+from utils.digit_parser import parse_digit_column
+from utils.open_code_cache import get_open_code, get_open_code_cache
+from utils.hit_matrix import get_hit_matrix
+from utils.exact_hit_matrix import get_exact_hit_matrix
+from utils.hit_window import SlidingHitWindow
+from utils.hit_timeline import get_user_hit_timelines
+from utils.digit_ranking import DigitRanking
+from utils.ranking_memo import eligible_fingerprint, get_ranking_memo
+from utils.strategy_kernel import RankingMatrix, prev_target_digit, extract_strategy_batch
+from utils.hit_kernel import check_hits_batch
+from utils.open_rank import build_open_rank_matrix
+from utils.worker_pool import init_worker, get_worker_engine
+from utils.shared_cache import share_process_caches
 
 
 
@@ -31,6 +49,24 @@ def get_nums_by_positions(sorted_items, positions):
             result.append(sorted_items[p][0])
     return list(set(result))
 
+# ✅ 命中次数 / 命中间隔条件的比较运算符表（替代 eval 拼接表达式）
+COMPARE_OPS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+
+def compare_values(values, op: str, threshold):
+    """values op threshold（values 可为数组，逐元素比较）"""
+    if op not in COMPARE_OPS:
+        raise ValueError(f"不支持的比较运算符: {op}")
+    return COMPARE_OPS[op](values, threshold)
+
+
 def should_reverse_on_tie(num_counter: Counter, min_tied: int = 4):
     """
     返回并列数量，只要任意并列 >= min_tied 就触发
@@ -47,6 +83,120 @@ def get_position_name_map(lottery_name: str) -> dict:
     else:
         return {0: "百位", 1: "十位", 2: "个位"}
 
+# ⛳ 按排名表达式从推荐频次排行榜中提取策略数字
+def extract_strategy(name, enable_list, skip_flag, sorted_items, num_counter, tie_mode="False", open_code_str=None, dingwei_sha_pos=2, reverse_on_tie=False):
+    """
+    按启用的排名表达式（整数排名 / "prev±N" / "All"，逗号分隔为备选）从推荐频次排行榜中提取数字，无法提取时返回 None
+    """
+    if not enable_list:
+        return None
+    if len(sorted_items) < 5 and skip_flag:
+        return None
+    # 如果包含 "All"，直接输出全量推荐数字
+    if enable_list == "All" or (isinstance(enable_list, list) and "All" in enable_list):
+        all_nums = [num for num, _ in sorted_items]
+        print(f"🔥 {name} 共提取{len(all_nums)}个数字（All模式）：{all_nums}")
+        return list(set(all_nums))
+
+
+    result = []
+
+    for pos_expr in enable_list:
+        sub_positions = [s.strip() for s in str(pos_expr).split(",")]
+        extracted = False
+
+        for sub_pos in sub_positions:
+
+            if sub_pos.startswith("prev"):
+                match = re.match(r"prev([+-]?\d*)", sub_pos)
+                offset = int(match.group(1)) if match and match.group(1) else 0
+
+                if not open_code_str:
+                    print(f"⚠️ 无法提取 prev 位置数字（开奖号码为空）")
+                    continue
+
+                try:
+                    open_digits = list(map(int, open_code_str.strip().split(",")))
+                    target_digit = open_digits[dingwei_sha_pos]
+                    ranked_nums = [num for num, _ in sorted_items]
+
+                    if target_digit not in ranked_nums:
+                        print(f"⚠️ prev策略：上期数字 [{target_digit}] 不在推荐排行榜中，尝试备用")
+                        continue
+
+                    idx = ranked_nums.index(target_digit)
+                    new_idx = (idx + offset) % len(ranked_nums)
+                    selected_num = ranked_nums[new_idx]
+                    selected_val = num_counter[selected_num]
+
+                    # 这里对比 selected_val 有多少个并列
+                    tied = [n for n in ranked_nums if num_counter[n] == selected_val]
+                    global_tied_count = should_reverse_on_tie(num_counter)
+                    # “全局出现某个频次相同的数字 ≥ 4个” 触发反向 ± 偏移
+                    if global_tied_count >= 4 and reverse_on_tie:
+                        print(f"⚠️ prev触发反向：当前全局频次并列达到 {global_tied_count} 个，触发反向 ± 偏移")
+                        offset = -offset
+                        new_idx = (idx + offset) % len(ranked_nums)
+                        selected_num = ranked_nums[new_idx]
+                        print(f"🎯 prev反向提取 wrap后：上期[{target_digit}] ±{abs(offset)} ⇒ {selected_num}")
+                        result.append(selected_num)
+                        extracted = True
+                    else:
+                        print(f"🎯 prev提取：上期[{target_digit}] {offset:+} ⇒ {selected_num}")
+                        result.append(selected_num)
+                        extracted = True
+
+                except Exception as e:
+                    print(f"❌ prev提取异常：{e}")
+
+                if extracted:
+                    break
+
+            else:
+                try:
+                    idx = int(sub_pos) - 1 if int(sub_pos) > 0 else int(sub_pos)
+                    if abs(idx) >= len(sorted_items):
+                        continue
+
+                    target_val = sorted_items[idx][1]
+                    tied = [num for num, cnt in sorted_items if cnt == target_val]
+
+                    if len(tied) > 1 and tie_mode == "Skip":
+                        print(f"⚠️ {name} 出现并列，跳过")
+                        continue
+
+                    elif len(tied) > 1 and tie_mode == "Next":
+                        for next_idx in range(idx + 1, len(sorted_items)):
+                            if sorted_items[next_idx][1] != target_val:
+                                result.append(sorted_items[next_idx][0])
+                                print(f"🎯 {name} 跳过并列，选第 {next_idx + 1} 名")
+                                extracted = True
+                                break
+
+                    elif len(tied) > 1 and reverse_on_tie:
+                        if idx >= 0:
+                            new_idx = -1 * (idx + 1)
+                        else:
+                            new_idx = abs(idx) - 1  # 理论上没必要，除非你传负数
+                        if abs(new_idx) >= len(sorted_items):
+                            continue
+                        num = sorted_items[new_idx][0]
+                        print(f"⚠️ {name} 出现并列，reverse_on_tie=True，原 idx={idx+1} → 反向 idx={new_idx} → {num}")
+                        result.append(num)
+                        extracted = True
+
+                    else:
+                        result.append(sorted_items[idx][0])
+                        print(f"🔥 {name} 提取第 {idx + 1 if idx >= 0 else len(sorted_items) + idx + 1} 名：{sorted_items[idx][0]}")
+                        extracted = True
+                except Exception as e:
+                    print(f"❌ 排名提取异常：{e}")
+                if extracted:
+                    break
+
+    return list(set(result)) if result else None
+
+
 # 主方法：专家推荐命中分析
 def analyze_expert_hits(
         engine,  # ✅ 必须放最前面
@@ -91,24 +241,20 @@ def analyze_expert_hits(
         reverse_on_tie_dingwei_dan1: bool = False,
         specified_user_ids: list = None,  # ✅ 新增：直接指定 user_id
         min_gap_condition: tuple = None,
+        use_cube: bool = False,  # ✅ 新增：命中排名模式改为从内存预测立方体取数（仅数字型彩种）
+        hit_windows: dict = None,  # ✅ 新增：{玩法: SlidingHitWindow}，批量分析时由 run_hit_analysis_batch 传入，回溯命中计数增量更新
 
 ):
     prediction_table = get_prediction_table(lottery_name)
-    result_table = get_result_table(lottery_name)
-
-    issue_df = pd.read_sql(
-        f"SELECT DISTINCT issue_name FROM {prediction_table} ORDER BY issue_name DESC",
-        engine
-    )
+    use_cube = use_cube and is_cube_supported(lottery_name)
 
-    all_issues = issue_df["issue_name"].tolist()
+    # ✅ 期号索引进程内共享，回溯区间为二分查找，不再每次扫描 DISTINCT issue_name
+    issue_index = get_issue_index(engine, lottery_name)
 
     if query_issue is None:
-        query_issue = all_issues[0] if all_issues else None
-    prior_issues = [i for i in all_issues if i < query_issue]
-    # print(all_issues)
-    # print(query_issue)
-    issue_list = prior_issues[lookback_start_offset: lookback_start_offset + lookback_n] if lookback_n else prior_issues[lookback_start_offset:]
+        latest_issues = issue_index.latest(1)
+        query_issue = latest_issues[0] if latest_issues else None
+    issue_list = issue_index.lookback_issues(query_issue, lookback_n, lookback_start_offset) if query_issue is not None else []
 
     # ✅ 如果指定了 user_id，直接使用，跳过后面所有筛选
     if specified_user_ids:
@@ -117,42 +263,28 @@ def analyze_expert_hits(
         print(f"🎯 查询期号: {query_issue}")
         print(f"🎯 使用指定 user_id 列表: {eligible_user_ids}（跳过自动命中筛选）")
 
-        for uid in list(eligible_user_ids):
-            # 查询该 user_id 所有推荐 + 开奖
-            df_rec = pd.read_sql(f"""
-                SELECT p.issue_name, p.numbers, r.open_code
-                FROM {prediction_table} p
-                JOIN {result_table} r ON p.issue_name = r.issue_name
-                WHERE p.user_id = %s AND p.playtype_name = %s AND p.issue_name < %s
-                ORDER BY p.issue_name
-            """, engine,  params=(uid, query_playtype_name, query_issue))
-
-            # 真命中期号
-            hit_issues = []
-            for _, row in df_rec.iterrows():
-                if match_hit(query_playtype_name, row["numbers"], row["open_code"], None):
-                    hit_issues.append(int(row["issue_name"]))
-
-            if not hit_issues:
-                continue
+        # ✅ 全部指定用户的命中时间线一次取回并按用户缓存，间隔统计按数组批量计算
+        user_list = list(eligible_user_ids)
+        stats = get_user_hit_timelines(engine, lottery_name, query_playtype_name).gap_stats(user_list, query_issue)
+
+        # ✅ 使用 min_gap_condition 判断（从未命中的用户不参与间隔判断）
+        skipped = np.zeros(len(user_list), dtype=bool)
+        if min_gap_condition:
+            op, val = min_gap_condition
+            skipped = (stats["hit_count"] > 0) & compare_values(stats["gap_now"], op, val)
 
-            last_hit = max(hit_issues)
-            gap_now = int(query_issue) - last_hit
-            if len(hit_issues) >= 2:
-                gaps = [j - i for i, j in zip(hit_issues[:-1], hit_issues[1:])]
-                avg_gap = sum(gaps) / len(gaps)
+        for uid, last_hit, avg_gap, gap_now, hit_count, skip in zip(
+                user_list, stats["last_hit"].tolist(), stats["avg_gap"].tolist(), stats["gap_now"].tolist(),
+                stats["hit_count"].tolist(), skipped.tolist()):
+            if not hit_count:
+                continue
+            if hit_count >= 2:
                 print(f"🔍 user_id: {uid} | 上次命中: {last_hit} | 平均命中间隔: {avg_gap:.2f} | 当前间隔: {gap_now}")
             else:
                 print(f"🔍 user_id: {uid} | 上次命中: {last_hit} | 平均命中间隔: 无法计算 | 当前间隔: {gap_now}")
-
-
-            # ✅ 使用 min_gap_condition 判断
-            if min_gap_condition:
-                op, val = min_gap_condition
-                if eval(f"{gap_now} {op} {val}"):
-                    print(f"⚠️ 当前间隔 {gap_now} 满足条件 {op} {val}，跳过 user_id: {uid}")
-                    eligible_user_ids.discard(uid)
-
+            if skip:
+                print(f"⚠️ 当前间隔 {gap_now} 满足条件 {op} {val}，跳过 user_id: {uid}")
+                eligible_user_ids.discard(uid)
 
         if not eligible_user_ids:
             print("⚠️ 所有 user_id 已因最小间隔未达被跳过")
@@ -175,41 +307,28 @@ def analyze_expert_hits(
         if mode == "hitcount" and hit_count_conditions:
             print("✅ 模式: 命中次数筛选（按玩法条件）")
             print(f"✅ 回溯期号: {issue_list}")
-            total_hit_counter_map = defaultdict(Counter)
-            for issue in issue_list:
-                open_info = pd.read_sql(
-                    f"SELECT open_code FROM {result_table} WHERE issue_name = %s",
-                    engine, params=(issue,)
-                ).to_dict("records")
-                if not open_info:
-                    continue
-                open_code = open_info[0]["open_code"]
-                for pt in hit_count_conditions.keys():
-                    df = pd.read_sql(
-                        f"SELECT user_id, numbers FROM {prediction_table} WHERE issue_name = %s AND playtype_name = %s",
-                        engine, params=(issue, pt)
-                    )
-                    for _, row in df.iterrows():
-                        if match_hit(pt, row["numbers"], open_code, None):
-                            total_hit_counter_map[pt][row["user_id"]] += 1
-
-            eligible_user_ids = None
+            # ✅ 每个玩法得到 参与用户 / 窗口命中次数 两个数组：命中矩阵前缀和 > 滑动窗口 > 整窗一次取回
+            pt_user_hits = {}
+            for pt in hit_count_conditions:
+                if use_cube:
+                    hit_matrix = get_hit_matrix(engine, lottery_name, pt)
+                    start, stop = issue_index.lookback_window(query_issue, lookback_n, lookback_start_offset)
+                    hit_counts, participants = hit_matrix.window_counts(start, stop)
+                    pt_user_hits[pt] = (hit_matrix.cube.user_ids[participants], hit_counts[participants])
+                elif hit_windows is not None:
+                    pt_counter = get_hit_window(hit_windows, engine, lottery_name, pt).advance(issue_list)
+                    pt_user_hits[pt] = (np.array(list(pt_counter.keys())), np.array(list(pt_counter.values()), dtype=np.int64))
+                else:
+                    pt_user_hits[pt] = fetch_window_user_hits(engine, lottery_name, prediction_table, pt, issue_list)
+
+            # ✅ 条件比较走运算符表，多玩法条件取数组交集
+            eligible_users = None
             for pt, condition in hit_count_conditions.items():
                 op, threshold = condition if isinstance(condition, tuple) else ("==", condition)
-                pt_counter = total_hit_counter_map[pt]
-                issue_list_str = ",".join([f"'{x}'" for x in issue_list])
-                sql = f"""
-                  SELECT DISTINCT user_id FROM {prediction_table}
-                  WHERE issue_name IN ({issue_list_str}) AND playtype_name = %s
-                """
-                all_users = pd.read_sql(sql, engine, params=(pt,))
-
-                all_user_ids = set(all_users["user_id"].tolist())
-                for uid in all_user_ids:
-                    if uid not in pt_counter:
-                        pt_counter[uid] = 0
-                user_ids_this_pt = [uid for uid, hit in pt_counter.items() if eval(f"{hit} {op} {threshold}")]
-                eligible_user_ids = set(user_ids_this_pt) if eligible_user_ids is None else eligible_user_ids & set(user_ids_this_pt)
+                user_ids, hits = pt_user_hits[pt]
+                passed = user_ids[compare_values(hits, op, threshold)]
+                eligible_users = passed if eligible_users is None else np.intersect1d(eligible_users, passed)
+            eligible_user_ids = set(eligible_users.tolist())
 
             if not eligible_user_ids:
                 return build_default_result(query_issue, hit_count_conditions)
@@ -233,52 +352,71 @@ def analyze_expert_hits(
             total_hit_counter = Counter()
             per_issue_pass_user_ids = []  # 仅用于 hit+N
 
-            for issue in issue_list:
-                # 单期查询
-                df = pd.read_sql(
-                    f"SELECT user_id, numbers FROM {prediction_table} WHERE issue_name = %s AND playtype_name = %s",
-                    engine, params=(issue, analyze_playtype_name)
-                )
-                open_info = pd.read_sql(
-                    f"SELECT open_code FROM {result_table} WHERE issue_name = %s",
-                    engine, params=(issue,)
-                ).to_dict("records")
-                if not open_info:
-                    continue
-                open_code = open_info[0]["open_code"]
-                open_nums = set(map(int, re.findall(r"\d+", open_code)))
-
-                if use_single_hit_count_mode:
-                    pass_user_ids_this_issue = set()
-                    for _, row in df.iterrows():
-                        rec_nums = set(map(int, re.findall(r"\d+", row["numbers"])))
-                        hit_cnt = len(rec_nums & open_nums)
-                        if hit_cnt == exact_hit:
-                            pass_user_ids_this_issue.add(row["user_id"])
-                    per_issue_pass_user_ids.append(pass_user_ids_this_issue)
-                else:
-                    for _, row in df.iterrows():
-                        if match_hit(analyze_playtype_name, row["numbers"], open_code, None):
-                            total_hit_counter[row["user_id"]] += 1
+            analyze_cube = get_prediction_cube(engine, lottery_name, analyze_playtype_name) if use_cube else None
+            user_hit_dict = None
+            exact_user_ids = None
+
+            if use_cube and use_single_hit_count_mode:
+                # ✅ hit+N 位图前缀和：窗口内“恰好命中 N 个”的期数等于已开奖期数的用户即逐期交集
+                start, stop = issue_index.lookback_window(query_issue, lookback_n, lookback_start_offset)
+                exact_users = get_exact_hit_matrix(engine, lottery_name, analyze_playtype_name).window_users(exact_hit, start, stop)
+                exact_user_ids = set(analyze_cube.user_ids[exact_users].tolist())
+            elif use_cube and not use_single_hit_count_mode:
+                # ✅ 命中矩阵前缀和：窗口内每个用户的命中次数与参与用户集合均为两行相减
+                hit_matrix = get_hit_matrix(engine, lottery_name, analyze_playtype_name)
+                start, stop = issue_index.lookback_window(query_issue, lookback_n, lookback_start_offset)
+                hit_counts, participants = hit_matrix.window_counts(start, stop)
+                user_hit_dict = dict(zip(analyze_cube.user_ids[participants].tolist(), hit_counts[participants].tolist()))
+            elif hit_windows is not None and not use_single_hit_count_mode:
+                # ✅ 滑动窗口：相邻期号的回溯窗口只差首尾两期，增量加减即可
+                user_hit_dict = get_hit_window(hit_windows, engine, lottery_name, analyze_playtype_name).advance(issue_list)
+
+            if user_hit_dict is None and exact_user_ids is None:
+                for issue in issue_list:
+                    # 单期查询
+                    if use_cube:
+                        df = analyze_cube.predictions_at(issue)
+                    else:
+                        df = pd.read_sql(
+                            f"SELECT user_id, numbers FROM {prediction_table} WHERE issue_name = %s AND playtype_name = %s ORDER BY id",
+                            engine, params=(issue, analyze_playtype_name)
+                        )
+                    open_code = get_open_code(engine, lottery_name, issue)
+                    if open_code is None:
+                        continue
+
+                    if use_single_hit_count_mode:
+                        # ✅ 整列批量解析，命中个数 = 推荐数字与开奖数字的交集大小（数字型彩种走位掩码计 1）
+                        open_nums = parse_digit_column([open_code]).row_values(0)
+                        hit_cnt = parse_digit_column(df["numbers"]).intersect_count(open_nums)
+                        pass_user_ids_this_issue = set(df["user_id"][hit_cnt == exact_hit].tolist())
+                        per_issue_pass_user_ids.append(pass_user_ids_this_issue)
+                    else:
+                        for _, row in df.iterrows():
+                            if match_hit(analyze_playtype_name, row["numbers"], open_code, None):
+                                total_hit_counter[row["user_id"]] += 1
 
             if use_single_hit_count_mode:
-                if per_issue_pass_user_ids:
+                if exact_user_ids is not None:
+                    eligible_user_ids = exact_user_ids
+                elif per_issue_pass_user_ids:
                     eligible_user_ids = set.intersection(*per_issue_pass_user_ids)
                 else:
                     eligible_user_ids = set()
                 selected_hit_values = [exact_hit]
             else:
-                user_hit_dict = dict(total_hit_counter)
-                issue_list_str = ",".join([f"'{x}'" for x in issue_list])
-                sql = f"""
-                        SELECT DISTINCT user_id FROM {prediction_table}
-                        WHERE issue_name IN ({issue_list_str}) AND playtype_name = %s
-                    """
-                all_expert_df = pd.read_sql(sql, engine, params=(analyze_playtype_name,))
-                all_user_ids = set(all_expert_df["user_id"])
-                for uid in all_user_ids:
-                    if uid not in user_hit_dict:
-                        user_hit_dict[uid] = 0
+                if user_hit_dict is None:
+                    user_hit_dict = dict(total_hit_counter)
+                    issue_list_str = ",".join([f"'{x}'" for x in issue_list])
+                    sql = f"""
+                            SELECT DISTINCT user_id FROM {prediction_table}
+                            WHERE issue_name IN ({issue_list_str}) AND playtype_name = %s
+                        """
+                    all_expert_df = pd.read_sql(sql, engine, params=(analyze_playtype_name,))
+                    all_user_ids = set(all_expert_df["user_id"])
+                    for uid in all_user_ids:
+                        if uid not in user_hit_dict:
+                            user_hit_dict[uid] = 0
                 hit_values = sorted(set(user_hit_dict.values()), reverse=True)
 
                 # ✅ 支持 ["ALL"] 模式，自动选出所有有命中的 user_id
@@ -303,39 +441,48 @@ def analyze_expert_hits(
 
 
     # 查询推荐数据
-    sql = f"""
-        SELECT user_id, numbers
-        FROM {prediction_table}
-        WHERE issue_name = %s AND playtype_name = %s
-          AND user_id IN ({','.join(['%s'] * len(eligible_user_ids))})
-    """
-    params = (query_issue, query_playtype_name, *list(eligible_user_ids))
-    rec_df = pd.read_sql(sql, engine, params=params)
-
-    # 提取所有推荐数字
-    all_numbers = []
-    for nums in rec_df["numbers"]:
-        digits = re.findall(r"\d+", nums)
-        all_numbers.extend(map(int, digits))
-    num_counter = Counter(all_numbers)
+    # ✅ 立方体路径：不同 lookback_n / 命中排名组合常选出相同的入选集合，按 (期号, 入选集合指纹) 复用推荐行下标与排行榜；
+    # 键中带立方体版本，立方体重新加载（含新增预测）后旧条目不再命中，由 LRU 自然淘汰。
+    # SQL 路径每次查库：开奖版本反映不了新入库的预测，常驻进程复用会返回过期推荐
+    if use_cube:
+        query_cube = get_prediction_cube(engine, lottery_name, query_playtype_name)
+        dense_users = np.flatnonzero(np.isin(query_cube.user_ids, list(eligible_user_ids)))
+
+        def load_recommendations():
+            rec_rows = query_cube.row_indices(query_issue, eligible_user_ids)
+            # ✅ bincount 排名，名次与 Counter(all_numbers).most_common() 逐位一致
+            return rec_rows, DigitRanking(query_cube.digit_values(rec_rows))
+        memo_key = (lottery_name, query_playtype_name, query_cube.version, query_issue, eligible_fingerprint(dense_users))
+        rec_rows, ranking = get_ranking_memo().get_or_compute(memo_key, load_recommendations)
+        rec_df = query_cube.frame(rec_rows)
+    else:
+        sql = f"""
+            SELECT user_id, numbers
+            FROM {prediction_table}
+            WHERE issue_name = %s AND playtype_name = %s
+              AND user_id IN ({','.join(['%s'] * len(eligible_user_ids))})
+            ORDER BY id
+        """
+        params = (query_issue, query_playtype_name, *list(eligible_user_ids))
+        rec_df = pd.read_sql(sql, engine, params=params)
+        # 提取所有推荐数字（整列批量解析，顺序与逐行 re.findall 一致）
+        ranking = DigitRanking(parse_digit_column(rec_df["numbers"]).values)
+
+    num_counter = ranking.to_counter()
+    sorted_items = ranking.most_common()
 
     print("🎯 推荐数字排行榜:")
-    for num, count in num_counter.most_common():
+    for num, count in sorted_items:
         print(f"数字 {num}: 出现 {count} 次")
 
-    sorted_items = num_counter.most_common()
 
     # ✅ 新增：用于 prev 策略的“上期开奖号”
     prev_open_code_str = None
     try:
         prev_issue = str(int(query_issue) - 1)
-        df_prev_open = pd.read_sql(
-            f"SELECT open_code FROM {result_table} WHERE issue_name = %s",
-            engine, params=(prev_issue,)
-        )
+        prev_open_code_str = get_open_code(engine, lottery_name, prev_issue)
 
-        if not df_prev_open.empty:
-            prev_open_code_str = df_prev_open.iloc[0]["open_code"]
+        if prev_open_code_str is not None:
             print(f"🎯 上期开奖号（用于 prev 策略）：{prev_issue}，开奖号：{prev_open_code_str}")
         else:
             print(f"⚠️ 上期开奖号未找到，将跳过所有 prev 策略相关提取")
@@ -343,123 +490,10 @@ def analyze_expert_hits(
         print(f"❌ 获取上期开奖结果失败: {e}")
 
     # 追踪开奖号码在推荐频次排序中的排名
-    open_code_str = None
-    df_open = pd.read_sql(
-        f"SELECT open_code FROM {result_table} WHERE issue_name = %s",
-        engine, params=(query_issue,)
-    )
-
-    if not df_open.empty:
-        open_code_str = df_open.iloc[0]["open_code"]
-
-    def extract_strategy(name, enable_list, skip_flag, tie_mode="False", open_code_str=None, dingwei_sha_pos=2, reverse_on_tie=False):
-        if not enable_list:
-            return None
-        if len(sorted_items) < 5 and skip_flag:
-            return None
-        # 如果包含 "All"，直接输出全量推荐数字
-        if enable_list == "All" or (isinstance(enable_list, list) and "All" in enable_list):
-            all_nums = [num for num, _ in sorted_items]
-            print(f"🔥 {name} 共提取{len(all_nums)}个数字（All模式）：{all_nums}")
-            return list(set(all_nums))
-
-
-        result = []
+    open_cache = get_open_code_cache(engine, lottery_name)
+    open_code_str = open_cache.get_open_code(query_issue)
+    open_digits = open_cache.get_digits(query_issue)
 
-        for pos_expr in enable_list:
-            sub_positions = [s.strip() for s in str(pos_expr).split(",")]
-            extracted = False
-
-            for sub_pos in sub_positions:
-
-                if sub_pos.startswith("prev"):
-                    match = re.match(r"prev([+-]?\d*)", sub_pos)
-                    offset = int(match.group(1)) if match and match.group(1) else 0
-
-                    if not open_code_str:
-                        print(f"⚠️ 无法提取 prev 位置数字（开奖号码为空）")
-                        continue
-
-                    try:
-                        open_digits = list(map(int, open_code_str.strip().split(",")))
-                        target_digit = open_digits[dingwei_sha_pos]
-                        ranked_nums = [num for num, _ in sorted_items]
-
-                        if target_digit not in ranked_nums:
-                            print(f"⚠️ prev策略：上期数字 [{target_digit}] 不在推荐排行榜中，尝试备用")
-                            continue
-
-                        idx = ranked_nums.index(target_digit)
-                        new_idx = (idx + offset) % len(ranked_nums)
-                        selected_num = ranked_nums[new_idx]
-                        selected_val = num_counter[selected_num]
-
-                        # 这里对比 selected_val 有多少个并列
-                        tied = [n for n in ranked_nums if num_counter[n] == selected_val]
-                        global_tied_count = should_reverse_on_tie(num_counter)
-                        # “全局出现某个频次相同的数字 ≥ 4个” 触发反向 ± 偏移
-                        if global_tied_count >= 4 and reverse_on_tie:
-                            print(f"⚠️ prev触发反向：当前全局频次并列达到 {global_tied_count} 个，触发反向 ± 偏移")
-                            offset = -offset
-                            new_idx = (idx + offset) % len(ranked_nums)
-                            selected_num = ranked_nums[new_idx]
-                            print(f"🎯 prev反向提取 wrap后：上期[{target_digit}] ±{abs(offset)} ⇒ {selected_num}")
-                            result.append(selected_num)
-                            extracted = True
-                        else:
-                            print(f"🎯 prev提取：上期[{target_digit}] {offset:+} ⇒ {selected_num}")
-                            result.append(selected_num)
-                            extracted = True
-
-                    except Exception as e:
-                        print(f"❌ prev提取异常：{e}")
-
-                    if extracted:
-                        break
-
-                else:
-                    try:
-                        idx = int(sub_pos) - 1 if int(sub_pos) > 0 else int(sub_pos)
-                        if abs(idx) >= len(sorted_items):
-                            continue
-
-                        target_val = sorted_items[idx][1]
-                        tied = [num for num, cnt in sorted_items if cnt == target_val]
-
-                        if len(tied) > 1 and tie_mode == "Skip":
-                            print(f"⚠️ {name} 出现并列，跳过")
-                            continue
-
-                        elif len(tied) > 1 and tie_mode == "Next":
-                            for next_idx in range(idx + 1, len(sorted_items)):
-                                if sorted_items[next_idx][1] != target_val:
-                                    result.append(sorted_items[next_idx][0])
-                                    print(f"🎯 {name} 跳过并列，选第 {next_idx + 1} 名")
-                                    extracted = True
-                                    break
-
-                        elif len(tied) > 1 and reverse_on_tie:
-                            if idx >= 0:
-                                new_idx = -1 * (idx + 1)
-                            else:
-                                new_idx = abs(idx) - 1  # 理论上没必要，除非你传负数
-                            if abs(new_idx) >= len(sorted_items):
-                                continue
-                            num = sorted_items[new_idx][0]
-                            print(f"⚠️ {name} 出现并列，reverse_on_tie=True，原 idx={idx+1} → 反向 idx={new_idx} → {num}")
-                            result.append(num)
-                            extracted = True
-
-                        else:
-                            result.append(sorted_items[idx][0])
-                            print(f"🔥 {name} 提取第 {idx + 1 if idx >= 0 else len(sorted_items) + idx + 1} 名：{sorted_items[idx][0]}")
-                            extracted = True
-                    except Exception as e:
-                        print(f"❌ 排名提取异常：{e}")
-                    if extracted:
-                        break
-
-        return list(set(result)) if result else None
 
 
     # 仅跳过配置为跳的策略，其他照常执行
@@ -495,14 +529,14 @@ def analyze_expert_hits(
             for name in skipped:
                 print(f"  - {name}")
 
-    sha1 = extract_strategy("sha1", enable_sha1, skip_if_few_sha1, resolve_tie_mode_sha1, prev_open_code_str, dingwei_sha_pos)
-    sha2 = extract_strategy("sha2", enable_sha2, skip_if_few_sha2, resolve_tie_mode_sha2, prev_open_code_str, dingwei_sha_pos)
-    dan1 = extract_strategy("dan1", enable_dan1, skip_if_few_dan1, resolve_tie_mode_dan1, prev_open_code_str, dingwei_sha_pos)
-    dan2 = extract_strategy("dan2", enable_dan2, skip_if_few_dan2, resolve_tie_mode_dan2, prev_open_code_str, dingwei_sha_pos)
-    dingwei_sha  = extract_strategy("dingwei_sha", enable_dingwei_sha, skip_if_few_dingwei_sha, resolve_tie_mode_dingwei_sha, prev_open_code_str, dingwei_sha_pos, reverse_on_tie_dingwei_sha)
-    dingwei_sha2 = extract_strategy("dingwei_sha2", enable_dingwei_sha2, skip_if_few_dingwei_sha2, resolve_tie_mode_dingwei_sha2, prev_open_code_str, dingwei_sha_pos, reverse_on_tie_dingwei_sha2)
-    dingwei_sha3 = extract_strategy("dingwei_sha3", enable_dingwei_sha3, skip_if_few_dingwei_sha3, resolve_tie_mode_dingwei_sha3, prev_open_code_str, dingwei_sha_pos, reverse_on_tie_dingwei_sha3)
-    dingwei_dan  = extract_strategy("dingwei_dan1", enable_dingwei_dan1, skip_if_few_dingwei_dan1, resolve_tie_mode_dingwei_dan1, prev_open_code_str, dingwei_sha_pos, reverse_on_tie_dingwei_dan1)
+    sha1 = extract_strategy("sha1", enable_sha1, skip_if_few_sha1, sorted_items, num_counter, resolve_tie_mode_sha1, prev_open_code_str, dingwei_sha_pos)
+    sha2 = extract_strategy("sha2", enable_sha2, skip_if_few_sha2, sorted_items, num_counter, resolve_tie_mode_sha2, prev_open_code_str, dingwei_sha_pos)
+    dan1 = extract_strategy("dan1", enable_dan1, skip_if_few_dan1, sorted_items, num_counter, resolve_tie_mode_dan1, prev_open_code_str, dingwei_sha_pos)
+    dan2 = extract_strategy("dan2", enable_dan2, skip_if_few_dan2, sorted_items, num_counter, resolve_tie_mode_dan2, prev_open_code_str, dingwei_sha_pos)
+    dingwei_sha  = extract_strategy("dingwei_sha", enable_dingwei_sha, skip_if_few_dingwei_sha, sorted_items, num_counter, resolve_tie_mode_dingwei_sha, prev_open_code_str, dingwei_sha_pos, reverse_on_tie_dingwei_sha)
+    dingwei_sha2 = extract_strategy("dingwei_sha2", enable_dingwei_sha2, skip_if_few_dingwei_sha2, sorted_items, num_counter, resolve_tie_mode_dingwei_sha2, prev_open_code_str, dingwei_sha_pos, reverse_on_tie_dingwei_sha2)
+    dingwei_sha3 = extract_strategy("dingwei_sha3", enable_dingwei_sha3, skip_if_few_dingwei_sha3, sorted_items, num_counter, resolve_tie_mode_dingwei_sha3, prev_open_code_str, dingwei_sha_pos, reverse_on_tie_dingwei_sha3)
+    dingwei_dan  = extract_strategy("dingwei_dan1", enable_dingwei_dan1, skip_if_few_dingwei_dan1, sorted_items, num_counter, resolve_tie_mode_dingwei_dan1, prev_open_code_str, dingwei_sha_pos, reverse_on_tie_dingwei_dan1)
 
 
     return {
@@ -519,9 +553,36 @@ def analyze_expert_hits(
         "dingwei_dan": dingwei_dan,           # <--- 新增
         "min_hit_threshold": hit_count_conditions if mode == "hitcount" else selected_hit_values,
         "query_issue": query_issue,
-        "open_code": open_code_str
+        "open_code": open_code_str,
+        "open_digits": open_digits,
+        "prev_open_code": prev_open_code_str,
+        "ranking": ranking,
     }
 
+# 辅助：回溯窗口一次取回并批量判断命中
+def fetch_window_user_hits(engine, lottery_name: str, prediction_table: str, playtype_name: str, issue_list: list):
+    """
+    回溯窗口内某玩法的全部推荐一次取回并批量判断命中，返回 (参与用户, 命中次数) 两个数组。
+    参与用户为窗口内有推荐的全部用户（含 0 命中），未开奖期号不计命中
+    """
+    df = pd.read_sql(
+        f"SELECT issue_name, user_id, numbers FROM {prediction_table} WHERE playtype_name = %s AND issue_name IN ({','.join(['%s'] * len(issue_list))})",
+        engine, params=(playtype_name, *issue_list)
+    )
+    open_cache = get_open_code_cache(engine, lottery_name)
+    open_by_issue = {issue: open_cache.get_open_code(issue) for issue in df["issue_name"].unique()}
+    row_hit = match_hit_rows(playtype_name, df["numbers"].tolist(), df["issue_name"].map(open_by_issue).tolist())
+    user_ids, user_idx = np.unique(df["user_id"].to_numpy(), return_inverse=True)
+    hits = np.bincount(user_idx, weights=row_hit, minlength=len(user_ids)).astype(np.int64)
+    return user_ids, hits
+
+
+# 辅助：按玩法取（或创建）滑动命中窗口
+def get_hit_window(hit_windows: dict, engine, lottery_name: str, playtype_name: str) -> SlidingHitWindow:
+    if playtype_name not in hit_windows:
+        hit_windows[playtype_name] = SlidingHitWindow(engine, lottery_name, playtype_name)
+    return hit_windows[playtype_name]
+
 # 辅助：构造空结果结构
 def build_default_result(query_issue, hit_threshold):
     return {
@@ -559,23 +620,16 @@ def check_hit_on_result(engine, lottery_name, issue_name,
         print("✅ 未启用定位策略，已跳过定位判断")
         return True
 
-    from utils.db import get_result_table
-    result_table = get_result_table(lottery_name)
-
-    # 读取开奖号码
-    df_open = pd.read_sql(
-        f"SELECT open_code FROM {result_table} WHERE issue_name = %s",
-        engine, params=(issue_name,)
-    )
-    if df_open.empty:
+    # 读取开奖号码（进程级开奖缓存）
+    open_cache = get_open_code_cache(engine, lottery_name)
+    open_code = open_cache.get_open_code(issue_name)
+    if open_code is None:
         print("⚠️ 未找到开奖号码")
         raise ValueError("open_code_missing")
 
-
-    open_code = df_open.iloc[0]["open_code"]
     print(f"🎯 当期开奖号码: {open_code}")
-    open_digits = set(map(int, open_code.strip().split(",")))
-    open_digits_list = list(map(int, open_code.strip().split(",")))
+    open_digits_list = open_cache.get_digits(issue_name)
+    open_digits = set(open_digits_list)
     POSITION_NAME_MAP = {}
     if lottery_name in ["排列5", "排列五"]:
         POSITION_NAME_MAP = {0: "万位", 1: "千位", 2: "百位", 3: "十位", 4: "个位"}
@@ -594,11 +648,10 @@ def check_hit_on_result(engine, lottery_name, issue_name,
                 if hit_nums:
                     print(f"❌ 杀号失败 {i} 共提取{total_count}个数字：【{sha}】命中开奖号码 {hit_nums} ❗")
                     # 👇 追加查找 user_id
-                    if rec_df is not None:
-                        for _, row in rec_df.iterrows():
-                            nums = [int(n.strip()) for n in row["numbers"].split(",") if n.strip().isdigit()]
-                            if any(hit in nums for hit in hit_nums):
-                                print(f"🔍 命中来源 user_id: {row['user_id']}")
+                    if rec_df is not None and not rec_df.empty:
+                        source_rows = parse_digit_column(rec_df["numbers"]).contains_any(hit_nums)
+                        for uid in rec_df["user_id"][source_rows]:
+                            print(f"🔍 命中来源 user_id: {uid}")
                     hit_success = False
                 else:
                     print(f"✅ 杀号成功 {i} 共提取{total_count}个数字：【{sha}】未命中（正确）")
@@ -681,12 +734,16 @@ def track_open_rank(result: dict, dingwei_sha_pos: int, rank_counter: Counter, c
     """
     用于统计开奖号码中指定位置数字在推荐数字频次排序中的排名。
     """
-    sorted_items = [num for num, _ in result.get("num_counter", {}).most_common()]
+    # ✅ 优先用 analyze_expert_hits 返回的 DigitRanking 直接查名次，兼容只带 num_counter 的旧结果
+    ranking = result.get("ranking")
+    sorted_items = [num for num, _ in result.get("num_counter", {}).most_common()] if ranking is None else None
     open_code_str = result.get("open_code")
     if not open_code_str:
         return
 
-    open_digits = list(map(int, open_code_str.strip().split(",")))
+    open_digits = result.get("open_digits")
+    if open_digits is None:
+        open_digits = list(map(int, open_code_str.strip().split(",")))
     if dingwei_sha_pos is None and check_mode != "all":
         return  # 如果没有定位位且不是全位模式，直接跳过
     positions = [dingwei_sha_pos] if check_mode != "all" else list(range(len(open_digits)))
@@ -698,14 +755,23 @@ def track_open_rank(result: dict, dingwei_sha_pos: int, rank_counter: Counter, c
         if len(open_digits) <= pos:
             continue
         digit = open_digits[pos]
-        if digit in sorted_items:
+        if ranking is not None:
+            rank = ranking.rank_of(digit)
+            if rank is not None:
+                rank_counter[rank] += 1
+        elif digit in sorted_items:
             try:
                 rank = sorted_items.index(digit) + 1
                 rank_counter[rank] += 1
             except ValueError:
                 print(f"⚠️ 开奖号码 {digit} 未出现在推荐排序列表中，跳过统计。")
 
-def run_hit_analysis_batch(
+
+# ✅ 并行时每个子进程分到的期号段数：分段更细，各进程负载更均衡（每段首期需完整构建一次滑动窗口）
+ISSUE_CHUNKS_PER_WORKER = 4
+
+
+def _evaluate_issue_chunk(
         engine,
         lottery_name,
         query_issues,
@@ -714,49 +780,22 @@ def run_hit_analysis_batch(
         dingwei_sha_pos,
         check_mode,
         analysis_kwargs: dict,
-        stop_flag_key="stop_analysis",  # ✅ 新增参数
-        log_callback=None,  # ✅ 新增参数
-        all_mode_limit: int = None,
-        strategy_relative_path=None   # ✅ 新增
-):
+        stop_flag_key="stop_analysis",
+        log_callback=None,
+        incremental_window: bool = True,
+) -> dict:
     """
-    分析指定多个期号的杀号/胆码/定位杀号效果，并支持命中率与推荐数字排名统计。
-
-    参数：
-    - engine: 数据库连接对象
-    - lottery_name: 彩种名，如 '福彩3D'
-    - query_issues: 要分析的期号列表
-    - enable_hit_check: 是否执行 check_hit_on_result 判断
-    - enable_track_open_rank: 是否启用开奖号码推荐排名统计
-    - dingwei_sha_pos: 定位杀号的目标位（0=百, 1=十, 2=个）
-    - analysis_kwargs: 要传给 analyze_expert_hits 的其他参数（dict）
-    - check_mode: str = "dingwei"   # 定位杀号判断模式：仅指定位置（"dingwei"）或全位判断（"all"）
-
-    返回：
-    - None（仅打印分析结果）
+    run_hit_analysis_batch 的逐期循环：依次分析 query_issues 并累计计数，
+    返回 hit_count / miss_count / skip_count / open_rank_counter / max_rank_length，
+    以及本段对入选集合备忘录的查询 / 复用次数 memo_lookups / memo_hits
     """
-    from collections import Counter
-    global print
-    print = log  # ✅ 重定向 print 到 log，实现捕获
-    from collections import Counter
+    memo = get_ranking_memo()
+    memo_lookups, memo_hits = memo.lookups, memo.hits
     hit_count = 0
     miss_count = 0
     skip_count = 0
     open_rank_counter = Counter()  # ✅ 累计开奖号码在推荐频次中出现的排名
-    # print(f"🟢 lookback_n (batch) = {analysis_kwargs.get('lookback_n')}")
-    # ✅ 支持 query_issues = ['All']，自动提取所有期号
-    if query_issues == ["All"]:
-        prediction_table = get_prediction_table(lottery_name)
-        issue_df = pd.read_sql(
-            f"SELECT DISTINCT issue_name FROM {prediction_table} ORDER BY issue_name DESC",
-            engine
-        )
-        query_issues = issue_df["issue_name"].tolist()
-        if all_mode_limit is not None:
-            query_issues = query_issues[:all_mode_limit]
-            print(f"✅ 已限制仅保留最新 {all_mode_limit} 期")
-        print(f"✅ query_issues = ['All'] 模式生效，共提取期号数量：{len(query_issues)}")
-        # print(f"📋 期号列表：{query_issues}")
+    hit_windows = {} if incremental_window else None
 
     max_rank_length = 0
     for query_issue in query_issues:
@@ -780,6 +819,7 @@ def run_hit_analysis_batch(
             lottery_name=lottery_name,
             query_issue=query_issue,
             dingwei_sha_pos=dingwei_sha_pos,
+            hit_windows=hit_windows,
             **analysis_kwargs
         )
 
@@ -858,6 +898,137 @@ def run_hit_analysis_batch(
             skip_count += 1
             continue
 
+    return {
+        "hit_count": hit_count,
+        "miss_count": miss_count,
+        "skip_count": skip_count,
+        "open_rank_counter": open_rank_counter,
+        "max_rank_length": max_rank_length,
+        "memo_lookups": memo.lookups - memo_lookups,
+        "memo_hits": memo.hits - memo_hits,
+    }
+
+
+def merge_issue_chunk_stats(chunk_stats: list) -> dict:
+    """按期号顺序合并各分段计数；open_rank_counter 依次累加，键的首次出现顺序与串行一致"""
+    merged = {"hit_count": 0, "miss_count": 0, "skip_count": 0, "open_rank_counter": Counter(), "max_rank_length": 0,
+              "memo_lookups": 0, "memo_hits": 0}
+    for stat in chunk_stats:
+        for key in ("hit_count", "miss_count", "skip_count", "memo_lookups", "memo_hits"):
+            merged[key] += stat[key]
+        merged["open_rank_counter"].update(stat["open_rank_counter"])
+        merged["max_rank_length"] = max(merged["max_rank_length"], stat["max_rank_length"])
+    return merged
+
+
+def _evaluate_issue_chunk_in_worker(args):
+    global print
+    print = log  # ⚠️ 子进程中同样重定向，日志才能被 collect_logs 收集
+    lottery_name, chunk, chunk_kwargs = args
+    return collect_logs(_evaluate_issue_chunk, get_worker_engine(), lottery_name, chunk, **chunk_kwargs)
+
+
+def _evaluate_issue_chunks_parallel(engine, lottery_name, query_issues, chunk_kwargs: dict, workers: int, log_callback=None) -> dict:
+    """
+    期号切成连续分段交给进程池，按分段顺序重放日志并合并计数；
+    期号索引 / 开奖缓存（use_cube 时含预测立方体与回溯玩法的命中矩阵 / hit+N 位图）由主进程加载一次放入共享内存，子进程直接 attach
+    """
+    chunk_count = min(len(query_issues), workers * ISSUE_CHUNKS_PER_WORKER)
+    bounds = [len(query_issues) * i // chunk_count for i in range(chunk_count + 1)]
+    chunks = [list(query_issues[lo:hi]) for lo, hi in zip(bounds[:-1], bounds[1:])]
+    print(f"⚙️ 期号分段并行：{len(query_issues)} 期 ➜ {len(chunks)} 段 | {min(workers, len(chunks))} 个子进程")
+
+    analysis_kwargs = chunk_kwargs["analysis_kwargs"]
+    cube_playtypes, matrix_playtypes, exact_hits = [], [], []
+    if analysis_kwargs.get("use_cube"):
+        cube_playtypes = [analysis_kwargs.get("query_playtype_name")]
+    # ✅ 直接指定 user_id 时不做回溯筛选，用不到命中矩阵
+    if analysis_kwargs.get("use_cube") and not analysis_kwargs.get("specified_user_ids"):
+        if analysis_kwargs.get("mode") == "hitcount":
+            matrix_playtypes = list(analysis_kwargs.get("hit_count_conditions") or {})
+        else:
+            matrix_playtypes = [analysis_kwargs.get("analyze_playtype_name")]
+            exact_hits = [int(r.split("+")[1]) for r in analysis_kwargs.get("hit_rank_list") or [] if isinstance(r, str) and r.startswith("hit+")][-1:]
+    chunk_stats = []
+    with share_process_caches(
+            engine, lottery_name, [pt for pt in cube_playtypes if pt],
+            matrix_playtypes=[pt for pt in matrix_playtypes if pt], exact_hits=exact_hits,
+    ) as shared, \
+            ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=init_worker, initargs=(shared.manifest,)) as pool:
+        jobs = [(lottery_name, chunk, chunk_kwargs) for chunk in chunks]
+        for stat, lines in pool.map(_evaluate_issue_chunk_in_worker, jobs):
+            replay_logs(lines)
+            if log_callback:
+                log_callback()
+            chunk_stats.append(stat)
+    return merge_issue_chunk_stats(chunk_stats)
+
+
+def run_hit_analysis_batch(
+        engine,
+        lottery_name,
+        query_issues,
+        enable_hit_check,
+        enable_track_open_rank,
+        dingwei_sha_pos,
+        check_mode,
+        analysis_kwargs: dict,
+        stop_flag_key="stop_analysis",  # ✅ 新增参数
+        log_callback=None,  # ✅ 新增参数
+        all_mode_limit: int = None,
+        strategy_relative_path=None,   # ✅ 新增
+        incremental_window: bool = True,  # ✅ 新增：回溯命中计数按滑动窗口增量更新
+        workers: int = 1,  # ✅ 新增：期号分段并行的子进程数
+):
+    """
+    分析指定多个期号的杀号/胆码/定位杀号效果，并支持命中率与推荐数字排名统计。
+
+    参数：
+    - engine: 数据库连接对象
+    - lottery_name: 彩种名，如 '福彩3D'
+    - query_issues: 要分析的期号列表
+    - enable_hit_check: 是否执行 check_hit_on_result 判断
+    - enable_track_open_rank: 是否启用开奖号码推荐排名统计
+    - dingwei_sha_pos: 定位杀号的目标位（0=百, 1=十, 2=个）
+    - analysis_kwargs: 要传给 analyze_expert_hits 的其他参数（dict）
+    - check_mode: str = "dingwei"   # 定位杀号判断模式：仅指定位置（"dingwei"）或全位判断（"all"）
+    - incremental_window: 相邻期号共享滑动回溯窗口，只增减进出窗口的期号（结果与逐期重算一致）
+    - workers: > 1 时期号按顺序切成连续分段，在子进程中并行分析后合并计数；逐期日志按分段顺序重放，
+      返回值与串行一致（并行时不响应 Streamlit 中止请求）
+
+    返回：
+    - None（仅打印分析结果）
+    """
+    global print
+    print = log  # ✅ 重定向 print 到 log，实现捕获
+    # print(f"🟢 lookback_n (batch) = {analysis_kwargs.get('lookback_n')}")
+    # ✅ 支持 query_issues = ['All']，自动提取所有期号
+    if query_issues == ["All"]:
+        query_issues = get_issue_index(engine, lottery_name).latest(all_mode_limit)
+        if all_mode_limit is not None:
+            print(f"✅ 已限制仅保留最新 {all_mode_limit} 期")
+        print(f"✅ query_issues = ['All'] 模式生效，共提取期号数量：{len(query_issues)}")
+        # print(f"📋 期号列表：{query_issues}")
+
+    chunk_kwargs = dict(
+        enable_hit_check=enable_hit_check,
+        enable_track_open_rank=enable_track_open_rank,
+        dingwei_sha_pos=dingwei_sha_pos,
+        check_mode=check_mode,
+        analysis_kwargs=analysis_kwargs,
+        stop_flag_key=stop_flag_key,
+        incremental_window=incremental_window,
+    )
+    if workers > 1 and len(query_issues) > 1:
+        stats = _evaluate_issue_chunks_parallel(engine, lottery_name, query_issues, chunk_kwargs, workers, log_callback)
+    else:
+        stats = _evaluate_issue_chunk(engine, lottery_name, query_issues, log_callback=log_callback, **chunk_kwargs)
+    hit_count = stats["hit_count"]
+    miss_count = stats["miss_count"]
+    skip_count = stats["skip_count"]
+    open_rank_counter = stats["open_rank_counter"]
+    max_rank_length = stats["max_rank_length"]
+
     # ✅ 循环结束后打印总统计
     if enable_hit_check:
         print("=" * 50)
@@ -881,6 +1052,9 @@ def run_hit_analysis_batch(
             print(f"   - 排名第 {rank} 位：{open_rank_counter[rank]} 次")
             print("=" * 30)
 
+    if stats["memo_lookups"]:
+        print(f"♻️ 入选集合复用（本次）：{stats['memo_hits']} / {stats['memo_lookups']} = {stats['memo_hits'] / stats['memo_lookups']:.2%}")
+
     if log_callback:
         log_callback()
 
@@ -895,6 +1069,295 @@ def run_hit_analysis_batch(
     }
 
 
+# ✅ 可分组评估的提取策略：(analyze_expert_hits 返回键, 参数名后缀)
+GROUPED_STRATEGIES = [
+    ("sha1", "sha1"),
+    ("sha2", "sha2"),
+    ("dan1", "dan1"),
+    ("dan2", "dan2"),
+    ("dingwei_sha", "dingwei_sha"),
+    ("dingwei_sha2", "dingwei_sha2"),
+    ("dingwei_sha3", "dingwei_sha3"),
+    ("dingwei_dan", "dingwei_dan1"),
+]
+
+
+def _variant_strategy_params(variant: dict, suffix: str):
+    """变体中某策略的 (enable, skip_if_few, resolve_tie_mode, reverse_on_tie)，缺省值与 analyze_expert_hits 一致"""
+    return (
+        variant.get(f"enable_{suffix}"),
+        variant.get(f"skip_if_few_{suffix}", True),
+        variant.get(f"resolve_tie_mode_{suffix}", "False"),
+        variant.get(f"reverse_on_tie_{suffix}", False),
+    )
+
+
+def _score_grouped_variants(engine, lottery_name, issue_results, variants, stats, check_mode="dingwei"):
+    """
+    对一段期号的分析结果按各变体提取策略数字并判断命中，结果累加进 stats（与 variants 一一对应）。
+    变体可启用 GROUPED_STRATEGIES 中任意策略，判断口径与 run_hit_analysis_batch 对同一配置的合并判断一致。
+    数字型彩种走排名矩阵 + 命中判断内核，全部变体 × 全部期号一次算完；其余彩种逐期提取、判断。
+    """
+    rank_lengths = [len(r.get("num_counter", {})) for r in issue_results]
+    no_recommendation = [r.get("rec_df") is None or r["rec_df"].empty for r in issue_results]
+    for stat in stats:
+        stat["max_rank_length"] = max([stat["max_rank_length"]] + rank_lengths)
+
+    ranking_matrix = None
+    rankings = [r.get("ranking") for r in issue_results]
+    if all(rk is not None for rk, empty in zip(rankings, no_recommendation) if not empty):
+        try:
+            ranking_matrix = RankingMatrix([None if empty else rk for rk, empty in zip(rankings, no_recommendation)])
+        except ValueError:
+            ranking_matrix = None
+
+    if ranking_matrix is not None:
+        shape = (len(variants), len(issue_results))
+        strategy_masks = {key: np.zeros(shape, dtype=np.uint16) for key, _ in GROUPED_STRATEGIES}
+        extracted = np.zeros(shape, dtype=bool)
+        for vi, variant in enumerate(variants):
+            prev_targets = [prev_target_digit(r.get("prev_open_code"), variant["dingwei_sha_pos"]) for r in issue_results]
+            prev_targets = np.array([-1 if d is None else d for d in prev_targets], dtype=np.int64)
+            for key, suffix in GROUPED_STRATEGIES:
+                enable_list, skip_flag, tie_mode, reverse_on_tie = _variant_strategy_params(variant, suffix)
+                if not enable_list:
+                    continue
+                strategy_masks[key][vi], strategy_extracted = extract_strategy_batch(
+                    ranking_matrix, enable_list, skip_flag, tie_mode, reverse_on_tie, prev_targets,
+                )
+                extracted[vi] |= strategy_extracted
+        extracted &= ~np.array(no_recommendation, dtype=bool)
+
+        positions = [v["dingwei_sha_pos"] for v in variants]
+        open_cache = get_open_code_cache(engine, lottery_name)
+        open_digits, open_found = open_cache.lookup([r["query_issue"] for r in issue_results])
+        hit, miss, skip = check_hits_batch(
+            open_digits, open_found, positions,
+            dingwei_sha=strategy_masks["dingwei_sha"] | strategy_masks["dingwei_sha2"] | strategy_masks["dingwei_sha3"],
+            dingwei_dan=strategy_masks["dingwei_dan"],
+            sha=strategy_masks["sha1"] | strategy_masks["sha2"],
+            dan_list=[strategy_masks["dan1"], strategy_masks["dan2"]],
+            extracted=extracted, check_mode=check_mode,
+        )
+
+        # ✅ 开奖数字名次整段只算一次，各变体的 open_rank_counter 由命中 / 未中期号掩码归约得到
+        rank_positions = list(range(open_digits.shape[1])) if check_mode == "all" else sorted({p for p in positions if p is not None})
+        open_ranks = build_open_rank_matrix(
+            [r["query_issue"] for r in issue_results],
+            [None if empty else rk for rk, empty in zip(rankings, no_recommendation)],
+            open_digits, rank_positions,
+        )
+
+        for vi, (variant, stat) in enumerate(zip(variants, stats)):
+            stat["hit_count"] += int(hit[vi].sum())
+            stat["miss_count"] += int(miss[vi].sum())
+            stat["skip_count"] += int(skip[vi].sum())
+            if check_mode == "all" or variant["dingwei_sha_pos"] is not None:
+                position = None if check_mode == "all" else variant["dingwei_sha_pos"]
+                stat["open_rank_counter"].update(open_ranks.counter(hit[vi] | miss[vi], position))
+        return
+
+    for variant, stat in zip(variants, stats):
+        dingwei_sha_pos = variant["dingwei_sha_pos"]
+        for result, empty in zip(issue_results, no_recommendation):
+            if empty:
+                stat["skip_count"] += 1
+                continue
+            ranking = result.get("ranking")
+            sorted_items = ranking.most_common() if ranking is not None else result["num_counter"].most_common()
+            picked = {}
+            for key, suffix in GROUPED_STRATEGIES:
+                enable_list, skip_flag, tie_mode, reverse_on_tie = _variant_strategy_params(variant, suffix)
+                picked[key] = extract_strategy(
+                    suffix, enable_list, skip_flag, sorted_items, result["num_counter"], tie_mode,
+                    result.get("prev_open_code"), dingwei_sha_pos, reverse_on_tie
+                )
+            if all(v is None for v in picked.values()):
+                print("⚠️ 没有启用任何策略，默认视为跳过")
+                stat["skip_count"] += 1
+                continue
+            combined_dingwei_sha = [d for key in ("dingwei_sha", "dingwei_sha2", "dingwei_sha3") for d in picked[key] or []]
+            if combined_dingwei_sha:
+                print(f"🔥 定位杀号: {sorted(set(combined_dingwei_sha))}")
+
+            try:
+                hit_result = check_hit_on_result(
+                    engine, lottery_name,
+                    result["query_issue"],
+                    sha_list=[picked["sha1"], picked["sha2"]],
+                    rec_df=result["rec_df"],
+                    dan_list=[picked["dan1"], picked["dan2"]],
+                    dingwei_sha=picked["dingwei_sha"],
+                    dingwei_sha2=picked["dingwei_sha2"],
+                    dingwei_sha3=picked["dingwei_sha3"],
+                    dingwei_sha_pos=dingwei_sha_pos,
+                    check_mode=check_mode,
+                    dingwei_dan=picked["dingwei_dan"],
+                )
+                track_open_rank(result, dingwei_sha_pos, stat["open_rank_counter"], check_mode=check_mode)
+                if hit_result is False:
+                    stat["miss_count"] += 1
+                else:
+                    stat["hit_count"] += 1
+            except ValueError as e:
+                if str(e) == "open_code_missing":
+                    print("⚠️ 未找到开奖号码，跳过本期统计")
+                    stat["skip_count"] += 1
+                else:
+                    raise
+
+
+def can_reach_hit_rate(stat: dict, remaining_issues: int, hit_rate_threshold: float) -> bool:
+    """
+    剩余期号全部命中时最终命中率能否达到阈值（命中率 = 命中 / (命中 + 未中)，跳过期号不计入）。
+    ⚠️ 与 summarize_result 一样先保留 4 位小数再比较，避免 0.89996 这类落库后达标的变体被误剪
+    """
+    best_hits = stat["hit_count"] + remaining_issues
+    best_total = best_hits + stat["miss_count"]
+    return best_total > 0 and round(best_hits / best_total, 4) >= hit_rate_threshold
+
+
+def can_stay_rank_reliable(stat: dict, remaining_issues: int) -> bool:
+    """剩余期号全部命中时能否满足 best_ranks 的写入条件（跳过期数不多于命中期数，同 task_results.is_rank_reliable）"""
+    return stat["skip_count"] <= stat["hit_count"] + remaining_issues
+
+
+def can_still_qualify(stat: dict, remaining_issues: int, hit_rate_threshold: float) -> bool:
+    """变体是否仍可能写入 best_tasks（命中率达标）或 best_ranks（排名统计可靠）；两者都不可能时才可剪枝"""
+    return can_reach_hit_rate(stat, remaining_issues, hit_rate_threshold) or can_stay_rank_reliable(stat, remaining_issues)
+
+
+def run_grouped_hit_analysis_batch(
+        engine,
+        lottery_name,
+        query_issues,
+        analysis_kwargs: dict,
+        variants: list,
+        check_mode="dingwei",
+        all_mode_limit: int = None,
+        prune_hit_rate: float = None,
+        prune_chunk_size: int = 20,
+):
+    """
+    一组只在策略提取参数上不同的任务共用一次回溯筛选与推荐数字排名；
+    数字型彩种再经排名矩阵内核与命中判断内核，对全部变体 × 全部期号一次性提取策略数字并判断命中。
+
+    参数：
+    - analysis_kwargs: 组内共用的 analyze_expert_hits 参数（玩法 / hit_rank_list / lookback_n / lookback_start_offset 等，不含定位杀号提取参数）
+    - variants: 每个任务的提取参数 dict：dingwei_sha_pos 以及 GROUPED_STRATEGIES 中任意策略的
+      enable_* / skip_if_few_* / resolve_tie_mode_* / reverse_on_tie_*（如 enable_dingwei_sha / skip_if_few_sha1）
+    - prune_hit_rate: 剪枝阈值（可选）。设置后每 prune_chunk_size 期结算一次，剩余期号全部命中也既达不到该命中率、
+      又满足不了 best_ranks 写入条件（跳过 ≤ 命中）的变体提前终止，全部变体终止后不再分析剩余期号；
+      未剪枝变体的结果与不剪枝时完全一致，被剪枝的变体不剪枝时也不会写入 best_tasks / best_ranks。
+      ⚠️ 两个条件是「或」的关系，best_ranks 条件通常到跳过期数超过命中 + 剩余期数时才不满足，
+      因此一般只有跳过很多的变体在后段被剪枝；该界限可以取到，不评估剩余期号无法收紧
+
+    返回：
+    - 与 variants 一一对应的结果列表，每项与单独调用 run_hit_analysis_batch（enable_hit_check / enable_track_open_rank 均开启）的返回值一致；
+      开启剪枝时每项额外带 pruned 标记，被剪枝的变体只含终止前的部分统计
+    """
+    global print
+    print = log  # ✅ 重定向 print 到 log，实现捕获
+    if query_issues == ["All"]:
+        query_issues = get_issue_index(engine, lottery_name).latest(all_mode_limit)
+        print(f"✅ query_issues = ['All'] 模式生效，共提取期号数量：{len(query_issues)}")
+
+    stats = [dict(hit_count=0, miss_count=0, skip_count=0, open_rank_counter=Counter(), max_rank_length=0) for _ in variants]
+    hit_windows = {}
+    active = list(range(len(variants)))
+
+    # ✅ 不剪枝时整组期号作为一段处理；剪枝时分段处理，每段结算后淘汰不可能达标的变体
+    chunk_size = len(query_issues) if prune_hit_rate is None else max(int(prune_chunk_size), 1)
+    for chunk_start in range(0, len(query_issues), max(chunk_size, 1)):
+        chunk_issues = query_issues[chunk_start:chunk_start + chunk_size]
+
+        # 第一阶段：逐期回溯筛选 + 推荐排名，整组只算一次（不启用任何提取策略）
+        issue_results = []
+        for query_issue in chunk_issues:
+            print("=" * 16)
+            print()
+            result = analyze_expert_hits(
+                engine=engine,
+                lottery_name=lottery_name,
+                query_issue=query_issue,
+                dingwei_sha_pos=variants[0]["dingwei_sha_pos"],
+                hit_windows=hit_windows,
+                **analysis_kwargs
+            )
+            issue_results.append(result)
+
+        # 第二阶段：仍在评估的变体对本段期号提取并判断命中
+        _score_grouped_variants(
+            engine, lottery_name, issue_results,
+            [variants[vi] for vi in active], [stats[vi] for vi in active],
+            check_mode=check_mode,
+        )
+
+        if prune_hit_rate is not None:
+            remaining_issues = len(query_issues) - chunk_start - len(chunk_issues)
+            for vi in [vi for vi in active if not can_still_qualify(stats[vi], remaining_issues, prune_hit_rate)]:
+                stats[vi]["pruned"] = True
+                active.remove(vi)
+                print(f"✂️ 变体 {vi + 1}/{len(variants)} 已无法达到命中率 {prune_hit_rate} 且跳过期数过多 ➞ 提前终止（命中 {stats[vi]['hit_count']} | 未中 {stats[vi]['miss_count']} | 跳过 {stats[vi]['skip_count']} | 剩余 {remaining_issues} 期）")
+            if not active:
+                print(f"✂️ 全部变体均已剪枝 ➞ 跳过剩余 {remaining_issues} 期")
+                break
+
+    if prune_hit_rate is not None:
+        # ✅ 剪枝实际节省的 变体 × 期号 数，便于评估剪枝效果
+        saved = sum(len(query_issues) - stat["hit_count"] - stat["miss_count"] - stat["skip_count"] for stat in stats if stat.get("pruned"))
+        print(f"✂️ 剪枝 {sum(1 for stat in stats if stat.get('pruned'))}/{len(variants)} 个变体，节省 {saved}/{len(variants) * len(query_issues)} 变体期次")
+    for vi, (variant, stat) in enumerate(zip(variants, stats)):
+        if prune_hit_rate is not None:
+            stat.setdefault("pruned", False)
+        print(f"📈 变体 {vi + 1}/{len(variants)} ➞ enable={variant.get('enable_dingwei_sha')} | 命中 {stat['hit_count']} | 未中 {stat['miss_count']} | 跳过 {stat['skip_count']}")
+    return [dict(stat, total_issues=stat["hit_count"] + stat["miss_count"]) for stat in stats]
+
+
+def run_multi_strategy_batch(
+        engine,
+        lottery_name,
+        query_issues,
+        analysis_kwargs: dict,
+        strategies: dict,
+        dingwei_sha_pos: int = None,
+        check_mode="dingwei",
+        all_mode_limit: int = None,
+        prune_hit_rate: float = None,
+):
+    """
+    同一玩法、同一回溯筛选下对比多套杀号 / 胆码策略：一次回测遍历，全部策略共用推荐数字排名，分别统计命中。
+    backtest.py 的每个任务组即经由此处回测（策略名为任务 id）。
+
+    参数：
+    - analysis_kwargs: 共用的 analyze_expert_hits 参数（不含任何 enable_* 等策略参数）
+    - strategies: {策略名: 策略配置}，配置为 analyze_expert_hits 的策略参数（enable_sha1 / skip_if_few_dan1 / ...），
+      可单独指定 dingwei_sha_pos，缺省使用参数 dingwei_sha_pos
+    - prune_hit_rate: 剪枝阈值（可选），同 run_grouped_hit_analysis_batch
+    - 其余参数同 run_hit_analysis_batch
+
+    返回：
+    - {策略名: 结果}，每项与该配置单独调用 run_hit_analysis_batch（enable_hit_check / enable_track_open_rank 均开启）的返回值一致；
+      开启剪枝时每项额外带 pruned 标记
+    """
+    global print
+    print = log  # ✅ 重定向 print 到 log，实现捕获
+    names = list(strategies)
+    variants = [dict(strategies[name], dingwei_sha_pos=strategies[name].get("dingwei_sha_pos", dingwei_sha_pos)) for name in names]
+    results = run_grouped_hit_analysis_batch(
+        engine, lottery_name, query_issues, analysis_kwargs, variants,
+        check_mode=check_mode, all_mode_limit=all_mode_limit, prune_hit_rate=prune_hit_rate,
+    )
+
+    print("=" * 50)
+    print(f"📊 多策略对比（共 {len(names)} 套）：")
+    for name, result in sorted(zip(names, results), key=lambda item: -(item[1]["hit_count"] / item[1]["total_issues"] if item[1]["total_issues"] else 0)):
+        rate = result["hit_count"] / result["total_issues"] if result["total_issues"] else 0
+        pruned = "（已剪枝）" if result.get("pruned") else ""
+        print(f"   - {name}：命中 {result['hit_count']} | 未中 {result['miss_count']} | 跳过 {result['skip_count']} | 命中率 {rate:.4f}{pruned}")
+    return dict(zip(names, results))
+
+
 def load_user_ids_from_file(filename="user_id.txt"):
     """
     尝试从脚本目录下加载 user_id.txt 文件，每行一个 user_id。
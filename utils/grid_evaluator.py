@@ -0,0 +1,303 @@
+# utils/grid_evaluator.py
+# 回溯网格评估器：同一玩法下全部 lookback_n × lookback_offset × hit_rank_list × 定位杀号排名 的任务在一次期号遍历中同时回测，
+# 回溯命中统计全部来自命中矩阵前缀和，结果与逐任务调用 run_hit_analysis_batch（All 模式、dingwei 判断）逐项一致
+from collections import Counter
+import numpy as np
+from utils.issue_index import get_issue_index
+from utils.prediction_cube import is_cube_supported, get_prediction_cube
+from utils.hit_matrix import get_hit_matrix
+from utils.exact_hit_matrix import get_exact_hit_matrix
+from utils.open_code_cache import get_open_code_cache
+from utils.ranking_memo import RankingMemo
+
+
+def exact_hit_target(hit_rank_list):
+    """hit+N 交集模式的 N（多个 hit+N 时取最后一个，与 analyze_expert_hits 一致），非该模式返回 None"""
+    exact_hit = None
+    for r in hit_rank_list:
+        if isinstance(r, str) and r.startswith("hit+"):
+            exact_hit = int(r.split("+")[1])
+    return exact_hit
+
+
+def is_grid_hit_rank_list(hit_rank_list) -> bool:
+    """网格评估支持的命中排名列表：整数排名、["ALL"]，以及 hit+N 交集模式（hit+N 位图前缀和）"""
+    if hit_rank_list == ["ALL"]:
+        return True
+    if not isinstance(hit_rank_list, list):
+        return False
+    if any(isinstance(r, str) and r.startswith("hit+") for r in hit_rank_list):
+        try:
+            exact_hit_target(hit_rank_list)
+        except ValueError:
+            return False
+        return all(isinstance(r, int) or (isinstance(r, str) and r.startswith("hit+")) for r in hit_rank_list)
+    return all(isinstance(r, int) for r in hit_rank_list)
+
+
+def hit_value_table(window_hits: np.ndarray, window_participants: np.ndarray):
+    """
+    各 lookback_n（行）参与用户命中次数的去重降序值，一次排序得到全部行：
+    返回 (values, n_distinct)，values 为 行 × 最多去重个数 的数组（不足处为 -1），n_distinct 为各行去重个数
+    """
+    masked = np.where(window_participants, window_hits, -1)
+    desc = -np.sort(-masked, axis=1)
+    is_new = desc >= 0
+    is_new[:, 1:] &= desc[:, 1:] != desc[:, :-1]
+    n_distinct = is_new.sum(axis=1)
+    values = np.full((len(desc), max(int(n_distinct.max(initial=0)), 1)), -1, dtype=np.int64)
+    rows, cols = np.nonzero(is_new)
+    values[rows, np.cumsum(is_new, axis=1)[rows, cols] - 1] = desc[rows, cols]
+    return values, n_distinct
+
+
+def select_eligible_users(hit_rank_list, window_hits: np.ndarray, window_participants: np.ndarray, hit_values) -> np.ndarray:
+    """
+    按 hit_rank_list 在各 lookback_n 的回溯窗口内筛选用户，返回 行 × 用户 掩码。
+    hit_values 为 hit_value_table 的返回值，规则与 analyze_expert_hits 的命中排名模式一致
+    """
+    if hit_rank_list == ["ALL"]:
+        return window_participants.copy()
+    values, n_distinct = hit_values
+    row_idx = np.arange(len(values))
+    selected = []
+    for r in hit_rank_list:
+        if not isinstance(r, int):
+            continue
+        # 名次 r 取第 r 大（负数从最小倒数，0 同 hit_values[0]），超出去重个数的行不选
+        col = np.full(len(values), r - 1 if r > 0 else 0) if r >= 0 else n_distinct + r
+        picked = np.full(len(values), -1, dtype=np.int64)
+        ok = abs(r) <= n_distinct if r else n_distinct > 0
+        picked[ok] = values[row_idx[ok], col[ok]]
+        selected.append(picked)
+    if not selected:
+        return np.zeros(window_participants.shape, dtype=bool)
+    selected = np.stack(selected, axis=1)
+    return window_participants & (window_hits[:, :, None] == selected[:, None, :]).any(axis=2)
+
+
+def rank_sets(set_counts: np.ndarray, set_first: np.ndarray):
+    """
+    多个入选集合的推荐数字排名（逐行即逐集合，与 DigitRanking 同口径：次数降序，同次数按首次出现先后）。
+    set_counts / set_first 为 集合 × 数字 的出现次数与首次出现位置，返回
+    (sizes, digits, counts, tie_start, tie_end)：各集合排名长度，以及按名次排列的数字 / 次数 / 所在并列组区间（超出排名长度的列无意义）
+    """
+    order = np.lexsort((set_first, -set_counts), axis=1)
+    counts = np.take_along_axis(set_counts, order, axis=1)
+    sizes = (set_counts > 0).sum(axis=1)
+    ranked = np.arange(set_counts.shape[1]) < sizes[:, None]
+    # 次数降序且并列组连续：组起点 = 次数更大的名次个数，组长 = 次数相同的名次个数
+    greater = (counts[:, None, :] > counts[:, :, None]) & ranked[:, None, :]
+    equal = (counts[:, None, :] == counts[:, :, None]) & ranked[:, None, :]
+    tie_start = greater.sum(axis=2)
+    tie_end = tie_start + equal.sum(axis=2)
+    return sizes, order, counts, tie_start, tie_end
+
+
+def pick_ranked_numbers(ranked_sets, rank: int, skip_if_few: bool = True, resolve_tie_mode: str = "False", reverse_on_tie: bool = False) -> np.ndarray:
+    """
+    按单个整数排名从每个集合的排名中提取一个数字（无日志版的 extract_strategy 整数排名分支，逐集合同时计算），
+    ranked_sets 为 rank_sets 的返回值；无法提取的集合为 -1
+    """
+    sizes, digits, _, tie_start, tie_end = ranked_sets
+    rows = np.arange(len(sizes))
+    idx = rank - 1 if rank > 0 else rank
+    ok = abs(idx) < sizes
+    if skip_if_few:
+        ok &= sizes >= 5
+    pos = np.clip(idx if idx >= 0 else sizes + idx, 0, digits.shape[1] - 1)
+    start, end = tie_start[rows, pos], tie_end[rows, pos]
+    tied = end - start > 1
+    picked = digits[rows, pos].astype(np.int64)
+
+    if resolve_tie_mode == "Skip":
+        ok &= ~tied
+    elif resolve_tie_mode == "Next":
+        # 取并列组之后第一个名次；负数名次的并列组已到末位时，按原逐项扫描的顺序回到第 1 名
+        after = np.minimum(end, digits.shape[1] - 1)
+        fallback = (end < sizes) if idx >= 0 else (end < sizes) | (start > 0)
+        next_digit = np.where(end < sizes, digits[rows, after], digits[:, 0])
+        ok &= ~tied | fallback
+        picked = np.where(tied, next_digit, picked)
+    elif reverse_on_tie:
+        # 正数下标 idx 镜像为倒数第 idx + 1 名（即下标 -(idx + 1)，越界时无法提取），负数下标 idx 镜像为下标 -idx - 1
+        mirror = sizes - idx - 1 if idx >= 0 else np.full(len(sizes), -idx - 1)
+        ok &= ~tied | ((mirror > 0) if idx >= 0 else (mirror < sizes))
+        picked = np.where(tied, digits[rows, np.clip(mirror, 0, digits.shape[1] - 1)], picked)
+    return np.where(ok, picked, -1)
+
+
+def _map_users(query_user_ids: np.ndarray, analyze_user_ids: np.ndarray) -> np.ndarray:
+    """查询玩法的稠密 user 下标 → 回溯玩法的稠密 user 下标（回溯玩法中不存在记为 -1）"""
+    if not len(analyze_user_ids):
+        return np.full(len(query_user_ids), -1, dtype=np.int64)
+    pos = np.minimum(np.searchsorted(analyze_user_ids, query_user_ids), len(analyze_user_ids) - 1)
+    return np.where(analyze_user_ids[pos] == query_user_ids, pos, -1).astype(np.int64)
+
+
+def evaluate_lookback_grid(
+        engine,
+        lottery_name: str,
+        query_playtype_name: str,
+        analyze_playtype_name: str,
+        position: int,
+        lookback_ns: list,
+        hit_rank_combinations: list,
+        ranks: list,
+        lookback_offsets: list = (0,),
+        skip_if_few: bool = True,
+        resolve_tie_mode: str = "False",
+        reverse_on_tie: bool = True,
+        query_issues: list = None,
+        ranking_memo: RankingMemo = None,
+) -> list:
+    """
+    一次遍历全部查询期号，同时回测整张任务网格。
+
+    - 每个查询期号、每个 offset 只做一次前缀和相减，得到所有 lookback_n 的 用户命中次数 / 参与 矩阵，
+      一次按行排序得到所有 lookback_n 的去重命中值，入选掩码按 hit_rank_list 对全部 lookback_n 整体计算；
+      hit+N 组合按 N 各做一次位图前缀和相减，得到所有 lookback_n 的交集用户
+    - 同一期入选推荐行相同的 (offset, lookback_n, hit_rank_list) 只统计一次推荐数字排行榜与各名次提取结果，全部排名任务共用；
+      传入 ranking_memo 可在调用方读取复用统计（查询次数 = 有入选用户的组合数，复用次数 = 其中被去重掉的组合数）
+    - 命中 / 未中 / 跳过计数与开奖数字名次计数逐期按数组累加，内存只与任务网格大小有关，不随查询期数增长
+    - query_issues 为空时等价于 run_hit_analysis_batch 的 ["All"] 模式
+
+    返回任务结果列表，每项包含 lookback_n / lookback_offset / hit_rank_list / rank 以及
+    hit_count / miss_count / skip_count / open_rank_counter / max_rank_length（与 run_hit_analysis_batch 返回值同口径）
+    """
+    if not is_cube_supported(lottery_name):
+        raise ValueError(f"彩种 {lottery_name} 不支持网格评估")
+    hit_rank_combinations = [hrl for hrl in hit_rank_combinations if is_grid_hit_rank_list(hrl)]
+
+    issue_index = get_issue_index(engine, lottery_name)
+    hit_matrix = get_hit_matrix(engine, lottery_name, analyze_playtype_name)
+    analyze_cube = hit_matrix.cube
+    query_cube = get_prediction_cube(engine, lottery_name, query_playtype_name)
+    open_cache = get_open_code_cache(engine, lottery_name)
+    user_map = _map_users(query_cube.user_ids, analyze_cube.user_ids)
+    exact_hits = [exact_hit_target(hrl) for hrl in hit_rank_combinations]
+    exact_matrix = get_exact_hit_matrix(engine, lottery_name, analyze_playtype_name) if any(n is not None for n in exact_hits) else None
+    query_issues = issue_index.latest() if query_issues is None else list(query_issues)
+    if ranking_memo is None:
+        ranking_memo = RankingMemo()
+
+    lookback_ns = [None if n is None else int(n) for n in lookback_ns]
+    # ⚠️ lookback_n 为 0 / None 时回溯全部历史（同 IssueIndex.lookback_window），窗口起点取 0
+    ns = np.asarray([n or 0 for n in lookback_ns], dtype=np.int64)
+    shape = (len(lookback_offsets), len(ns), len(hit_rank_combinations), len(ranks))
+    hit_count = np.zeros(shape, dtype=np.int64)
+    miss_count = np.zeros(shape, dtype=np.int64)
+    skip_count = np.zeros(shape, dtype=np.int64)
+    # ✅ 开奖数字名次逐期累加到 (任务, 名次) 的计数与首次出现期序，排名长度取逐期最大值：
+    # 内存只与任务网格大小有关，不随查询期数增长
+    # 排名长度不超过推荐数字的取值个数
+    n_digits = int(query_cube.parsed.values.max()) + 1 if len(query_cube.parsed.values) else 1
+    rank_counts = np.zeros(shape + (n_digits + 1,), dtype=np.int64)
+    rank_first = np.full(shape + (n_digits + 1,), len(query_issues), dtype=np.int64)
+    max_rank_length = np.zeros(shape[:3], dtype=np.int64)
+
+    for qi, query_issue in enumerate(query_issues):
+        p = issue_index.count_before(query_issue)
+        rows = query_cube.row_indices(query_issue)
+        if not len(rows):
+            skip_count += 1
+            continue
+        row_users = user_map[query_cube.row_user[rows]]
+        has_user = row_users >= 0
+        row_values = query_cube.digit_values(rows)
+        value_rows = np.repeat(np.arange(len(rows)), query_cube.parsed.lengths[rows])
+        row_counts = np.zeros((len(rows), n_digits), dtype=np.int64)
+        np.add.at(row_counts, (value_rows, row_values), 1)
+        row_first = np.full((len(rows), n_digits), len(row_values), dtype=np.int64)
+        np.minimum.at(row_first, (value_rows, row_values), np.arange(len(row_values)))
+
+        open_code = open_cache.get_open_code(query_issue)
+        open_digits = open_cache.get_digits(query_issue)
+        target_digit = None
+        if open_digits is not None and len(open_digits) > position:
+            target_digit = open_digits[position]
+
+        # ✅ 各 (offset, lookback_n, hit_rank_list) 的入选掩码：同一 offset 下全部 lookback_n 一次前缀和相减、一次排序取去重命中值
+        has_window = np.zeros(len(lookback_offsets), dtype=bool)
+        any_eligible = np.zeros(shape[:3], dtype=bool)
+        row_sel = np.zeros(shape[:3] + (len(rows),), dtype=bool)
+        for oi, offset in enumerate(lookback_offsets):
+            stop = p - offset
+            if stop <= 0:
+                continue
+            has_window[oi] = True
+            starts = np.where(ns > 0, np.maximum(stop - ns, 0), 0)
+            window_hits = hit_matrix.cum_hits[stop] - hit_matrix.cum_hits[starts]
+            window_participants = (hit_matrix.cum_participation[stop] - hit_matrix.cum_participation[starts]) > 0
+            exact_windows = {n: exact_matrix.window_users(n, starts, stop) for n in set(exact_hits) if n is not None}
+            hit_values = hit_value_table(window_hits, window_participants)
+            for hi, hit_rank_list in enumerate(hit_rank_combinations):
+                if exact_hits[hi] is not None:
+                    eligible = exact_windows[exact_hits[hi]]
+                else:
+                    eligible = select_eligible_users(hit_rank_list, window_hits, window_participants, hit_values)
+                any_eligible[oi, :, hi] = eligible.any(axis=1)
+                row_sel[oi, :, hi][:, has_user] = eligible[:, row_users[has_user]]
+        skip_count[~has_window] += 1
+        skip_count[has_window] += ~any_eligible[has_window][..., None]
+        if not any_eligible.any():
+            continue
+
+        # ✅ 本期入选推荐行相同的组合（跨 offset / lookback_n / hit_rank_list）只统计一次排行榜与各名次提取结果
+        combos = np.flatnonzero(any_eligible)
+        sel_keys, inverse = np.unique(np.packbits(row_sel.reshape(-1, len(rows))[combos], axis=1), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        ranking_memo.record_reuse(len(combos), len(combos) - len(sel_keys))
+        # 逐行数字计数 / 首次出现位置 → 各入选集合的计数与首次出现位置（集合内最早的入选行），一次排出全部集合的名次
+        sel_rows = np.unpackbits(sel_keys, axis=1, count=len(rows)).astype(bool)
+        row_has = sel_rows[:, :, None] & (row_counts > 0)[None]
+        set_counts = sel_rows.astype(np.int64) @ row_counts
+        set_first = np.where(row_has.any(axis=1), row_first[row_has.argmax(axis=1), np.arange(n_digits)], len(row_values))
+        ranked_sets = rank_sets(set_counts, set_first)
+        set_sizes = ranked_sets[0]
+        set_picks = np.stack([pick_ranked_numbers(ranked_sets, rank, skip_if_few, resolve_tie_mode, reverse_on_tie) for rank in ranks], axis=1)
+        set_open_ranks = np.zeros(len(sel_keys), dtype=np.int64)
+        if target_digit is not None and 0 <= target_digit < n_digits:
+            set_open_ranks = np.where(set_counts[:, target_digit] > 0, (ranked_sets[1] == target_digit).argmax(axis=1) + 1, 0)
+
+        combo_idx = np.unravel_index(combos, shape[:3])
+        np.maximum.at(max_rank_length, combo_idx, set_sizes[inverse])
+        # 入选集合在本期没有推荐行、或本期未开奖：全部排名跳过
+        valid = row_sel.reshape(-1, len(rows))[combos].any(axis=1) & (open_code is not None)
+        skip_count[tuple(i[~valid] for i in combo_idx)] += 1
+        combo_idx = tuple(i[valid] for i in combo_idx)
+        picks = set_picks[inverse[valid]]
+        open_ranks = set_open_ranks[inverse[valid]]
+
+        evaluated = picks >= 0
+        missed = evaluated & (picks == target_digit) if target_digit is not None else np.zeros_like(evaluated)
+        skip_count[combo_idx] += ~evaluated
+        miss_count[combo_idx] += missed
+        hit_count[combo_idx] += evaluated & ~missed
+
+        # 开奖数字名次计入提取成功的排名任务（名次 0 即未出现在排行榜中，不计）
+        counted = evaluated & (open_ranks > 0)[:, None]
+        combo_rows, rank_cols = np.nonzero(counted)
+        task_idx = tuple(i[combo_rows] for i in combo_idx) + (rank_cols, open_ranks[combo_rows])
+        rank_counts[task_idx] += 1
+        np.minimum.at(rank_first, task_idx, qi)
+
+    results = []
+    for oi, offset in enumerate(lookback_offsets):
+        for ni, lookback_n in enumerate(lookback_ns):
+            for hi, hit_rank_list in enumerate(hit_rank_combinations):
+                for ri, rank in enumerate(ranks):
+                    seen = np.flatnonzero(rank_counts[oi, ni, hi, ri])
+                    seen = seen[np.argsort(rank_first[oi, ni, hi, ri, seen], kind="stable")]
+                    results.append({
+                        "lookback_n": lookback_n,
+                        "lookback_offset": offset,
+                        "hit_rank_list": hit_rank_list,
+                        "rank": rank,
+                        "hit_count": int(hit_count[oi, ni, hi, ri]),
+                        "miss_count": int(miss_count[oi, ni, hi, ri]),
+                        "skip_count": int(skip_count[oi, ni, hi, ri]),
+                        "open_rank_counter": Counter(dict(zip(seen.tolist(), rank_counts[oi, ni, hi, ri, seen].tolist()))),
+                        "max_rank_length": int(max_rank_length[oi, ni, hi]),
+                    })
+    return results
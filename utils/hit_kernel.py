@@ -0,0 +1,109 @@
+# utils/hit_kernel.py
+# 命中判断向量化内核：任务 × 期号 的提取结果位掩码（定位杀 / 定位胆 / 杀号 / 胆码）与开奖数字矩阵一次性比对，
+# 口径与 expert_hit_analysis.check_hit_on_result 逐任务逐期判断完全一致，支持 check_mode="dingwei" / "all"
+import numpy as np
+
+MASK_BITS = 16
+
+
+def _as_task_matrix(masks, shape) -> np.ndarray:
+    """单任务 (I,) 或 任务 × 期号 (T, I) 的位掩码统一广播为 (T, I) 的 int64"""
+    if masks is None:
+        return np.zeros(shape, dtype=np.int64)
+    return np.broadcast_to(np.asarray(masks).astype(np.int64), shape)
+
+
+def open_digit_masks(open_digits: np.ndarray) -> np.ndarray:
+    """开奖数字矩阵（位数不足处为 -1）→ 每期开奖数字集合的位掩码"""
+    open_digits = np.asarray(open_digits, dtype=np.int64)
+    masks = np.zeros(len(open_digits), dtype=np.int64)
+    for col in range(open_digits.shape[1]):
+        d = open_digits[:, col]
+        valid = (d >= 0) & (d < MASK_BITS)
+        masks[valid] |= 1 << d[valid]
+    return masks
+
+
+def check_hits_batch(
+        open_digits: np.ndarray,
+        open_found: np.ndarray,
+        positions=None,
+        dingwei_sha=None,
+        dingwei_dan=None,
+        sha=None,
+        dan_list=None,
+        extracted=None,
+        check_mode: str = "dingwei",
+):
+    """
+    对 T 个任务 × I 个期号一次性判断命中。
+
+    参数：
+    - open_digits / open_found：各期开奖数字矩阵（I × L，位数不足处为 -1）与是否已开奖，可直接取 OpenCodeCache.lookup 的结果
+    - positions：各任务的定位位（T,），负数与 Python 下标一致从末位倒数；None 表示未启用定位（dingwei 模式下直接视为命中）
+    - dingwei_sha / dingwei_dan / sha：各任务各期的提取数字位掩码（T × I，单任务可传 (I,)），0 表示该项未启用
+    - dan_list：胆码位掩码列表，每项 T × I，各项需分别命中
+    - extracted：各任务各期是否有提取结果（False 计为跳过，对应 extract_strategy 返回 None），为空表示全部有结果
+
+    返回 (hit, miss, skip)：三个 T × I 布尔矩阵，每个 (任务, 期号) 恰有一个为 True
+    """
+    open_digits = np.asarray(open_digits, dtype=np.int64)
+    open_found = np.asarray(open_found, dtype=bool)
+    n_issues = len(open_found)
+    if positions is None:
+        positions = [0]
+    positions = list(positions)
+    n_tasks = len(positions)
+    position_unset = np.array([p is None for p in positions], dtype=bool)
+    positions = np.array([0 if p is None else p for p in positions], dtype=np.int64)
+    shape = (n_tasks, n_issues)
+
+    dingwei_sha = _as_task_matrix(dingwei_sha, shape)
+    dingwei_dan = _as_task_matrix(dingwei_dan, shape)
+    sha = _as_task_matrix(sha, shape)
+    if extracted is None:
+        extracted = np.ones(shape, dtype=bool)
+    extracted = np.broadcast_to(np.asarray(extracted, dtype=bool), shape)
+
+    # ✅ dingwei 模式未启用定位：不读取开奖号码，直接视为命中
+    no_position = position_unset[:, None] if check_mode == "dingwei" else np.zeros((n_tasks, 1), dtype=bool)
+    evaluated = extracted & (open_found[None, :] | no_position)
+    skip = ~evaluated
+
+    open_set = open_digit_masks(open_digits)[None, :]
+    fail = np.zeros(shape, dtype=bool)
+
+    # 杀号：任一杀号数字出现在开奖号码中即失败（多组杀号等价于取并集）
+    fail |= (sha & open_set) != 0
+    # 胆码：每组胆码至少命中一个开奖数字
+    for dan in dan_list or []:
+        dan = _as_task_matrix(dan, shape)
+        fail |= (dan != 0) & ((dan & open_set) == 0)
+
+    if check_mode == "all":
+        # 全位模式：任一开奖数字在定位杀号中即失败；定位定胆要求全部开奖数字都在定胆列表中
+        fail |= (dingwei_sha & open_set) != 0
+        outside_dan = np.zeros(shape, dtype=bool)
+        for col in range(open_digits.shape[1]):
+            d = open_digits[:, col][None, :]
+            bit = np.where((d >= 0) & (d < MASK_BITS), 1 << np.clip(d, 0, MASK_BITS - 1), 0)
+            outside_dan |= (d >= 0) & ((dingwei_dan & bit) == 0)
+        fail |= (dingwei_dan != 0) & outside_dan
+    else:
+        # 定位模式：只看各任务定位位上的开奖数字，位数不足则不判断
+        lengths = (open_digits >= 0).sum(axis=1)[None, :]
+        pos = np.where(positions[:, None] >= 0, positions[:, None], lengths + positions[:, None])
+        has_target = (pos >= 0) & (pos < lengths)
+        if open_digits.shape[1]:
+            target = open_digits[np.arange(n_issues)[None, :], np.where(has_target, pos, 0)]
+        else:
+            target = np.full(shape, -1, dtype=np.int64)
+        has_target &= target >= 0
+        target_bit = np.where(has_target & (target < MASK_BITS), 1 << np.clip(target, 0, MASK_BITS - 1), 0)
+        fail |= has_target & ((dingwei_sha & target_bit) != 0)
+        fail |= has_target & (dingwei_dan != 0) & ((dingwei_dan & target_bit) == 0)
+
+    fail &= ~no_position
+    hit = evaluated & ~fail
+    miss = evaluated & fail
+    return hit, miss, skip
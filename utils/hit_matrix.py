@@ -0,0 +1,82 @@
+# utils/hit_matrix.py
+# 命中矩阵：基于预测立方体预先计算 期号 × 用户 的命中次数与参与矩阵，并沿期号轴做前缀和，任意回溯窗口的命中统计只需两行相减
+import numpy as np
+from utils.hit_rule import match_hit, match_hit_batch
+from utils.digit_parser import parse_digit_column
+from utils.prediction_cube import get_prediction_cube
+from utils.open_code_cache import get_open_code_cache
+
+_hit_matrix_cache = {}
+
+
+class HitMatrix:
+    """
+    单玩法命中矩阵。
+
+    - hits：期号 × 用户 的命中行数（同一用户同期多条推荐时逐条累计，与逐行 match_hit 计数一致）
+    - participation：期号 × 用户 是否有推荐
+    - cum_hits / cum_participation：沿期号轴的前缀和，第 0 行为全 0
+    """
+
+    def __init__(self, cube, open_codes: list, open_version: int = 0):
+        self.cube = cube
+        self.open_version = open_version
+        n_issues, n_users = cube.masks.shape
+        self.has_open = np.array([code is not None for code in open_codes], dtype=bool)
+
+        row_hit = self._row_hits(cube, open_codes)
+
+        self.hits = np.zeros((n_issues, n_users), dtype=np.uint8)
+        np.add.at(self.hits, (cube.row_issue[row_hit], cube.row_user[row_hit]), 1)
+        self.participation = cube.present
+
+        self.cum_hits = np.zeros((n_issues + 1, n_users), dtype=np.int32)
+        np.cumsum(self.hits, axis=0, out=self.cum_hits[1:])
+        self.cum_participation = np.zeros((n_issues + 1, n_users), dtype=np.int32)
+        np.cumsum(self.participation, axis=0, out=self.cum_participation[1:])
+
+    def _row_hits(self, cube, open_codes: list) -> np.ndarray:
+        """逐条推荐是否命中：单字符数字记录走 match_hit_batch 一次算完，其余记录（如 "05"、"10"）逐条 match_hit"""
+        row_hit = np.zeros(len(cube.row_issue), dtype=bool)
+        row_open = self.has_open[cube.row_issue]
+        open_parsed = parse_digit_column(open_codes)
+        batch_rows = row_open & cube.parsed.canonical & open_parsed.canonical[cube.row_issue]
+        try:
+            row_hit[batch_rows] = match_hit_batch(
+                cube.playtype_name, cube.row_mask[batch_rows], open_parsed.digits[cube.row_issue[batch_rows]]
+            )
+        except ValueError:
+            batch_rows = np.zeros(len(cube.row_issue), dtype=bool)
+
+        for r in np.flatnonzero(row_open & ~batch_rows):
+            row_hit[r] = match_hit(cube.playtype_name, cube.row_numbers[r], open_codes[cube.row_issue[r]], None)
+        return row_hit
+
+    def window_counts(self, start: int, stop: int):
+        """
+        返回期号下标区间 [start, stop) 内每个用户的命中次数，以及该区间内有过推荐的用户掩码
+        """
+        hit_counts = self.cum_hits[stop] - self.cum_hits[start]
+        participants = (self.cum_participation[stop] - self.cum_participation[start]) > 0
+        return hit_counts, participants
+
+
+def get_hit_matrix(engine, lottery_name: str, playtype_name: str) -> HitMatrix:
+    """获取 (彩种, 玩法) 的命中矩阵，进程内缓存；开奖缓存刷新后自动重建"""
+    key = (lottery_name, playtype_name)
+    open_cache = get_open_code_cache(engine, lottery_name)
+    cached = _hit_matrix_cache.get(key)
+    if cached is None or cached.open_version != open_cache.version:
+        cube = get_prediction_cube(engine, lottery_name, playtype_name)
+        open_codes = [open_cache.get_open_code(issue) for issue in cube.issue_names]
+        _hit_matrix_cache[key] = HitMatrix(cube, open_codes, open_version=open_cache.version)
+    return _hit_matrix_cache[key]
+
+
+def set_hit_matrix(hit_matrix: HitMatrix):
+    """直接装入已构建的命中矩阵（如子进程 attach 的共享内存矩阵），开奖版本沿用 hit_matrix.open_version"""
+    _hit_matrix_cache[(hit_matrix.cube.lottery_name, hit_matrix.cube.playtype_name)] = hit_matrix
+
+
+def clear_hit_matrix_cache():
+    _hit_matrix_cache.clear()
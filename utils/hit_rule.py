@@ -1,121 +1,232 @@
 # utils/hit_rule.py
 # 各彩票类型下的各个玩法的命中规则定义
 import re
+import numpy as np
+from utils.digit_parser import popcount16, parse_digit_column
 
-def match_hit(playtype: str, numbers: str, open_code: str, blue_code: str = "") -> bool:
-    """
-    命中判断（支持 福彩3D / 排列3 / 排列5 / 双色球 / 大乐透 / 快乐8）
+# ✅ 双色球专属玩法（独立于大乐透）：玩法 → (比较对象, 规则类型, 参数)
+SSQ_RULES = {
+    "红球独胆": ("red", "at_least", 1),
+    "红球双胆": ("red", "at_least", 2),
+    "红球三胆": ("red", "at_least", 3),
+    "红球12码": ("red", "contains_all", None),  # 必须包含全部6个红球
+    "红球20码": ("red", "contains_all", None),
+    "红球25码": ("red", "contains_all", None),
+    "红球杀三": ("red", "kill", None),
+    "红球杀六": ("red", "kill", None),
+    "龙头两码": ("red", "at_least", 2),
+    "凤尾两码": ("red", "at_least", 2),
+    "蓝球定三": ("blue", "at_least", 1),
+    "蓝球定五": ("blue", "at_least", 1),
+    "蓝球杀五": ("blue", "kill", None),
+}
+
+# ✅ 快乐8玩法
+KL8_HIT_PLAYTYPES = ["1码", "2码", "3码", "4码", "5码", "6码", "7码", "8码", "9码", "10码", "12码", "15码"]
+KL8_KILL_PLAYTYPES = ["杀5码", "杀8码", "杀10码"]
+
+# ✅ 排列5 按位玩法的位置
+DIGIT_POSITION_MAP = {"万位": 0, "千位": 1, "百位": 2, "十位": 3, "个位": 4}
+
+_rule_registry = {}
+
+
+class HitRule:
     """
-    nums = re.findall(r"\d+", numbers)
-    open_nums = re.findall(r"\d+", open_code)
+    预编译的玩法命中规则，每个玩法字符串只解析一次。
 
-    nums_set = set(nums)
-    open_set = set(open_nums)
+    - family：ssq / kl8 / dlt / digit
+    - target / kind / required：非数字彩的比较对象（red / blue）、规则类型（at_least / kill / contains_all）与最少命中数
+    - digit_rules：数字彩按开奖位数（3 / 5）给出的 (规则类型, 参数)：
+      pos_kill / pos_include（参数为开奖位置）、kill_all、hit_at_least（参数为最少命中数）、group、never
+    """
 
-    # ✅ 双色球专属判断（独立于大乐透）
-    if playtype in [
-        "红球独胆", "红球双胆", "红球三胆",
-        "红球12码", "红球20码", "红球25码",
-        "红球杀三", "红球杀六",
-        "龙头两码", "凤尾两码",
-        "蓝球定三", "蓝球定五", "蓝球杀五"
-    ]:
-        blue_nums = re.findall(r"\d+", blue_code) if blue_code else []
-        blue_set = set(blue_nums)
-
-        if playtype == "红球独胆":
-            return len(nums_set & open_set) >= 1
-        elif playtype == "红球双胆":
-            return len(nums_set & open_set) >= 2
-        elif playtype == "红球三胆":
-            return len(nums_set & open_set) >= 3
-        elif playtype in ["红球12码", "红球20码", "红球25码"]:
-            return open_set.issubset(nums_set)  # 必须包含全部6个红球
-        elif playtype in ["红球杀三", "红球杀六"]:
-            return len(nums_set & open_set) == 0
-        elif playtype in ["龙头两码", "凤尾两码"]:
-            return len(nums_set & open_set) >= 2
-        elif playtype in ["蓝球定三", "蓝球定五"]:
-            return len(nums_set & blue_set) >= 1
-        elif playtype == "蓝球杀五":
-            return len(nums_set & blue_set) == 0
-
-    # ✅ 快乐8命中判断（已更新）
-    if playtype in [
-        "1码", "2码", "3码", "4码", "5码", "6码", "7码", "8码", "9码", "10码", "12码", "15码"
-    ]:
-        required_hit = int(re.findall(r"\d+", playtype)[0])
-        hit_count = len(nums_set & open_set)
-        return hit_count >= required_hit
-    elif playtype in ["杀5码", "杀8码", "杀10码"]:
-        return len(nums_set & open_set) == 0  # 完全不能命中
-
-    # ✅ 大乐透命中判断（保留原逻辑）
-    if "红球" in playtype or "蓝球" in playtype or "杀蓝" in playtype:
-        blue_nums = re.findall(r"\d+", blue_code) if blue_code else []
-        if "蓝" in playtype:
-            if "杀" in playtype:
-                return len(set(nums) & set(blue_nums)) == 0
-            elif "双" in playtype:
-                return len(set(nums) & set(blue_nums)) >= 2
-            else:
-                return len(set(nums) & set(blue_nums)) >= 1
-        else:
-            if "杀" in playtype:
-                return len(set(nums) & set(open_nums)) == 0
-            else:
-                return len(set(nums) & set(open_nums)) >= 1
+    def __init__(self, playtype: str, family: str, target: str = None, kind: str = None, required: int = None, digit_rules: dict = None):
+        self.playtype = playtype
+        self.family = family
+        self.target = target
+        self.kind = kind
+        self.required = required
+        self.digit_rules = digit_rules or {}
 
-    # ✅ 排列3/排列5/福彩3D命中判断（不改动）
-    if len(open_nums) not in [3, 5]:
-        return False
 
-    hit_count = len(set(nums) & set(open_nums))
-    unique_count = len(set(open_nums))
-    is_group3 = unique_count == 2
-    is_triplet = unique_count == 1
-
-    if len(open_nums) == 5:
-        position_map = {
-            "万位": 0,
-            "千位": 1,
-            "百位": 2,
-            "十位": 3,
-            "个位": 4,
-        }
-
-        for pos_name, idx in position_map.items():
+def _compile_digit_rule(playtype: str, open_len: int):
+    """按原 match_hit 的判断顺序把 (玩法, 开奖位数) 解析为 (规则类型, 参数)"""
+    if open_len == 5:
+        for pos_name, idx in DIGIT_POSITION_MAP.items():
             if playtype.startswith(f"{pos_name}杀"):
-                return str(open_nums[idx]) not in nums
+                return "pos_kill", idx
             if playtype.startswith(f"{pos_name}定"):
-                return str(open_nums[idx]) in nums
+                return "pos_include", idx
 
-    if playtype == "杀一":
-        return len(set(nums) & set(open_nums)) == 0
-    elif playtype == "杀二":
-        return len(set(nums) & set(open_nums)) == 0
+    if playtype in ("杀一", "杀二"):
+        return "kill_all", None
     elif "独胆" in playtype:
-        return hit_count >= 1
+        return "hit_at_least", 1
     elif "双胆" in playtype:
-        return hit_count >= 2
+        return "hit_at_least", 2
     elif "三胆" in playtype or any(x in playtype for x in ["五码", "六码", "七码"]):
-        if is_triplet:
-            return open_nums[0] in nums
-        elif is_group3:
-            return hit_count >= 2
-        else:
-            return hit_count == 3
+        return "group", None
     elif "定位" in playtype and "-百位" in playtype:
-        return len(set(nums) & {open_nums[0]}) >= 1
+        return "pos_include", 0
     elif "定位" in playtype and "-十位" in playtype:
-        return len(set(nums) & {open_nums[1]}) >= 1
+        return "pos_include", 1
     elif "定位" in playtype and "-个位" in playtype:
-        return len(set(nums) & {open_nums[2]}) >= 1
+        return "pos_include", 2
     elif playtype.startswith("百位定"):
-        return len(set(nums) & {open_nums[0]}) >= 1
+        return "pos_include", 0
     elif playtype.startswith("十位定"):
-        return len(set(nums) & {open_nums[1]}) >= 1
+        return "pos_include", 1
     elif playtype.startswith("个位定"):
-        return len(set(nums) & {open_nums[2]}) >= 1
+        return "pos_include", 2
+    return "never", None
+
+
+def _compile_rule(playtype: str) -> HitRule:
+    if playtype in SSQ_RULES:
+        target, kind, required = SSQ_RULES[playtype]
+        return HitRule(playtype, "ssq", target=target, kind=kind, required=required)
+
+    if playtype in KL8_HIT_PLAYTYPES:
+        return HitRule(playtype, "kl8", target="red", kind="at_least", required=int(re.findall(r"\d+", playtype)[0]))
+    if playtype in KL8_KILL_PLAYTYPES:
+        return HitRule(playtype, "kl8", target="red", kind="kill")  # 完全不能命中
+
+    # ✅ 大乐透：含“蓝”比蓝球，否则比红球；含“杀”为全不中，蓝球含“双”需中 2 个，其余中 1 个即可
+    if "红球" in playtype or "蓝球" in playtype or "杀蓝" in playtype:
+        target = "blue" if "蓝" in playtype else "red"
+        if "杀" in playtype:
+            return HitRule(playtype, "dlt", target=target, kind="kill")
+        required = 2 if target == "blue" and "双" in playtype else 1
+        return HitRule(playtype, "dlt", target=target, kind="at_least", required=required)
 
+    return HitRule(playtype, "digit", digit_rules={n: _compile_digit_rule(playtype, n) for n in (3, 5)})
+
+
+def get_hit_rule(playtype: str) -> HitRule:
+    """获取玩法的预编译命中规则（进程内注册表，首次访问时编译）"""
+    rule = _rule_registry.get(playtype)
+    if rule is None:
+        rule = _rule_registry[playtype] = _compile_rule(playtype)
+    return rule
+
+
+def match_hit(playtype: str, numbers: str, open_code: str, blue_code: str = "") -> bool:
+    """
+    命中判断（支持 福彩3D / 排列3 / 排列5 / 双色球 / 大乐透 / 快乐8）
+    """
+    rule = get_hit_rule(playtype)
+    nums = re.findall(r"\d+", numbers)
+    open_nums = re.findall(r"\d+", open_code)
+    nums_set = set(nums)
+
+    if rule.family != "digit":
+        if rule.target == "blue":
+            target_set = set(re.findall(r"\d+", blue_code)) if blue_code else set()
+        else:
+            target_set = set(open_nums)
+        if rule.kind == "contains_all":
+            return target_set.issubset(nums_set)
+        hit_count = len(nums_set & target_set)
+        if rule.kind == "kill":
+            return hit_count == 0
+        return hit_count >= rule.required
+
+    # ✅ 排列3/排列5/福彩3D命中判断
+    if len(open_nums) not in [3, 5]:
+        return False
+
+    kind, arg = rule.digit_rules[len(open_nums)]
+    if kind == "pos_kill":
+        return open_nums[arg] not in nums_set
+    if kind == "pos_include":
+        return open_nums[arg] in nums_set
+
+    open_set = set(open_nums)
+    hit_count = len(nums_set & open_set)
+    if kind == "kill_all":
+        return hit_count == 0
+    if kind == "hit_at_least":
+        return hit_count >= arg
+    if kind == "group":
+        unique_count = len(open_set)
+        if unique_count == 1:
+            return open_nums[0] in nums_set
+        elif unique_count == 2:
+            return hit_count >= 2
+        else:
+            return hit_count == 3
     return False
+
+
+def _eval_digit_rule(kind: str, arg, pred_masks: np.ndarray, open_digits: np.ndarray) -> np.ndarray:
+    if kind == "never":
+        return np.zeros(len(pred_masks), dtype=bool)
+    if kind in ("pos_kill", "pos_include"):
+        has_digit = ((pred_masks >> open_digits[:, arg].astype(np.uint16)) & 1).astype(bool)
+        return ~has_digit if kind == "pos_kill" else has_digit
+
+    open_masks = np.bitwise_or.reduce(np.left_shift(1, open_digits.astype(np.int64)), axis=1).astype(np.uint16)
+    hit_count = popcount16(pred_masks & open_masks)
+    if kind == "kill_all":
+        return hit_count == 0
+    if kind == "hit_at_least":
+        return hit_count >= arg
+
+    # group：豹子看首位是否在推荐中，组三至少命中 2 个，其余需恰好命中 3 个
+    unique_count = popcount16(open_masks)
+    first_hit = ((pred_masks >> open_digits[:, 0].astype(np.uint16)) & 1).astype(bool)
+    return np.where(unique_count == 1, first_hit, np.where(unique_count == 2, hit_count >= 2, hit_count == 3))
+
+
+def match_hit_batch(playtype: str, pred_masks, open_digits) -> np.ndarray:
+    """
+    批量命中判断（福彩3D / 排列3 / 排列5），结果与逐条调用 match_hit 完全一致。
+
+    - pred_masks：N 条推荐的数字位掩码（第 d 位为 1 表示推荐中含数字 d），可由 utils.digit_parser.parse_digit_column 得到
+    - open_digits：一期开奖数字（一维，如 [1, 2, 3]），或与推荐逐条对应的 N × k 开奖数字矩阵（位数不足处补 -1）
+    - 仅适用于推荐与开奖号码都由单个数字字符组成的情况（parsed.canonical 为 True）；"05"、"10" 这类按字符串比较的记录需走 match_hit
+
+    ⚠️ 双色球 / 大乐透 / 快乐8 玩法不支持批量判断，抛出 ValueError
+    """
+    rule = get_hit_rule(playtype)
+    if rule.family != "digit":
+        raise ValueError(f"玩法 {playtype} 不支持批量命中判断")
+
+    pred_masks = np.asarray(pred_masks, dtype=np.uint16)
+    open_digits = np.asarray(open_digits, dtype=np.int16)
+    if open_digits.ndim == 1:
+        open_digits = np.broadcast_to(open_digits, (len(pred_masks), len(open_digits)))
+
+    result = np.zeros(len(pred_masks), dtype=bool)
+    if not len(pred_masks) or not open_digits.shape[1]:
+        return result
+    open_len = (open_digits >= 0).sum(axis=1)
+    for length, (kind, arg) in rule.digit_rules.items():
+        sel = open_len == length
+        if sel.any():
+            result[sel] = _eval_digit_rule(kind, arg, pred_masks[sel], open_digits[sel, :length])
+    return result
+
+
+def match_hit_rows(playtype: str, numbers, open_codes) -> np.ndarray:
+    """
+    逐条推荐与各自开奖号码的命中判断，结果与逐条调用 match_hit 完全一致。
+
+    - numbers / open_codes：等长的推荐号码与开奖号码序列，未开奖的开奖号码为 None（记为未命中）
+    - 数字型玩法中推荐与开奖号码都由单个数字字符组成的记录走 match_hit_batch，其余逐条 match_hit
+    """
+    numbers = ["" if n is None else n for n in numbers]
+    open_codes = list(open_codes)
+    row_hit = np.zeros(len(numbers), dtype=bool)
+    row_open = np.array([code is not None for code in open_codes], dtype=bool)
+    batch_rows = np.zeros(len(numbers), dtype=bool)
+    if get_hit_rule(playtype).family == "digit" and row_open.any():
+        parsed = parse_digit_column(numbers)
+        open_parsed = parse_digit_column(["" if code is None else code for code in open_codes])
+        batch_rows = row_open & parsed.canonical & open_parsed.canonical
+        row_hit[batch_rows] = match_hit_batch(playtype, parsed.masks[batch_rows], open_parsed.digits[batch_rows])
+
+    for r in np.flatnonzero(row_open & ~batch_rows):
+        row_hit[r] = match_hit(playtype, numbers[r], open_codes[r], None)
+    return row_hit
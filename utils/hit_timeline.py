@@ -0,0 +1,96 @@
+# utils/hit_timeline.py
+# 指定用户命中时间线：一次查询取回全部指定用户的历史推荐并批量判断命中，按用户缓存命中期号，
+# 任意查询期号的 上次命中 / 平均命中间隔 / 当前间隔 都由数组二分查找得到，不再逐用户逐期查库
+import numpy as np
+import pandas as pd
+from utils.db import get_prediction_table
+from utils.hit_rule import match_hit_rows
+from utils.open_code_cache import get_open_code_cache
+
+_hit_timeline_cache = {}
+
+
+class UserHitTimelines:
+    """
+    单玩法指定用户的命中时间线。
+
+    - hit_issues：{user_id: 命中期号（升序 int 数组）}，同期多条推荐命中时逐条保留，与逐行 match_hit 收集的列表一致；
+      查过但从未命中的用户对应空数组
+    - load(user_ids) 只查询尚未缓存的用户，整批一次取回
+    """
+
+    def __init__(self, engine, lottery_name: str, playtype_name: str, open_version: int = 0):
+        self.engine = engine
+        self.lottery_name = lottery_name
+        self.playtype_name = playtype_name
+        self.prediction_table = get_prediction_table(lottery_name)
+        self.open_version = open_version
+        self.hit_issues = {}
+
+    def load(self, user_ids):
+        missing = [uid for uid in dict.fromkeys(user_ids) if uid not in self.hit_issues]
+        if not missing:
+            return
+        df = pd.read_sql(
+            f"SELECT user_id, issue_name, numbers FROM {self.prediction_table} "
+            f"WHERE playtype_name = %s AND user_id IN ({','.join(['%s'] * len(missing))})",
+            self.engine, params=(self.playtype_name, *missing)
+        )
+        open_cache = get_open_code_cache(self.engine, self.lottery_name)
+        open_by_issue = {issue: open_cache.get_open_code(issue) for issue in df["issue_name"].unique()}
+        row_hit = match_hit_rows(self.playtype_name, df["numbers"].tolist(), df["issue_name"].map(open_by_issue).tolist())
+
+        # ⚠️ 数据库返回的 user_id 类型可能与传入的不同（如 "123" / 123），按字符串对齐回传入值
+        uid_of = {str(uid): uid for uid in missing}
+        hits = df.loc[row_hit, ["user_id", "issue_name"]]
+        grouped = {}
+        for uid, issue in zip(hits["user_id"].astype(str), hits["issue_name"].astype(int)):
+            grouped.setdefault(uid, []).append(issue)
+        for key, uid in uid_of.items():
+            self.hit_issues[uid] = np.sort(np.array(grouped.get(key, []), dtype=np.int64), kind="stable")
+
+    def gap_stats(self, user_ids: list, query_issue) -> dict:
+        """
+        查询期号之前（不含）的命中统计，返回与 user_ids 对齐的数组：
+        hit_count / last_hit / avg_gap（命中不足两次为 nan）/ gap_now（从未命中为 -1）
+        """
+        self.load(user_ids)
+        query = int(query_issue)
+        timelines = [self.hit_issues[uid] for uid in user_ids]
+        lengths = np.array([len(t) for t in timelines], dtype=np.int64)
+        starts = np.zeros(len(timelines), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=starts[1:])
+        flat = np.concatenate(timelines) if timelines else np.zeros(0, dtype=np.int64)
+
+        # ✅ 按 (用户, 期号) 组合键一次二分，得到每个用户在查询期号之前的命中个数
+        key_base = int(max(flat.max(initial=0), query)) + 1
+        user_idx = np.repeat(np.arange(len(timelines), dtype=np.int64), lengths)
+        ends = np.searchsorted(user_idx * key_base + flat, np.arange(len(timelines), dtype=np.int64) * key_base + query)
+        hit_count = ends - starts
+
+        has_hit = hit_count > 0
+        last_hit = np.full(len(timelines), -1, dtype=np.int64)
+        last_hit[has_hit] = flat[ends[has_hit] - 1]
+        first_hit = np.full(len(timelines), -1, dtype=np.int64)
+        first_hit[has_hit] = flat[starts[has_hit]]
+
+        # ✅ 相邻间隔之和 = 末次 - 首次，平均间隔无需展开间隔序列
+        avg_gap = np.full(len(timelines), np.nan)
+        multi = hit_count >= 2
+        avg_gap[multi] = (last_hit[multi] - first_hit[multi]) / (hit_count[multi] - 1)
+        gap_now = np.where(has_hit, query - last_hit, -1)
+        return {"hit_count": hit_count, "last_hit": last_hit, "avg_gap": avg_gap, "gap_now": gap_now}
+
+
+def get_user_hit_timelines(engine, lottery_name: str, playtype_name: str) -> UserHitTimelines:
+    """获取 (彩种, 玩法) 的指定用户命中时间线，进程内缓存；开奖缓存刷新后自动重建"""
+    key = (lottery_name, playtype_name)
+    open_cache = get_open_code_cache(engine, lottery_name)
+    cached = _hit_timeline_cache.get(key)
+    if cached is None or cached.open_version != open_cache.version:
+        _hit_timeline_cache[key] = UserHitTimelines(engine, lottery_name, playtype_name, open_version=open_cache.version)
+    return _hit_timeline_cache[key]
+
+
+def clear_hit_timeline_cache():
+    _hit_timeline_cache.clear()
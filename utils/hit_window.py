@@ -0,0 +1,79 @@
+# utils/hit_window.py
+# 滑动回溯窗口：批量分析相邻期号时，回溯窗口只有首尾各一期不同，命中计数按期增量加减，不再每期从头统计
+import pandas as pd
+from collections import Counter
+from utils.db import get_prediction_table
+from utils.hit_rule import match_hit
+from utils.open_code_cache import get_open_code_cache
+
+
+class SlidingHitWindow:
+    """
+    单玩法滑动命中窗口。
+
+    - issue_stats：当前窗口内每期的 (命中 Counter, 推荐用户集合)，只保留窗口内的期号
+    - hit_counter：窗口内每个用户的累计命中次数
+    - participant_counter：窗口内每个用户有推荐的期数，归零即移出参与集合
+    - advance(issue_list) 对比新旧窗口，只查询新进入的期号、扣减离开的期号，窗口任意跳动时结果依然正确
+    """
+
+    def __init__(self, engine, lottery_name: str, playtype_name: str):
+        self.engine = engine
+        self.lottery_name = lottery_name
+        self.playtype_name = playtype_name
+        self.prediction_table = get_prediction_table(lottery_name)
+        self.open_version = None
+        self.reset()
+
+    def reset(self):
+        self.issue_stats = {}
+        self.hit_counter = Counter()
+        self.participant_counter = Counter()
+
+    def _load_issue(self, issue, open_cache):
+        df = pd.read_sql(
+            f"SELECT user_id, numbers FROM {self.prediction_table} WHERE issue_name = %s AND playtype_name = %s ORDER BY id",
+            self.engine, params=(issue, self.playtype_name)
+        )
+        hits = Counter()
+        open_code = open_cache.get_open_code(issue)
+        if open_code is not None:
+            for uid, numbers in zip(df["user_id"], df["numbers"]):
+                if match_hit(self.playtype_name, numbers, open_code, None):
+                    hits[uid] += 1
+        return hits, set(df["user_id"].tolist())
+
+    def _add(self, issue, open_cache):
+        hits, participants = self._load_issue(issue, open_cache)
+        self.issue_stats[issue] = (hits, participants)
+        self.hit_counter.update(hits)
+        self.participant_counter.update(participants)
+
+    def _remove(self, issue):
+        hits, participants = self.issue_stats.pop(issue)
+        for uid, cnt in hits.items():
+            self.hit_counter[uid] -= cnt
+            if self.hit_counter[uid] <= 0:
+                del self.hit_counter[uid]
+        for uid in participants:
+            self.participant_counter[uid] -= 1
+            if self.participant_counter[uid] <= 0:
+                del self.participant_counter[uid]
+
+    def advance(self, issue_list: list) -> dict:
+        """
+        把窗口移动到 issue_list，返回 {user_id: 命中次数}（窗口内有推荐但未命中的用户记 0）
+        """
+        open_cache = get_open_code_cache(self.engine, self.lottery_name)
+        if self.open_version != open_cache.version:
+            # ⚠️ 开奖缓存刷新后已缓存的单期命中可能失效，整窗重建
+            self.reset()
+            self.open_version = open_cache.version
+
+        target = set(issue_list)
+        for issue in [i for i in self.issue_stats if i not in target]:
+            self._remove(issue)
+        for issue in issue_list:
+            if issue not in self.issue_stats:
+                self._add(issue, open_cache)
+        return {uid: self.hit_counter.get(uid, 0) for uid in self.participant_counter}
@@ -0,0 +1,90 @@
+# utils/issue_index.py
+# 期号索引：每个 (彩种, 玩法) 进程内只扫描一次 DISTINCT issue_name，之后“早于某期的期号”、回溯区间、偏移均为二分查找
+import numpy as np
+import pandas as pd
+from utils.db import get_prediction_table
+
+_issue_index_cache = {}
+
+
+class IssueIndex:
+    """
+    升序期号索引。
+
+    - issue_names：原始期号（保持数据库返回的类型，通常为字符串），升序
+    - issues：与 issue_names 对齐的 int64 数组，所有查找均在其上二分
+    - playtype_name 为 None 时表示整张预测表的期号（analyze_expert_hits 的回溯口径）
+    """
+
+    def __init__(self, lottery_name: str, playtype_name, issue_names: list):
+        self.lottery_name = lottery_name
+        self.playtype_name = playtype_name
+        self.issue_names = sorted(issue_names, key=int)
+        self.issues = np.array([int(i) for i in self.issue_names], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.issue_names)
+
+    def position(self, issue_name) -> int:
+        """期号在索引中的下标，不存在返回 -1"""
+        issue = int(issue_name)
+        idx = int(np.searchsorted(self.issues, issue))
+        if idx < len(self.issues) and self.issues[idx] == issue:
+            return idx
+        return -1
+
+    def count_before(self, issue_name) -> int:
+        """早于指定期号的期数"""
+        return int(np.searchsorted(self.issues, int(issue_name)))
+
+    def latest(self, limit: int = None) -> list:
+        """最新期号在前的期号列表，等价于 ORDER BY issue_name DESC [LIMIT n]"""
+        stop = len(self.issue_names) - limit if limit is not None else 0
+        return self.issue_names[max(stop, 0):][::-1]
+
+    def issues_before(self, issue_name) -> list:
+        """早于指定期号的全部期号（降序）"""
+        return self.issue_names[:self.count_before(issue_name)][::-1]
+
+    def lookback_window(self, query_issue, lookback_n: int = None, lookback_start_offset: int = 0):
+        """
+        回溯期号在升序期号轴上的连续区间 [start, stop)。
+        与 issues_before(query_issue)[offset: offset + n] 的切片语义完全一致。
+        """
+        prior = range(self.count_before(query_issue) - 1, -1, -1)
+        picked = prior[lookback_start_offset: lookback_start_offset + lookback_n] if lookback_n else prior[lookback_start_offset:]
+        if not picked:
+            return 0, 0
+        return picked[-1], picked[0] + 1
+
+    def lookback_issues(self, query_issue, lookback_n: int = None, lookback_start_offset: int = 0) -> list:
+        """回溯期号列表（降序）"""
+        start, stop = self.lookback_window(query_issue, lookback_n, lookback_start_offset)
+        return self.issue_names[start:stop][::-1]
+
+
+def get_issue_index(engine, lottery_name: str, playtype_name: str = None) -> IssueIndex:
+    """
+    获取期号索引：playtype_name 为空时为整张预测表的期号，否则仅该玩法有推荐的期号。进程内缓存。
+    """
+    key = (lottery_name, playtype_name)
+    if key not in _issue_index_cache:
+        prediction_table = get_prediction_table(lottery_name)
+        if playtype_name is None:
+            issue_df = pd.read_sql(f"SELECT DISTINCT issue_name FROM {prediction_table}", engine)
+        else:
+            issue_df = pd.read_sql(
+                f"SELECT DISTINCT issue_name FROM {prediction_table} WHERE playtype_name = %s",
+                engine, params=(playtype_name,)
+            )
+        _issue_index_cache[key] = IssueIndex(lottery_name, playtype_name, issue_df["issue_name"].tolist())
+    return _issue_index_cache[key]
+
+
+def set_issue_index(issue_index: IssueIndex):
+    """直接装入已构建的期号索引（如子进程 attach 的共享内存索引）"""
+    _issue_index_cache[(issue_index.lottery_name, issue_index.playtype_name)] = issue_index
+
+
+def clear_issue_index_cache():
+    _issue_index_cache.clear()
@@ -6,13 +6,34 @@ from datetime import datetime
 
 _log_buffer = []
 _current_log_file_path = None
+_log_collector = None
 
 def log(*args, sep=" ", end="\n", **kwargs):
     msg = sep.join(map(str, args)) + end
+    if _log_collector is not None:
+        _log_collector.append(msg)
+        return
     sys.stdout.write(msg)
     sys.stdout.flush()
     _log_buffer.append(msg)
 
+def collect_logs(func, *args, **kwargs):
+    """
+    执行 func 期间的 log 输出不打印、只收集，返回 (func 返回值, 日志行列表)；
+    用于子进程把日志交回主进程，由 replay_logs 按原顺序输出
+    """
+    global _log_collector
+    previous, _log_collector = _log_collector, []
+    try:
+        result = func(*args, **kwargs)
+        return result, _log_collector
+    finally:
+        _log_collector = previous
+
+def replay_logs(lines):
+    for msg in lines:
+        log(msg, end="")
+
 def init_log_capture(script_name_hint=None, lottery_name=None):
     global _current_log_file_path
     if script_name_hint is None:
@@ -0,0 +1,132 @@
+# utils/open_code_cache.py
+# 开奖号码进程级缓存：整表一次加载 lottery_results_xxx 并解析为开奖数字数组，分析 / 命中判断 / 排名统计共用，
+# 常驻进程按间隔核对开奖表的期数与最大期号，有新开奖时自动刷新（也可显式刷新）
+import time
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from utils.db import get_result_table
+from utils.digit_parser import parse_digit_column
+
+# ✅ 距上次核对超过该秒数时，取缓存前先查询一次开奖表的 (期数, 最大期号)，与缓存不一致即整表重载
+OPEN_CODE_CHECK_SECONDS = 60
+
+_open_code_cache = {}
+_last_checked = {}
+
+
+class OpenCodeCache:
+    """
+    单彩种开奖号码缓存。
+
+    - issues：全部已开奖期号（升序 int）
+    - open_codes：与 issues 对齐的原始开奖号码字符串
+    - digits：与 issues 对齐的开奖数字矩阵（int8，位数不足处补 -1），lengths 为每期数字个数
+    - masks：与 issues 对齐的开奖数字位掩码（uint16）
+    - version：每次刷新自增，依赖开奖数据的下游缓存（如命中矩阵）据此判断是否需要重建
+    """
+
+    def __init__(self, lottery_name: str, df: pd.DataFrame, version: int = 0):
+        self.lottery_name = lottery_name
+        self.version = version
+
+        issues = df["issue_name"].astype(int).to_numpy()
+        order = np.argsort(issues, kind="stable")
+        self.issues = issues[order].astype(np.int64)
+        self.open_codes = df["open_code"].to_numpy(dtype=object)[order]
+
+        parsed = parse_digit_column(self.open_codes)
+        self.lengths = parsed.lengths.astype(np.int8)
+        self.digits = parsed.digits.astype(np.int8)
+        self.masks = parsed.masks
+
+    def signature(self) -> tuple:
+        """(期数, 最大期号)，与 _result_signature 同口径，用于判断开奖表是否有新数据"""
+        return len(self.issues), int(self.issues[-1]) if len(self.issues) else None
+
+    def index_of(self, issue_name) -> int:
+        """期号在缓存中的下标，未开奖返回 -1"""
+        issue = int(issue_name)
+        idx = int(np.searchsorted(self.issues, issue))
+        if idx < len(self.issues) and self.issues[idx] == issue:
+            return idx
+        return -1
+
+    def get_open_code(self, issue_name):
+        """原始开奖号码字符串，未开奖返回 None"""
+        idx = self.index_of(issue_name)
+        return self.open_codes[idx] if idx >= 0 else None
+
+    def get_digits(self, issue_name):
+        """开奖数字列表（如 [1, 2, 3]），未开奖返回 None"""
+        idx = self.index_of(issue_name)
+        if idx < 0:
+            return None
+        return self.digits[idx, :self.lengths[idx]].tolist()
+
+    def lookup(self, issue_ids):
+        """
+        批量按期号取开奖数字：返回 (digits, found)，未开奖的期号对应行全为 -1、found 为 False
+        """
+        issue_ids = np.asarray(issue_ids, dtype=np.int64)
+        digits = np.full((len(issue_ids), self.digits.shape[1]), -1, dtype=np.int8)
+        if not len(self.issues):
+            return digits, np.zeros(len(issue_ids), dtype=bool)
+        idx = np.minimum(np.searchsorted(self.issues, issue_ids), len(self.issues) - 1)
+        found = self.issues[idx] == issue_ids
+        digits[found] = self.digits[idx[found]]
+        return digits, found
+
+
+def _load_open_code_cache(engine, lottery_name: str, version: int = 0) -> OpenCodeCache:
+    result_table = get_result_table(lottery_name)
+    df = pd.read_sql(f"SELECT issue_name, open_code FROM {result_table}", engine)
+    return OpenCodeCache(lottery_name, df, version=version)
+
+
+def _result_signature(engine, lottery_name: str) -> tuple:
+    result_table = get_result_table(lottery_name)
+    with engine.connect() as conn:
+        count, max_issue = conn.execute(text(f"SELECT COUNT(*), MAX(issue_name) FROM {result_table}")).fetchone()
+    return int(count), int(max_issue) if max_issue is not None else None
+
+
+def get_open_code_cache(engine, lottery_name: str) -> OpenCodeCache:
+    """
+    获取彩种的开奖号码缓存：首次调用整表加载，之后进程内复用。
+    每隔 OPEN_CODE_CHECK_SECONDS 秒核对一次开奖表，有新开奖时自动刷新（版本号递增，命中矩阵等下游缓存随之重建）
+    """
+    open_cache = _open_code_cache.get(lottery_name)
+    if open_cache is None:
+        _open_code_cache[lottery_name] = _load_open_code_cache(engine, lottery_name)
+        _last_checked[lottery_name] = time.monotonic()
+    elif time.monotonic() - _last_checked.get(lottery_name, 0) >= OPEN_CODE_CHECK_SECONDS:
+        _last_checked[lottery_name] = time.monotonic()
+        if _result_signature(engine, lottery_name) != open_cache.signature():
+            refresh_open_code_cache(engine, lottery_name)
+    return _open_code_cache[lottery_name]
+
+
+def refresh_open_code_cache(engine, lottery_name: str) -> OpenCodeCache:
+    """重新整表加载并递增版本号（get_open_code_cache 发现新开奖时自动调用，也可在新开奖入库后显式调用）"""
+    old = _open_code_cache.get(lottery_name)
+    version = old.version + 1 if old is not None else 0
+    _open_code_cache[lottery_name] = _load_open_code_cache(engine, lottery_name, version=version)
+    _last_checked[lottery_name] = time.monotonic()
+    return _open_code_cache[lottery_name]
+
+
+def get_open_code(engine, lottery_name: str, issue_name):
+    """按期号读取开奖号码字符串，未开奖返回 None"""
+    return get_open_code_cache(engine, lottery_name).get_open_code(issue_name)
+
+
+def set_open_code_cache(open_cache: OpenCodeCache):
+    """直接装入已构建的开奖缓存（如子进程 attach 的共享内存缓存），版本号沿用 open_cache.version"""
+    _open_code_cache[open_cache.lottery_name] = open_cache
+    _last_checked[open_cache.lottery_name] = time.monotonic()
+
+
+def clear_open_code_cache():
+    _open_code_cache.clear()
+    _last_checked.clear()
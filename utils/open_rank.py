@@ -0,0 +1,68 @@
+# utils/open_rank.py
+# 开奖数字排名矩阵：预先算出每期开奖号码各定位位数字在推荐数字排名中的名次（int8 紧凑存储），
+# open_rank_counter / max_rank_length 均由数组归约得到，口径与逐期 track_open_rank 累计完全一致
+import numpy as np
+from collections import Counter
+
+
+def _rank_dtype(max_size: int):
+    return np.int8 if max_size <= np.iinfo(np.int8).max else np.int16
+
+
+class OpenRankMatrix:
+    """
+    一段查询期号的开奖数字排名矩阵。
+
+    - issues：查询期号（与逐期分析顺序一致）
+    - positions：各列对应的定位位（负数按 Python 下标从末位倒数）
+    - ranks：期号 × 定位位 的开奖数字名次（从 1 开始），未开奖 / 无推荐 / 未出现在排名中为 0
+    - sizes：各期推荐数字排名长度（去重数字个数）
+    - has_open：各期是否有推荐且已开奖（即名次有效的期号）
+    """
+
+    def __init__(self, issues, positions, ranks: np.ndarray, sizes: np.ndarray, has_open: np.ndarray):
+        self.issues = list(issues)
+        self.positions = list(positions)
+        self.ranks = ranks
+        self.sizes = sizes
+        self.has_open = has_open
+
+    def counter(self, issue_mask=None, position=None) -> Counter:
+        """
+        选中期号上开奖数字名次的计数；position 为空时统计全部定位位（check_mode="all"）。
+        键按首次出现（逐期、期内按定位位）顺序插入，与逐期 track_open_rank 得到的 Counter 相同
+        """
+        ranks = self.ranks if issue_mask is None else self.ranks[np.asarray(issue_mask, dtype=bool)]
+        if position is not None:
+            if position not in self.positions:
+                return Counter()
+            ranks = ranks[:, self.positions.index(position)]
+        flat = ranks.reshape(-1)
+        flat = flat[flat > 0]
+        if not len(flat):
+            return Counter()
+        values, first, counts = np.unique(flat, return_index=True, return_counts=True)
+        order = np.argsort(first, kind="stable")
+        return Counter(dict(zip(values[order].tolist(), counts[order].tolist())))
+
+    def max_rank_length(self) -> int:
+        return int(self.sizes.max()) if len(self.sizes) else 0
+
+
+def build_open_rank_matrix(issues, rankings: list, open_digits: np.ndarray, positions: list) -> OpenRankMatrix:
+    """
+    由逐期 DigitRanking（无推荐为 None）与开奖数字矩阵（位数不足处为 -1，未开奖整行 -1）构建排名矩阵
+    """
+    sizes = np.array([len(r) if r is not None else 0 for r in rankings], dtype=np.int64)
+    dtype = _rank_dtype(int(sizes.max()) if len(sizes) else 0)
+    ranks = np.zeros((len(rankings), len(positions)), dtype=dtype)
+    has_open = np.zeros(len(rankings), dtype=bool)
+    for i, ranking in enumerate(rankings):
+        if ranking is None or not len(ranking):
+            continue
+        digits = [int(d) for d in open_digits[i] if d >= 0]
+        has_open[i] = bool(digits)
+        for col, pos in enumerate(positions):
+            if -len(digits) <= pos < len(digits):
+                ranks[i, col] = ranking.rank_of(digits[pos]) or 0
+    return OpenRankMatrix(issues, positions, ranks, sizes.astype(dtype), has_open)
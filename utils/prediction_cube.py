@@ -0,0 +1,118 @@
+# utils/prediction_cube.py
+# 专家预测数据立方体：按玩法一次性加载 expert_predictions_xxx 到内存，回测时所有查询直接走数组，不再逐期访问数据库
+import uuid
+import numpy as np
+import pandas as pd
+from utils.db import get_prediction_table
+from utils.issue_index import IssueIndex, get_issue_index
+from utils.digit_parser import parse_digit_column
+
+# ✅ 仅数字型彩种（每位 0~9）支持位掩码立方体
+CUBE_LOTTERIES = ("福彩3D", "排列3", "排列5")
+
+_cube_cache = {}
+
+
+def is_cube_supported(lottery_name: str) -> bool:
+    return lottery_name in CUBE_LOTTERIES
+
+
+class PredictionCube:
+    """
+    单玩法预测立方体（期号索引 × 稠密 user 索引 → 数字位掩码）。
+
+    - issue_index / issue_names / issues：整张预测表的期号索引（升序），与 analyze_expert_hits 的回溯期号口径一致，
+      因此任一回溯窗口都是期号轴上的连续区间
+    - user_ids：该玩法出现过的全部 user_id（升序），下标即稠密 user 索引
+    - masks / present：期号 × 用户 的位掩码矩阵与参与矩阵
+    - row_*：按期号分组、组内按 id 升序的推荐记录，issue_ptr 为每期行区间
+    - parsed：row_numbers 的批量解析结果（逐行数字序列 / 位掩码 / 多重集计数）
+    - version：每次构建唯一（子进程 attach 的共享立方体沿用主进程的值），以稠密 user 下标为键的缓存（如入选集合备忘录）据此区分
+    """
+
+    def __init__(self, lottery_name: str, playtype_name: str, issue_index: IssueIndex, df: pd.DataFrame):
+        self.lottery_name = lottery_name
+        self.playtype_name = playtype_name
+        self.version = uuid.uuid4().hex
+        self.issue_index = issue_index
+        self.issue_names = issue_index.issue_names
+        self.issues = issue_index.issues
+
+        row_issue = np.searchsorted(self.issues, df["issue_name"].astype(int).to_numpy())
+        order = np.argsort(row_issue, kind="stable")
+
+        self.user_ids, row_user = np.unique(df["user_id"].to_numpy(), return_inverse=True)
+        self.row_issue = row_issue[order].astype(np.int32)
+        self.row_user = row_user[order].astype(np.int32)
+        self.row_numbers = df["numbers"].to_numpy(dtype=object)[order]
+        self.parsed = parse_digit_column(self.row_numbers)
+        self.row_mask = self.parsed.masks
+        self.issue_ptr = np.searchsorted(self.row_issue, np.arange(len(self.issues) + 1)).astype(np.int64)
+
+        self.masks = np.zeros((len(self.issues), len(self.user_ids)), dtype=np.uint16)
+        np.bitwise_or.at(self.masks, (self.row_issue, self.row_user), self.row_mask)
+        self.present = np.zeros((len(self.issues), len(self.user_ids)), dtype=bool)
+        self.present[self.row_issue, self.row_user] = True
+
+    def row_indices(self, issue_name, user_ids=None) -> np.ndarray:
+        """
+        指定期号（可选限定 user_id）的推荐行下标，按 id 升序
+        """
+        idx = self.issue_index.position(issue_name)
+        if idx < 0:
+            return np.zeros(0, dtype=np.int64)
+        rows = np.arange(self.issue_ptr[idx], self.issue_ptr[idx + 1])
+        if user_ids is not None:
+            rows = rows[np.isin(self.user_ids[self.row_user[rows]], list(user_ids))]
+        return rows
+
+    def frame(self, rows) -> pd.DataFrame:
+        """推荐行 → DataFrame(user_id, numbers)"""
+        return pd.DataFrame({
+            "user_id": self.user_ids[self.row_user[rows]],
+            "numbers": self.row_numbers[rows],
+        })
+
+    def predictions_at(self, issue_name, user_ids=None) -> pd.DataFrame:
+        """
+        等价于 SELECT user_id, numbers FROM ... WHERE issue_name = ? AND playtype_name = ? [AND user_id IN (...)] ORDER BY id
+        """
+        return self.frame(self.row_indices(issue_name, user_ids))
+
+    def digit_values(self, rows) -> np.ndarray:
+        r"""
+        按行序展开指定推荐行的全部数字，等价于逐行 re.findall(r"\d+") 后依次拼接
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        lengths = self.parsed.lengths[rows]
+        if not lengths.sum():
+            return np.zeros(0, dtype=np.int64)
+        starts = self.parsed.offsets[rows]
+        shift = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths)
+        return self.parsed.values[shift + np.arange(lengths.sum())]
+
+
+def get_prediction_cube(engine, lottery_name: str, playtype_name: str) -> PredictionCube:
+    """
+    获取 (彩种, 玩法) 的预测立方体：首次调用时整表拉取一次，之后进程内复用
+    """
+    key = (lottery_name, playtype_name)
+    if key not in _cube_cache:
+        if not is_cube_supported(lottery_name):
+            raise ValueError(f"彩种 {lottery_name} 不支持预测立方体")
+        prediction_table = get_prediction_table(lottery_name)
+        df = pd.read_sql(
+            f"SELECT issue_name, user_id, numbers FROM {prediction_table} WHERE playtype_name = %s ORDER BY id",
+            engine, params=(playtype_name,)
+        )
+        _cube_cache[key] = PredictionCube(lottery_name, playtype_name, get_issue_index(engine, lottery_name), df)
+    return _cube_cache[key]
+
+
+def set_prediction_cube(cube: PredictionCube):
+    """直接装入已构建的预测立方体（如子进程 attach 的共享内存立方体）"""
+    _cube_cache[(cube.lottery_name, cube.playtype_name)] = cube
+
+
+def clear_prediction_cube_cache():
+    _cube_cache.clear()
@@ -0,0 +1,77 @@
+# utils/ranking_memo.py
+# 入选用户集合去重：相邻 lookback_n 的命中排名筛选常常选出完全相同的 user 集合，
+# 对入选集合（排序后的稠密 user 下标）取指纹，同一 (立方体版本, 期号, 指纹) 的推荐行下标 / 数字排行榜只算一次
+import hashlib
+from collections import OrderedDict
+import numpy as np
+
+# ⚠️ 进程级备忘录的条目上限，超过后按最近最少使用淘汰，避免全历史长跑时无限增长。
+# 每条只存推荐行下标与 DigitRanking（约数 KB），上限下每个进程（含每个子进程）占用在几十 MB 以内；
+# 相同入选集合多出现在同一期的相邻 lookback_n 之间，逐期推进的回测不需要保留更久远的期号
+RANKING_MEMO_MAX_ENTRIES = 5000
+
+_ranking_memo = None
+
+
+def eligible_fingerprint(user_ids) -> bytes:
+    """
+    入选用户集合的指纹：整数（稠密 user 下标）排序后取字节哈希，其余类型按字符串排序后哈希；与传入顺序无关
+    """
+    values = np.asarray(list(user_ids))
+    if values.dtype.kind in "iu":
+        payload = np.sort(values.astype(np.int64)).tobytes()
+    else:
+        payload = "\x1f".join(sorted(str(uid) for uid in values.tolist())).encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=16).digest()
+
+
+class RankingMemo:
+    """
+    (立方体版本, 期号, 入选集合指纹) → 计算结果 的备忘录，并记录命中统计。
+
+    - lookups / hits：查询次数与复用次数，hit_rate() 即被共享掉的计算比例
+    - get_or_compute(key, compute)：未命中时调用 compute() 并存入；设置 max_entries 时超出上限淘汰最久未使用的条目
+    - record_reuse(lookups, hits)：只累加统计
+    """
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lookups = 0
+        self.hits = 0
+
+    def get_or_compute(self, key, compute):
+        self.lookups += 1
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        value = compute()
+        self.entries[key] = value
+        if self.max_entries is not None and len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return value
+
+    def record_reuse(self, lookups: int, hits: int):
+        """调用方按数组自行去重时只记录统计（如网格评估同一期内的入选集合去重），不存条目"""
+        self.lookups += lookups
+        self.hits += hits
+
+    def hit_rate(self) -> float:
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    def stats(self) -> dict:
+        return {"lookups": self.lookups, "hits": self.hits, "entries": len(self.entries), "hit_rate": self.hit_rate()}
+
+
+def get_ranking_memo() -> RankingMemo:
+    """进程级推荐排行榜备忘录（analyze_expert_hits 的立方体路径使用）"""
+    global _ranking_memo
+    if _ranking_memo is None:
+        _ranking_memo = RankingMemo(max_entries=RANKING_MEMO_MAX_ENTRIES)
+    return _ranking_memo
+
+
+def clear_ranking_memo():
+    global _ranking_memo
+    _ranking_memo = None
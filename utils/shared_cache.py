@@ -0,0 +1,270 @@
+# utils/shared_cache.py
+# 进程池共享缓存：主进程把已解析的预测立方体 / 期号索引 / 开奖数字数组及据此算好的命中矩阵 / hit+N 位图前缀和
+# 一次性放入 multiprocessing.shared_memory，子进程按清单 attach 为零拷贝只读 numpy 视图并装入各自的进程内缓存，
+# 不再各自整表查库、各自重建矩阵、各持一份副本
+from multiprocessing import shared_memory
+import numpy as np
+from utils.digit_parser import ParsedDigits
+from utils.issue_index import IssueIndex, get_issue_index, set_issue_index
+from utils.open_code_cache import OpenCodeCache, get_open_code_cache, set_open_code_cache
+from utils.prediction_cube import PredictionCube, is_cube_supported, get_prediction_cube, set_prediction_cube
+from utils.hit_matrix import HitMatrix, get_hit_matrix, set_hit_matrix
+from utils.exact_hit_matrix import ExactHitMatrix, get_exact_hit_matrix, set_exact_hit_matrix
+from utils.logger import log
+
+# ✅ 可按属性整体共享的缓存类型：数值数组放共享内存，其余属性随清单传递
+SHARED_CLASSES = (PredictionCube, ParsedDigits, IssueIndex, OpenCodeCache, HitMatrix, ExactHitMatrix)
+# ✅ 逐行推荐字符串占内存最多，以 UTF-8 字节 + 偏移共享，按下标取值时才解码；其余字符串数组 attach 时整列解码
+LAZY_STRING_FIELDS = ("row_numbers",)
+# ⚠️ 共享内存总量上限（/dev/shm 通常只有物理内存的一半）：预测立方体 / 矩阵放入后会超出时改由子进程各自加载 / 重建
+SHARED_CACHE_MAX_BYTES = 4 * 2 ** 30
+
+
+class SharedStrings:
+    """
+    共享内存中的只读字符串数组（UTF-8 拼接字节 + 偏移）。
+    支持 len()、整数下标（返回 str）与下标数组 / 切片 / 布尔掩码（返回 object 数组），用法同 object ndarray
+    """
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _decode(self, i: int) -> str:
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            i = int(key)
+            return self._decode(i + len(self) if i < 0 else i)
+        idx = np.arange(len(self))[key] if isinstance(key, slice) else np.asarray(key)
+        if idx.dtype == bool:
+            idx = np.flatnonzero(idx)
+        out = np.empty(len(idx), dtype=object)
+        out[:] = [self._decode(int(i)) for i in idx]
+        return out
+
+
+def _encode_strings(values):
+    """字符串序列 → (UTF-8 拼接字节, int64 偏移)；含非字符串元素时返回 None"""
+    if not all(isinstance(v, str) for v in values):
+        return None
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def estimate_shared_nbytes(value, seen: set = None) -> int:
+    """按 SharedCaches._encode 的规则估算放入共享内存的字节数；seen 为已计入的对象 id，同一对象只计一次"""
+    seen = set() if seen is None else seen
+    if not isinstance(value, (np.ndarray, list, dict, SHARED_CLASSES)) or id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, SHARED_CLASSES):
+        return sum(estimate_shared_nbytes(v, seen) for v in vars(value).values())
+    if isinstance(value, dict):
+        return sum(estimate_shared_nbytes(v, seen) for v in value.values())
+    if isinstance(value, np.ndarray) and value.dtype != object:
+        return max(value.nbytes, 1)
+    if isinstance(value, np.ndarray) and all(isinstance(v, str) for v in value):
+        return max(sum(len(v.encode("utf-8")) for v in value), 1) + (len(value) + 1) * 8
+    return 0  # 列表 / 混合类型 object 数组随清单复制，不占共享内存
+
+
+class SharedCaches:
+    """
+    主进程侧：持有全部共享内存块，manifest 为可 pickle 的清单（传给子进程 initializer 的 attach_shared_caches）。
+    用作 with 上下文，退出时释放共享内存（须在进程池关闭之后）
+    """
+
+    def __init__(self):
+        self.blocks = []
+        self.manifest = {"issue_index": {}, "open_code": {}, "cube": {}, "hit_matrix": {}, "exact_hit": {}}
+        self._memo = {}
+
+    def _put(self, array: np.ndarray) -> tuple:
+        array = np.ascontiguousarray(array)
+        shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+        self.blocks.append(shm)
+        return shm.name, array.shape, array.dtype.str
+
+    def _encode(self, value, field: str = None):
+        """
+        递归编码：同一对象只编码一次，之后以 ref 引用（如立方体与期号索引共用的 issues 数组 / issue_names 列表、
+        命中矩阵引用的立方体）。dict（如 hit+N 位图的 member_prefix）逐值编码，attach 时重建为子进程自己的 dict
+        """
+        if not isinstance(value, (np.ndarray, list, dict, SHARED_CLASSES)):
+            return ("value", value)
+        ref = id(value)
+        if ref in self._memo:
+            return ("ref", ref)
+        self._memo[ref] = value  # 持有引用，编码期间 id 不会被复用
+        if isinstance(value, SHARED_CLASSES):
+            return ("object", ref, type(value), {k: self._encode(v, k) for k, v in vars(value).items()})
+        if isinstance(value, dict):
+            return ("dict", ref, {k: self._encode(v) for k, v in value.items()})
+        if isinstance(value, np.ndarray) and value.dtype != object:
+            return ("array", ref, *self._put(value))
+        strings = _encode_strings(value) if isinstance(value, np.ndarray) else None
+        if strings is None:
+            return ("copy", ref, value)  # 列表 / 混合类型 object 数组：随清单复制一份
+        return ("strings", ref, field in LAZY_STRING_FIELDS, self._put(strings[0]), self._put(strings[1]))
+
+    def add_issue_index(self, issue_index: IssueIndex):
+        key = (issue_index.lottery_name, issue_index.playtype_name)
+        self.manifest["issue_index"][key] = self._encode(issue_index)
+
+    def add_open_code_cache(self, open_cache: OpenCodeCache):
+        self.manifest["open_code"][open_cache.lottery_name] = self._encode(open_cache)
+
+    def add_cube(self, cube: PredictionCube):
+        self.manifest["cube"][(cube.lottery_name, cube.playtype_name)] = self._encode(cube)
+
+    def add_hit_matrix(self, hit_matrix: HitMatrix):
+        """须在其立方体 add_cube 之后调用，矩阵内的 cube 以 ref 引用共享立方体"""
+        self.manifest["hit_matrix"][(hit_matrix.cube.lottery_name, hit_matrix.cube.playtype_name)] = self._encode(hit_matrix)
+
+    def add_exact_hit_matrix(self, exact_matrix: ExactHitMatrix):
+        """须在其立方体 add_cube 之后调用；只共享调用时已生成的 member_prefix"""
+        self.manifest["exact_hit"][(exact_matrix.cube.lottery_name, exact_matrix.cube.playtype_name)] = self._encode(exact_matrix)
+
+    def nbytes(self) -> int:
+        return sum(shm.size for shm in self.blocks)
+
+    def close(self):
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def share_process_caches(engine, lottery_name: str, cube_playtypes=(), max_bytes: int = None,
+                         matrix_playtypes=(), exact_hits=()) -> SharedCaches:
+    """
+    主进程：取（首次则加载）整表期号索引、开奖缓存与 cube_playtypes 的预测立方体，放入共享内存；
+    matrix_playtypes（回溯玩法）另在主进程构建一次命中矩阵，exact_hits 非空时再构建 hit+N 位图并预先生成这些 N 的前缀和，一并共享。
+    分配前先估算并输出所需大小；期号索引与开奖缓存总是共享，预测立方体与矩阵按顺序放入，
+    累计超过 max_bytes（默认 SHARED_CACHE_MAX_BYTES）的部分不共享，由子进程各自加载 / 重建；立方体未共享的玩法不共享其矩阵。
+    彩种不支持立方体时只共享期号索引与开奖缓存
+    """
+    max_bytes = SHARED_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    issue_index = get_issue_index(engine, lottery_name)
+    open_cache = get_open_code_cache(engine, lottery_name)
+    cubes, matrices = [], []
+    if is_cube_supported(lottery_name):
+        cube_playtypes = dict.fromkeys(list(cube_playtypes) + list(matrix_playtypes))
+        cubes = [get_prediction_cube(engine, lottery_name, playtype_name) for playtype_name in cube_playtypes]
+        for playtype_name in dict.fromkeys(matrix_playtypes):
+            matrices.append(get_hit_matrix(engine, lottery_name, playtype_name))
+            if exact_hits:
+                exact_matrix = get_exact_hit_matrix(engine, lottery_name, playtype_name)
+                for n in dict.fromkeys(exact_hits):
+                    exact_matrix.member_prefix(n)
+                matrices.append(exact_matrix)
+
+    seen = set()
+    used = estimate_shared_nbytes(issue_index, seen) + estimate_shared_nbytes(open_cache, seen)
+    cube_sizes = [estimate_shared_nbytes(cube, seen) for cube in cubes]
+    matrix_sizes = [estimate_shared_nbytes(matrix, seen) for matrix in matrices]
+    log(f"🧠 预计共享缓存：{(used + sum(cube_sizes) + sum(matrix_sizes)) / 2 ** 20:.1f} MB（期号索引 / 开奖 {used / 2 ** 20:.1f} MB + "
+        f"{len(cubes)} 个预测立方体 {sum(cube_sizes) / 2 ** 20:.1f} MB + {len(matrices)} 个命中矩阵 {sum(matrix_sizes) / 2 ** 20:.1f} MB），"
+        f"上限 {max_bytes / 2 ** 20:.0f} MB")
+
+    shared = SharedCaches()
+    shared.add_issue_index(issue_index)
+    shared.add_open_code_cache(open_cache)
+    shared_cubes = set()
+    for cube, size in zip(cubes, cube_sizes):
+        if used + size > max_bytes:
+            log(f"⚠️ 预测立方体 {cube.playtype_name} 约 {size / 2 ** 20:.1f} MB，放入后超过共享内存上限 ➜ 由子进程各自加载")
+            continue
+        shared.add_cube(cube)
+        shared_cubes.add(id(cube))
+        used += size
+    for matrix, size in zip(matrices, matrix_sizes):
+        name = "命中矩阵" if isinstance(matrix, HitMatrix) else "hit+N 位图"
+        if id(matrix.cube) not in shared_cubes or used + size > max_bytes:
+            log(f"⚠️ {matrix.cube.playtype_name} 的{name}约 {size / 2 ** 20:.1f} MB，未共享 ➜ 由子进程各自构建")
+            continue
+        if isinstance(matrix, HitMatrix):
+            shared.add_hit_matrix(matrix)
+        else:
+            shared.add_exact_hit_matrix(matrix)
+        used += size
+    return shared
+
+
+class _Attacher:
+    """子进程侧：按清单重建对象，数值数组为共享内存上的只读视图；共享内存句柄随进程常驻"""
+
+    def __init__(self):
+        self.blocks = []
+        self.decoded = {}
+
+    def _view(self, name, shape, dtype) -> np.ndarray:
+        shm = shared_memory.SharedMemory(name=name)
+        self.blocks.append(shm)
+        view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        view.flags.writeable = False  # ⚠️ 多进程共用同一份数据，任何原地修改都会直接报错
+        return view
+
+    def decode(self, spec):
+        kind = spec[0]
+        if kind == "value":
+            return spec[1]
+        if kind == "ref":
+            return self.decoded[spec[1]]
+        if kind == "object":
+            _, ref, cls, attrs = spec
+            obj = cls.__new__(cls)
+            self.decoded[ref] = obj
+            obj.__dict__.update({k: self.decode(v) for k, v in attrs.items()})
+            return obj
+        if kind == "dict":
+            _, ref, items = spec
+            value = self.decoded[ref] = {}
+            value.update({k: self.decode(v) for k, v in items.items()})
+            return value
+        if kind == "copy":
+            _, ref, value = spec
+        elif kind == "array":
+            _, ref, name, shape, dtype = spec
+            value = self._view(name, shape, dtype)
+        else:
+            _, ref, lazy, data_spec, offsets_spec = spec
+            value = SharedStrings(self._view(*data_spec), self._view(*offsets_spec))
+            if not lazy:
+                value = value[:]
+        self.decoded[ref] = value
+        return value
+
+
+_attached = []
+
+
+def attach_shared_caches(manifest: dict):
+    """子进程：按清单 attach 共享内存，并装入期号索引 / 开奖 / 预测立方体 / 命中矩阵 / hit+N 位图的进程内缓存"""
+    attacher = _Attacher()
+    for spec in manifest["issue_index"].values():
+        set_issue_index(attacher.decode(spec))
+    for spec in manifest["open_code"].values():
+        set_open_code_cache(attacher.decode(spec))
+    for spec in manifest["cube"].values():
+        set_prediction_cube(attacher.decode(spec))
+    for spec in manifest["hit_matrix"].values():
+        set_hit_matrix(attacher.decode(spec))
+    for spec in manifest["exact_hit"].values():
+        set_exact_hit_matrix(attacher.decode(spec))
+    _attached.append(attacher)
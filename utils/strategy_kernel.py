@@ -0,0 +1,172 @@
+# utils/strategy_kernel.py
+# 策略提取向量化内核：把多期推荐数字排名堆成矩阵（含并列区间元数据），一个 enable 表达式对全部期号一次性提取，
+# 口径与 expert_hit_analysis.extract_strategy 逐期提取完全一致（含整数/负数排名、逗号备选、Skip/Next 并列处理、reverse_on_tie、prev±N、少于 5 个数字跳过）
+import re
+import numpy as np
+
+
+class RankingMatrix:
+    """
+    多期推荐数字排名矩阵（I 期 × K 名次，K 为各期最大去重数字个数）。
+
+    - digits / counts：各期按名次排好的数字与出现次数，不足处 digits 补 -1、counts 补 0
+    - sizes：各期去重数字个数
+    - tie_start / tie_end：各名次所在并列组区间
+    - max_tie：各期最大并列组大小（用于 prev 策略的“全局并列 ≥ 4 触发反向”）
+    - rank_of：数字 → 名次（从 1 开始，未出现为 0），仅覆盖 0~15
+    """
+
+    RANK_VALUES = 16
+
+    def __init__(self, rankings: list):
+        n_issues = len(rankings)
+        width = max([len(r) for r in rankings if r is not None], default=0)
+        self.n_issues = n_issues
+        self.digits = np.full((n_issues, width), -1, dtype=np.int16)
+        self.counts = np.zeros((n_issues, width), dtype=np.int32)
+        self.tie_start = np.zeros((n_issues, width), dtype=np.int32)
+        self.tie_end = np.zeros((n_issues, width), dtype=np.int32)
+        self.sizes = np.zeros(n_issues, dtype=np.int32)
+        self.rank_of = np.zeros((n_issues, self.RANK_VALUES), dtype=np.int32)
+        for i, ranking in enumerate(rankings):
+            if ranking is None or not len(ranking):
+                continue
+            size = len(ranking)
+            if ranking.digits.min() < 0 or ranking.digits.max() >= self.RANK_VALUES:
+                raise ValueError("RankingMatrix 仅支持 0~15 的数字型彩种排名")
+            self.sizes[i] = size
+            self.digits[i, :size] = ranking.digits
+            self.counts[i, :size] = ranking.counts
+            self.tie_start[i, :size] = ranking.tie_start
+            self.tie_end[i, :size] = ranking.tie_end
+            self.rank_of[i, ranking.digits] = np.arange(1, size + 1)
+        self.max_tie = (self.tie_end - self.tie_start).max(axis=1) if width else np.zeros(n_issues, dtype=np.int32)
+
+    def _digit_at(self, rows: np.ndarray, pos: np.ndarray) -> np.ndarray:
+        return self.digits[rows, pos].astype(np.int64)
+
+
+def prev_target_digit(prev_open_code_str, dingwei_sha_pos: int):
+    """
+    prev 策略的目标数字：上期开奖号第 dingwei_sha_pos 位。开奖号为空或解析失败 / 位数不足时返回 None（与逐期提取中被跳过的情形一致）
+    """
+    if not prev_open_code_str:
+        return None
+    try:
+        return list(map(int, prev_open_code_str.strip().split(",")))[dingwei_sha_pos]
+    except Exception:
+        return None
+
+
+def _rank_pick(matrix: RankingMatrix, rows: np.ndarray, rank_idx: int, tie_mode: str, reverse_on_tie: bool):
+    """整数排名（已换算为 0 起 / 负下标 idx）在 rows 各期上的提取结果：(数字, 是否提取成功)"""
+    sizes = matrix.sizes[rows].astype(np.int64)
+    picked = np.full(len(rows), -1, dtype=np.int64)
+    ok = abs(rank_idx) < sizes
+    pos = np.where(rank_idx >= 0, rank_idx, sizes + rank_idx)
+    pos = np.where(ok, pos, 0)
+    if not matrix.digits.shape[1]:
+        return picked, np.zeros(len(rows), dtype=bool)
+
+    tie_start = matrix.tie_start[rows, pos]
+    tie_end = matrix.tie_end[rows, pos]
+    tied = ok & ((tie_end - tie_start) > 1)
+    plain = ok & ~tied
+    picked[plain] = matrix._digit_at(rows[plain], pos[plain])
+
+    if tie_mode == "Skip":
+        return picked, plain
+    if tie_mode == "Next":
+        # 次数降序：idx ≥ 0 时第一个次数不同的名次即并列组终点；
+        # idx < 0 时 range(idx + 1, n) 先遍历并列组之后的负下标，再从第 0 名开始，第 0 名不在并列组内即取第 0 名
+        if rank_idx < 0:
+            next_pos = np.where(tie_end < sizes, tie_end, np.where(tie_start > 0, 0, -1))
+        else:
+            next_pos = np.where(tie_end < sizes, tie_end, -1)
+        found = tied & (next_pos >= 0)
+        picked[found] = matrix._digit_at(rows[found], next_pos[found])
+        return picked, plain | found
+    if reverse_on_tie:
+        new_idx = -1 * (rank_idx + 1) if rank_idx >= 0 else abs(rank_idx) - 1
+        rev_ok = tied & (abs(new_idx) < sizes)
+        rev_pos = np.where(new_idx >= 0, new_idx, sizes + new_idx)
+        picked[rev_ok] = matrix._digit_at(rows[rev_ok], rev_pos[rev_ok])
+        return picked, plain | rev_ok
+    picked[tied] = matrix._digit_at(rows[tied], pos[tied])
+    return picked, ok
+
+
+def _prev_pick(matrix: RankingMatrix, rows: np.ndarray, offset: int, prev_targets: np.ndarray, reverse_on_tie: bool):
+    """prev±N 在 rows 各期上的提取结果：(数字, 是否提取成功)"""
+    picked = np.full(len(rows), -1, dtype=np.int64)
+    targets = prev_targets[rows]
+    valid_target = (targets >= 0) & (targets < RankingMatrix.RANK_VALUES)
+    rank = np.zeros(len(rows), dtype=np.int64)
+    rank[valid_target] = matrix.rank_of[rows[valid_target], targets[valid_target]]
+    ok = rank > 0
+    if not ok.any():
+        return picked, ok
+    sizes = matrix.sizes[rows].astype(np.int64)
+    reverse = (matrix.max_tie[rows] >= 4) & reverse_on_tie
+    step = np.where(reverse, -offset, offset)
+    new_pos = np.zeros(len(rows), dtype=np.int64)
+    new_pos[ok] = (rank[ok] - 1 + step[ok]) % sizes[ok]
+    picked[ok] = matrix._digit_at(rows[ok], new_pos[ok])
+    return picked, ok
+
+
+def extract_strategy_batch(
+        matrix: RankingMatrix,
+        enable_list,
+        skip_flag: bool,
+        tie_mode: str = "False",
+        reverse_on_tie: bool = False,
+        prev_targets: np.ndarray = None,
+):
+    """
+    对矩阵中全部期号一次性执行 extract_strategy。
+
+    - prev_targets：各期 prev 策略的目标数字（prev_target_digit 的结果，无法提取为 -1），未使用 prev 表达式时可为空
+
+    返回 (masks, extracted)：masks 为各期提取数字的位掩码（uint16），extracted 为各期是否有提取结果
+    （False 对应逐期提取返回 None）
+    """
+    n_issues = matrix.n_issues
+    masks = np.zeros(n_issues, dtype=np.uint16)
+    if not enable_list:
+        return masks, np.zeros(n_issues, dtype=bool)
+
+    active = ~((matrix.sizes < 5) & bool(skip_flag))
+    if enable_list == "All" or (isinstance(enable_list, list) and "All" in enable_list):
+        for k in range(matrix.digits.shape[1]):
+            has_digit = active & (k < matrix.sizes)
+            masks[has_digit] |= (1 << matrix.digits[has_digit, k].astype(np.int64)).astype(np.uint16)
+        return masks, active
+
+    if prev_targets is None:
+        prev_targets = np.full(n_issues, -1, dtype=np.int64)
+    prev_targets = np.asarray(prev_targets, dtype=np.int64)
+
+    for pos_expr in enable_list:
+        sub_positions = [s.strip() for s in str(pos_expr).split(",")]
+        pending = active.copy()
+        for sub_pos in sub_positions:
+            rows = np.flatnonzero(pending)
+            if not len(rows):
+                break
+            if sub_pos.startswith("prev"):
+                match = re.match(r"prev([+-]?\d*)", sub_pos)
+                offset = int(match.group(1)) if match and match.group(1) else 0
+                picked, ok = _prev_pick(matrix, rows, offset, prev_targets, reverse_on_tie)
+            else:
+                try:
+                    rank_idx = int(sub_pos) - 1 if int(sub_pos) > 0 else int(sub_pos)
+                except ValueError:
+                    continue
+                picked, ok = _rank_pick(matrix, rows, rank_idx, tie_mode, reverse_on_tie)
+            hit_rows = rows[ok]
+            masks[hit_rows] |= (1 << picked[ok]).astype(np.uint16)
+            pending[hit_rows] = False
+
+    return masks, masks != 0
+
@@ -0,0 +1,145 @@
+# utils/task_lease.py
+# 任务租约：多个回测进程 / 主机共用同一张 tasks_xxx 表时，按批认领任务（FOR UPDATE SKIP LOCKED 互不阻塞），
+# 认领后任务状态为 running，持有者与租约到期时间记在 tasks_xxx_leases 表，后台心跳定期续约；
+# 进程崩溃后租约过期，任务自动被其他进程重新认领。租约时间一律按数据库时钟计算，不依赖各主机本地时钟
+import os
+import socket
+import threading
+import uuid
+from sqlalchemy import text
+
+LEASE_SECONDS = 600
+CLAIM_BATCH_SIZE = 500
+# ⚠️ MySQL 8.0+ 语法：只锁任务表，被其他进程锁住的行直接跳过，并发认领互不等待
+CLAIM_LOCK_CLAUSE = "FOR UPDATE OF t SKIP LOCKED"
+# ⚠️ 到期时间与过期判断都在 SQL 中用数据库的 NOW() 计算：各主机时钟不同步时，时钟偏快的主机也不会提前接手他人仍有效的租约
+DB_NOW_SQL = "NOW()"
+LEASE_EXPIRES_SQL = "DATE_ADD(NOW(), INTERVAL :lease_seconds SECOND)"
+
+
+def lease_table_name(tasks_table: str) -> str:
+    """
+    租约表名。租约字段不放进 tasks 表：备份导出 / merge_sqls_with_incremental_id 按固定列序处理 tasks 表，
+    由备份恢复的 running 任务没有租约记录，视为已过期可直接认领
+    """
+    return f"{tasks_table}_leases"
+
+
+def make_owner_id() -> str:
+    """租约持有者标识：主机名 + 进程号 + 随机后缀（同一主机多进程、进程重启均不冲突）"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def ensure_lease_table(engine, tasks_table: str):
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {lease_table_name(tasks_table)} (
+                task_id BIGINT NOT NULL PRIMARY KEY,
+                owner VARCHAR(128) NOT NULL,
+                lease_expires_at DATETIME NOT NULL
+            )
+        """))
+
+
+def claim_tasks(engine, tasks_table: str, owner: str, batch_size: int = CLAIM_BATCH_SIZE, lease_seconds: int = LEASE_SECONDS,
+                task_ids: list = None) -> list:
+    """
+    按 id 顺序认领一批任务：pending，以及租约已过期（或没有租约记录）的 running。
+    task_ids 不为空时只在这些 id 中认领（分片作业只认领本分片任务）。
+    认领的任务改为 running 并写入租约，返回任务 dict 列表（无可认领任务时为空列表）
+    """
+    lease_table = lease_table_name(tasks_table)
+    params = dict(limit=int(batch_size))
+    id_filter = ""
+    if task_ids is not None:
+        if not task_ids:
+            return []
+        params.update({f"only_{i}": task_id for i, task_id in enumerate(task_ids)})
+        id_filter = f"AND t.id IN ({', '.join(f':only_{i}' for i in range(len(task_ids)))})"
+    with engine.begin() as conn:
+        ids = [row[0] for row in conn.execute(text(f"""
+            SELECT t.id FROM {tasks_table} t
+            LEFT JOIN {lease_table} l ON l.task_id = t.id
+            WHERE (t.status = 'pending'
+                   OR (t.status = 'running' AND (l.task_id IS NULL OR l.lease_expires_at < {DB_NOW_SQL})))
+              {id_filter}
+            ORDER BY t.id
+            LIMIT :limit
+            {CLAIM_LOCK_CLAUSE}
+        """), params)]
+        if not ids:
+            return []
+        id_params = {f"id_{i}": task_id for i, task_id in enumerate(ids)}
+        id_list = ", ".join(f":{key}" for key in id_params)
+        conn.execute(text(f"UPDATE {tasks_table} SET status = 'running' WHERE id IN ({id_list})"), id_params)
+        conn.execute(text(f"DELETE FROM {lease_table} WHERE task_id IN ({id_list})"), id_params)
+        conn.execute(
+            text(f"INSERT INTO {lease_table} (task_id, owner, lease_expires_at) VALUES (:task_id, :owner, {LEASE_EXPIRES_SQL})"),
+            [dict(task_id=task_id, owner=owner, lease_seconds=int(lease_seconds)) for task_id in ids],
+        )
+        rows = conn.execute(text(f"SELECT * FROM {tasks_table} WHERE id IN ({id_list}) ORDER BY id"), id_params).mappings()
+        return [dict(row) for row in rows]
+
+
+def lease_held_clause(tasks_table: str) -> str:
+    """拼在任务 UPDATE 的 WHERE 之后：仅当 :id 仍由 :owner 持有租约时才写回"""
+    return f" AND EXISTS (SELECT 1 FROM {lease_table_name(tasks_table)} WHERE task_id = :id AND owner = :owner)"
+
+
+def drop_lease(conn, tasks_table: str, task_id, owner: str):
+    """任务完成后删除租约记录（与写回结果在同一事务中）"""
+    conn.execute(text(f"DELETE FROM {lease_table_name(tasks_table)} WHERE task_id = :id AND owner = :owner"), dict(id=task_id, owner=owner))
+
+
+def renew_leases(engine, tasks_table: str, owner: str, lease_seconds: int = LEASE_SECONDS) -> int:
+    """为本进程持有的全部租约续约，返回续约行数"""
+    with engine.begin() as conn:
+        return conn.execute(text(f"""
+            UPDATE {lease_table_name(tasks_table)} SET lease_expires_at = {LEASE_EXPIRES_SQL}
+            WHERE owner = :owner
+        """), dict(owner=owner, lease_seconds=int(lease_seconds))).rowcount
+
+
+def release_leases(engine, tasks_table: str, owner: str) -> int:
+    """退出时把本进程未完成的任务退回 pending 并删除租约，返回退回行数"""
+    lease_table = lease_table_name(tasks_table)
+    with engine.begin() as conn:
+        released = conn.execute(text(f"""
+            UPDATE {tasks_table} SET status = 'pending'
+            WHERE status = 'running' AND id IN (SELECT task_id FROM {lease_table} WHERE owner = :owner)
+        """), dict(owner=owner)).rowcount
+        conn.execute(text(f"DELETE FROM {lease_table} WHERE owner = :owner"), dict(owner=owner))
+        return released
+
+
+class LeaseHeartbeat:
+    """
+    后台心跳线程：每 lease_seconds / 3 续约一次，用作 with 上下文；退出时停止心跳并退回未完成任务。
+    ⚠️ 心跳线程持有数据库连接，fork 子进程（如进程池）须在进入本上下文之前完成
+    """
+
+    def __init__(self, engine, tasks_table: str, owner: str, lease_seconds: int = LEASE_SECONDS):
+        self.engine = engine
+        self.tasks_table = tasks_table
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lease-heartbeat", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(max(self.lease_seconds / 3, 1)):
+            try:
+                renew_leases(self.engine, self.tasks_table, self.owner, self.lease_seconds)
+            except Exception as e:
+                # ⚠️ 单次续约失败不中断回测，下一轮心跳重试；持续失败时租约过期，任务由其他进程接手
+                print(f"⚠️ 租约续约失败：{e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        release_leases(self.engine, self.tasks_table, self.owner)
+        return False
@@ -0,0 +1,165 @@
+# utils/task_results.py
+# 回测结果落库：tasks 结果回写、best_tasks 高命中入选、best_ranks 排名统计写入，backtest 逐任务回测与网格评估共用同一套口径
+import json
+import re
+from datetime import datetime
+from sqlalchemy import text
+from utils.db import get_table_name
+
+# ✅ 命中率达到该值的任务写入 best_tasks
+BEST_TASK_HIT_RATE = 0.9
+# ✅ tasks.status 的全部取值：pending → running（租约认领）→ done / pruned（剪枝终止）
+TASK_STATUSES = ("pending", "running", "pruned", "done")
+
+
+def ensure_task_statuses(engine, tasks_table: str) -> list:
+    """
+    tasks 表结构来自备份还原。若 status 为 ENUM 且缺少 running / pruned，则原样保留已有取值、可空性与默认值并扩展 ENUM，
+    返回新增的取值（VARCHAR 等字符串列无需迁移，返回空列表）
+    """
+    with engine.begin() as conn:
+        column = conn.execute(text("""
+            SELECT COLUMN_TYPE, IS_NULLABLE, COLUMN_DEFAULT FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table_name AND COLUMN_NAME = 'status'
+        """), dict(table_name=tasks_table)).fetchone()
+        if column is None or not str(column[0]).lower().startswith("enum("):
+            return []
+        current = re.findall(r"'((?:[^']|'')*)'", str(column[0]))
+        missing = [status for status in TASK_STATUSES if status not in current]
+        if missing:
+            values = ", ".join(f"'{value}'" for value in current + missing)
+            nullable = "NULL" if column[1] == "YES" else "NOT NULL"
+            default = f" DEFAULT '{column[2]}'" if column[2] is not None else ""
+            conn.execute(text(f"ALTER TABLE {tasks_table} MODIFY status ENUM({values}) {nullable}{default}"))
+        return missing
+
+
+def find_status_checks(engine, tasks_table: str) -> list:
+    """tasks 表上引用 status 的 CHECK 约束（MySQL 8.0.16+），返回约束子句列表，供调用方提示"""
+    with engine.begin() as conn:
+        rows = conn.execute(text("""
+            SELECT cc.CHECK_CLAUSE FROM information_schema.TABLE_CONSTRAINTS tc
+            JOIN information_schema.CHECK_CONSTRAINTS cc
+              ON cc.CONSTRAINT_SCHEMA = tc.CONSTRAINT_SCHEMA AND cc.CONSTRAINT_NAME = tc.CONSTRAINT_NAME
+            WHERE tc.TABLE_SCHEMA = DATABASE() AND tc.TABLE_NAME = :table_name AND tc.CONSTRAINT_TYPE = 'CHECK'
+        """), dict(table_name=tasks_table)).fetchall()
+    return [row[0] for row in rows if "status" in str(row[0]).lower()]
+
+
+def summarize_result(result: dict) -> dict:
+    """run_hit_analysis_batch / 网格评估结果 → 落库所需的汇总字段"""
+    hit_count = result["hit_count"]
+    miss_count = result["miss_count"]
+    skip_count = result["skip_count"]
+    total_issues = hit_count + miss_count
+    open_rank_counter = result.get("open_rank_counter", {})
+    max_rank = result.get("max_rank_length", 0)
+    return {
+        "total_issues": total_issues,
+        "hit_count": hit_count,
+        "miss_count": miss_count,
+        "skip_count": skip_count,
+        "hit_rate": round(hit_count / total_issues, 4) if total_issues > 0 else 0,
+        "open_rank_counter": open_rank_counter,
+        "max_rank_length": max_rank,
+        "unhit_ranks": [r for r in range(1, max_rank + 1) if r not in open_rank_counter],
+    }
+
+
+def is_best_task(summary: dict) -> bool:
+    return summary["hit_rate"] >= BEST_TASK_HIT_RATE
+
+
+def is_rank_reliable(summary: dict) -> bool:
+    """跳过期数大于命中期数时数据可靠性较低，不写入 best_ranks"""
+    return summary["skip_count"] <= summary["hit_count"]
+
+
+def save_best_records(conn, lottery_name: str, records: list):
+    """
+    批量写入 best_tasks / best_ranks。
+    records 为 (task, summary) 列表，task 含 position / query_playtype_name / lookback_n 及已解析的
+    hit_rank_list / enable / skip_if_few / resolve_tie_mode / reverse_on_tie
+    """
+    best_tasks_table = get_table_name(lottery_name, "best_tasks")
+    best_ranks_table = get_table_name(lottery_name, "best_ranks")
+    now = datetime.now()
+
+    best_task_rows = [dict(
+        position=task["position"],
+        playtype=task["query_playtype_name"],
+        lookback_n=task["lookback_n"],
+        hit_rank_list=json.dumps(task["hit_rank_list"], ensure_ascii=False),
+        enable=json.dumps(task["enable"], ensure_ascii=False),
+        skip_if_few=json.dumps(task["skip_if_few"], ensure_ascii=False),
+        resolve_tie_mode=json.dumps(task["resolve_tie_mode"], ensure_ascii=False),
+        reverse_on_tie=json.dumps(task["reverse_on_tie"], ensure_ascii=False),
+        hit_rate=summary["hit_rate"],
+        created_at=now
+    ) for task, summary in records if is_best_task(summary)]
+    if best_task_rows:
+        conn.execute(text(f"""
+            INSERT IGNORE INTO {best_tasks_table}
+            (position, playtype, lookback_n, hit_rank_list, enable, skip_if_few,
+             resolve_tie_mode, reverse_on_tie, hit_rate, created_at)
+            VALUES (:position, :playtype, :lookback_n, :hit_rank_list, :enable,
+                    :skip_if_few, :resolve_tie_mode, :reverse_on_tie, :hit_rate, :created_at)
+        """), best_task_rows)
+
+    best_rank_rows = [dict(
+        playtype=task["query_playtype_name"],
+        position=task["position"],
+        lookback_n=task["lookback_n"],
+        hit_rank_list=json.dumps(task["hit_rank_list"], ensure_ascii=False),
+        enable=json.dumps(task["enable"], ensure_ascii=False),
+        total_issues=summary["total_issues"],
+        open_rank_counter=json.dumps(summary["open_rank_counter"], ensure_ascii=False),
+        unhit_ranks=json.dumps(summary["unhit_ranks"], ensure_ascii=False),
+        created_at=now
+    ) for task, summary in records if is_rank_reliable(summary)]
+    if best_rank_rows:
+        conn.execute(text(f"""
+            INSERT INTO {best_ranks_table}
+            (playtype, position, lookback_n, hit_rank_list, enable,
+             total_issues, open_rank_counter, unhit_ranks, created_at)
+            VALUES (:playtype, :position, :lookback_n, :hit_rank_list, :enable,
+                    :total_issues, :open_rank_counter, :unhit_ranks, :created_at)
+        """), best_rank_rows)
+
+
+def insert_evaluated_tasks(conn, lottery_name: str, records: list):
+    """
+    网格评估完成的任务一次性写入 tasks（状态直接为 done），并同步写入 best_tasks / best_ranks
+    """
+    tasks_table = get_table_name(lottery_name, "tasks")
+    now = datetime.now()
+    rows = [dict(
+        position=task["position"],
+        query_playtype_name=task["query_playtype_name"],
+        analyze_playtype_name=task["analyze_playtype_name"],
+        lookback_n=task["lookback_n"],
+        lookback_offset=task["lookback_offset"],
+        hit_rank_list=json.dumps(task["hit_rank_list"], ensure_ascii=False, sort_keys=True),
+        enable=json.dumps(task["enable"], ensure_ascii=False, sort_keys=True),
+        skip_if_few=json.dumps(task["skip_if_few"], ensure_ascii=False, sort_keys=True),
+        resolve_tie_mode=json.dumps(task["resolve_tie_mode"], ensure_ascii=False, sort_keys=True),
+        reverse_on_tie=json.dumps(task["reverse_on_tie"], ensure_ascii=False, sort_keys=True),
+        status="done",
+        total_issues=summary["total_issues"],
+        hit_count=summary["hit_count"],
+        skip_count=summary["skip_count"],
+        hit_rate=summary["hit_rate"],
+        created_at=now,
+        updated_at=now
+    ) for task, summary in records]
+    if rows:
+        conn.execute(text(f"""
+            INSERT INTO {tasks_table}
+            (position, query_playtype_name, analyze_playtype_name, lookback_n, lookback_offset, hit_rank_list, enable,
+             skip_if_few, resolve_tie_mode, reverse_on_tie, status, total_issues, hit_count, skip_count, hit_rate,
+             created_at, updated_at)
+            VALUES (:position, :query_playtype_name, :analyze_playtype_name, :lookback_n, :lookback_offset, :hit_rank_list, :enable,
+                    :skip_if_few, :resolve_tie_mode, :reverse_on_tie, :status, :total_issues, :hit_count, :skip_count, :hit_rate,
+                    :created_at, :updated_at)
+        """), rows)
+    save_best_records(conn, lottery_name, records)
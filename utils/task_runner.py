@@ -0,0 +1,139 @@
+# utils/task_runner.py
+# 回测任务组执行：backtest.py 按 (玩法, lookback_n, offset, hit_rank_list) 分组回测，
+# 可选进程池并行计算各任务组（每个子进程复用自己的数据库连接与进程内缓存），结果按原顺序交回主进程统一落库
+import json
+from concurrent.futures import ProcessPoolExecutor
+from utils.logger import log, collect_logs, replay_logs
+from utils.expert_hit_analysis import run_multi_strategy_batch
+from utils.worker_pool import init_worker, get_worker_engine
+from utils.shared_cache import share_process_caches
+from utils.task_shard import task_group_key
+
+
+def group_tasks(tasks: list) -> list:
+    """
+    按 task_group_key 分组，返回任务组列表（组按首次出现的顺序、组内保持原顺序）；
+    分组键与 task_shard 分片共用，同组任务必然落在同一分片
+    """
+    groups = {}
+    for task in tasks:
+        groups.setdefault(task_group_key(task), []).append(task)
+    return list(groups.values())
+
+
+def task_variant(task):
+    enable_dingwei_sha = json.loads(task["enable"]).get("dingwei_sha")
+    if enable_dingwei_sha and not isinstance(enable_dingwei_sha, list):
+        enable_dingwei_sha = [enable_dingwei_sha]
+    return dict(
+        dingwei_sha_pos=int(task["position"]),
+        enable_dingwei_sha=enable_dingwei_sha,
+        skip_if_few_dingwei_sha=json.loads(task["skip_if_few"]).get("dingwei_sha"),
+        resolve_tie_mode_dingwei_sha=json.loads(task["resolve_tie_mode"]).get("dingwei_sha"),
+        reverse_on_tie_dingwei_sha=json.loads(task["reverse_on_tie"]).get("dingwei_sha"),
+    )
+
+
+def task_exact_hit(task):
+    """任务 hit_rank_list 中 hit+N 的 N（多个时与 analyze_expert_hits 一致取最后一个），没有返回 None"""
+    exact_hit = None
+    for r in json.loads(task["hit_rank_list"]):
+        if isinstance(r, str) and r.startswith("hit+"):
+            exact_hit = int(r.split("+")[1])
+    return exact_hit
+
+
+def run_task_group(engine, lottery_name: str, group_tasks: list, prune_hit_rate: float = None) -> dict:
+    """整组逐期只做一次回溯筛选与排名，返回 {task_id: 结果}"""
+    first = group_tasks[0]
+    log(f"🧩 任务组 ➞ {first['query_playtype_name']} | lookback_n={first['lookback_n']} | offset={first['lookback_offset']} | HR={first['hit_rank_list']} | 共 {len(group_tasks)} 个提取变体")
+    return run_multi_strategy_batch(
+        engine=engine,
+        lottery_name=lottery_name,
+        query_issues=["All"],
+        analysis_kwargs=dict(
+            query_playtype_name=first["query_playtype_name"],
+            analyze_playtype_name=first["analyze_playtype_name"],
+            mode="rank",
+            hit_rank_list=json.loads(first["hit_rank_list"]),
+            lookback_n=first["lookback_n"],
+            lookback_start_offset=first["lookback_offset"],
+            use_cube=True,  # ✅ 整表预测一次性载入内存，逐期分析不再访问数据库
+        ),
+        strategies={t["id"]: task_variant(t) for t in group_tasks},
+        check_mode="dingwei",
+        prune_hit_rate=prune_hit_rate,
+    )
+
+
+def _run_group_in_worker(args):
+    lottery_name, group_tasks, prune_hit_rate = args
+    return collect_logs(run_task_group, get_worker_engine(), lottery_name, group_tasks, prune_hit_rate)
+
+
+class TaskGroupPool:
+    """
+    回测任务组执行器，用作 with 上下文，整个回测期间复用（如租约模式下逐批认领的每一批任务）：
+
+    - workers <= 1：当前进程串行执行
+    - workers > 1：进入时按 tasks（本次回测可能执行的任务，用于确定涉及的玩法与 hit+N）把期号索引 / 开奖 /
+      预测立方体 / 回溯玩法的命中矩阵放入共享内存并启动进程池，之后每批任务组都交给同一进程池计算，子进程缓存跨批常驻；
+      退出时先关闭进程池，再释放共享内存。进入后新出现的玩法由子进程各自加载
+    """
+
+    def __init__(self, engine, lottery_name: str, tasks: list, workers: int = 1, prune_hit_rate: float = None):
+        self.engine = engine
+        self.lottery_name = lottery_name
+        self.tasks = tasks
+        self.workers = workers
+        self.prune_hit_rate = prune_hit_rate
+        self._shared = None
+        self._pool = None
+
+    def __enter__(self):
+        if self.workers <= 1:
+            return self
+        exact_hits = [task_exact_hit(t) for t in self.tasks if task_exact_hit(t) is not None]
+        self._shared = share_process_caches(
+            self.engine, self.lottery_name, [t["query_playtype_name"] for t in self.tasks],
+            matrix_playtypes=[t["analyze_playtype_name"] for t in self.tasks], exact_hits=exact_hits,
+        )
+        try:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker, initargs=(self._shared.manifest,))
+            # ✅ 立即启动子进程并完成 attach：fork 方式下首次提交即一次性 fork 全部子进程，之后不再 fork，
+            #    调用方随后启动的后台线程（如租约心跳）不会被带进子进程
+            self._pool.submit(int).result()
+        except BaseException:
+            self._shared.close()
+            raise
+        log(f"🧠 共享缓存已就绪：{self._shared.nbytes() / 2 ** 20:.1f} MB，{self.workers} 个子进程共用")
+        return self
+
+    def iter_results(self, groups: list):
+        """
+        按 groups 顺序逐组产出 {task_id: 结果}；并行时子进程日志收集后随结果交回，按组顺序重放，逐组输出与串行一致
+        """
+        if self._pool is None:
+            for group_tasks in groups:
+                yield run_task_group(self.engine, self.lottery_name, group_tasks, self.prune_hit_rate)
+            return
+        jobs = [(self.lottery_name, [dict(t) for t in group_tasks], self.prune_hit_rate) for group_tasks in groups]
+        for results, lines in self._pool.map(_run_group_in_worker, jobs):
+            replay_logs(lines)
+            yield results
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._shared is not None:
+            self._shared.close()
+            self._shared = None
+        return False
+
+
+def iter_task_group_results(engine, lottery_name: str, groups: list, prune_hit_rate: float = None, workers: int = 1):
+    """按 groups 顺序逐组产出 {task_id: 结果}：只回测这一批任务组时使用，进程池与共享缓存随之创建和释放"""
+    tasks = [t for group_tasks in groups for t in group_tasks]
+    with TaskGroupPool(engine, lottery_name, tasks, workers=min(workers, len(groups)), prune_hit_rate=prune_hit_rate) as pool:
+        yield from pool.iter_results(groups)
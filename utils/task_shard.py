@@ -0,0 +1,59 @@
+# utils/task_shard.py
+# 任务分片：同一玩法的待回测任务按任务组配置的稳定哈希分给 --shard-count 个独立作业（各作业还原同一份任务表、互不通信），
+# 同组任务落在同一分片以复用逐期排名；各分片上传独立的 Release，合并时按自然键去重（merge_sqls_with_incremental_id.py）
+# ⚠️ 仅依赖标准库：run_all.py / upload_release.py 解析分片参数时不应加载分析模块
+import hashlib
+import json
+
+
+def task_group_key(task):
+    """同组任务的回溯筛选与推荐排名完全相同，仅定位杀号提取参数（enable / skip_if_few / resolve_tie_mode / reverse_on_tie）与定位位不同"""
+    hit_rank_list = json.dumps(json.loads(task["hit_rank_list"]), ensure_ascii=False, sort_keys=True)
+    return task["query_playtype_name"], task["analyze_playtype_name"], task["lookback_n"], task["lookback_offset"], hit_rank_list
+
+
+def parse_shard_args(argv) -> tuple:
+    """解析 --shard-index I --shard-count N，返回 (shard_index, shard_count)；缺省为 (0, 1) 即不分片"""
+    def flag_value(flag, default):
+        if flag not in argv:
+            return default
+        idx = argv.index(flag)
+        value = argv[idx + 1] if idx + 1 < len(argv) else ""
+        if not value.isdigit():
+            raise ValueError(f"{flag} 需要非负整数参数，实际为：{value!r}")
+        return int(value)
+
+    shard_index = flag_value("--shard-index", 0)
+    shard_count = flag_value("--shard-count", 1)
+    if shard_count < 1 or shard_index >= shard_count:
+        raise ValueError(f"分片参数无效：--shard-index {shard_index} --shard-count {shard_count}")
+    return shard_index, shard_count
+
+
+def shard_argv(shard_index: int, shard_count: int) -> list:
+    """转发给子脚本的分片参数（不分片时为空列表）"""
+    if shard_count <= 1:
+        return []
+    return ["--shard-index", str(shard_index), "--shard-count", str(shard_count)]
+
+
+def shard_suffix(shard_index: int, shard_count: int) -> str:
+    """分片作业的 Release tag / 备份文件名后缀，如 _shard0of4（不分片时为空串）"""
+    return f"_shard{shard_index}of{shard_count}" if shard_count > 1 else ""
+
+
+def task_shard(task, shard_count: int) -> int:
+    """
+    任务所属分片：任务组配置（玩法 / lookback_n / offset / 规范化 hit_rank_list）的 blake2b 哈希取模。
+    ⚠️ 不用内置 hash()：字符串哈希每个进程随机加盐，不同作业算出的分片会不一致
+    """
+    payload = json.dumps(list(task_group_key(task)), ensure_ascii=False, default=str)
+    digest = hashlib.blake2b(payload.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shard_count
+
+
+def select_shard_tasks(tasks: list, shard_index: int, shard_count: int) -> list:
+    """保留属于本分片的任务（保持原顺序）"""
+    if shard_count <= 1:
+        return list(tasks)
+    return [task for task in tasks if task_shard(task, shard_count) == shard_index]
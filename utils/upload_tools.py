@@ -56,7 +56,7 @@ def load_config_from_yaml(lottery_type: str):
     return cfg
 
 
-def do_final_dump_and_upload(playtype_en: str, lottery_type: str = "3d"):
+def do_final_dump_and_upload(playtype_en: str, lottery_type: str = "3d", tag_suffix: str = ""):
 
     # === 读取配置 ===
     config = load_config_from_yaml(lottery_type)
@@ -76,8 +76,8 @@ def do_final_dump_and_upload(playtype_en: str, lottery_type: str = "3d"):
     os.environ["GH_TOKEN"] = GH_TOKEN
     os.environ["GITHUB_TOKEN"] = GH_TOKEN
 
-    tag = f"{RELEASE_TAG}_{playtype_en}"
-    zip_name = f"{lottery_type}_tasks_{playtype_en}.sql.zip"
+    tag = f"{RELEASE_TAG}_{playtype_en}{tag_suffix}"
+    zip_name = f"{lottery_type}_tasks_{playtype_en}{tag_suffix}.sql.zip"
 
     # === Step1: 导出 SQL ===
 
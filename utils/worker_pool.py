@@ -0,0 +1,27 @@
+# utils/worker_pool.py
+# 进程池公共部分：可用 CPU 数、子进程初始化（每个子进程新建一次 engine，任务函数通过 get_worker_engine 复用；
+# 可选 attach 主进程放入共享内存的期号索引 / 开奖 / 预测立方体 / 命中矩阵缓存）
+import os
+from utils.db import get_engine
+from utils.shared_cache import attach_shared_caches
+
+_worker_engine = None
+
+
+def available_cpus() -> int:
+    """当前进程可用的 CPU 数（受 CPU 亲和性限制时以其为准）"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def init_worker(shared_manifest: dict = None):
+    # ⚠️ 子进程不能复用父进程的连接池，各自新建 engine；预测立方体 / 命中矩阵等缓存随子进程常驻，后续任务直接复用
+    global _worker_engine
+    _worker_engine = get_engine()
+    if shared_manifest is not None:
+        attach_shared_caches(shared_manifest)
+
+
+def get_worker_engine():
+    return _worker_engine